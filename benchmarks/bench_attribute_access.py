@@ -0,0 +1,58 @@
+"""
+Measure the cost of reading attributes of model instances, and their size.
+
+Run with::
+
+    python benchmarks/bench_attribute_access.py [number_of_stories]
+"""
+import random
+import sys
+import timeit
+
+from pyrally.models import Story
+
+ROUNDS = 5
+
+
+def get_stories(count):
+    return [Story({'_ref': 'hierarchicalrequirement/{0}.js'.format(index),
+                   '_refObjectName': 'Story {0}'.format(index),
+                   'ObjectID': index,
+                   'Name': 'Story {0}'.format(index),
+                   'Rank': random.random() * 1000000,
+                   'ScheduleState': 'Defined'})
+            for index in xrange(count)]
+
+
+def main(count=5000):
+    stories = get_stories(count)
+    story = stories[0]
+    timings = [
+        ('rally_data field (story.Rank)', lambda: story.Rank),
+        ('class attribute (story.rally_name)', lambda: story.rally_name),
+        ('method (story.update)', lambda: story.update),
+        ('property (story.title)', lambda: story.title),
+    ]
+    loops = 100000
+    for name, func in timings:
+        best = min(timeit.repeat(func, number=loops, repeat=ROUNDS))
+        print '{0:<36} {1:.3f}us'.format(name, best * 1e6 / loops)
+
+    best = min(timeit.repeat(lambda: sorted(stories, key=lambda s: s.Rank),
+                             number=10, repeat=ROUNDS))
+    print '{0:<36} {1:.2f}ms'.format(
+                        'sort {0} stories by Rank'.format(count), best * 100)
+
+    size = sys.getsizeof(story)
+    # Reading __dict__ would create one on slotted instances, which only get
+    # one when other attributes are set on them.
+    if not hasattr(Story, '__slots__'):
+        size += sys.getsizeof(story.__dict__)
+    if getattr(story, '_full_sub_objects', None) is not None:
+        size += sys.getsizeof(story._full_sub_objects)
+    print '{0:<36} {1} bytes'.format('instance size (excluding rally_data)',
+                                     size)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,99 @@
+"""
+Compare the old ``urllib2`` opener-per-request transport with the pooled
+keep-alive transport used by :py:class:`~pyrally.rally_access.RallyAccessor`.
+
+A stub server is started locally which, like Rally, challenges requests with
+no credentials with a ``401`` before answering. Run with::
+
+    python benchmarks/bench_connection_pool.py [number_of_requests]
+
+Note that the stub server speaks plain HTTP, so the cost of the TLS handshake
+which pooling also saves against the real Rally is not measured here.
+"""
+import base64
+import contextlib
+import sys
+import threading
+import time
+import urllib2
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from pyrally.connection import ConnectionPool
+
+USERNAME = 'uname'
+PASSWORD = 'pword'
+BODY = '{"QueryResult": {"Errors": [], "Results": []}}'
+
+
+class StubRallyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response so it goes out in one segment rather than
+    # stalling on Nagle/delayed-ACK between the status line and headers.
+    wbufsize = -1
+
+    def do_GET(self):
+        expected = 'Basic {0}'.format(
+                        base64.b64encode('{0}:{1}'.format(USERNAME, PASSWORD)))
+        if self.headers.get('Authorization') != expected:
+            self.send_response(401)
+            self.send_header('WWW-Authenticate', 'Basic realm="Rally"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            self.wfile.flush()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubRallyServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def opener_per_request(base_url, url, count):
+    password_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
+    password_manager.add_password(None, base_url, USERNAME, PASSWORD)
+    auth_handler = urllib2.HTTPBasicAuthHandler(password_manager)
+    for _ in xrange(count):
+        opener = urllib2.build_opener(auth_handler)
+        with contextlib.closing(opener.open(urllib2.Request(url))) as resp:
+            resp.read()
+        auth_handler.retried = 0
+
+
+def pooled(base_url, url, count):
+    pool = ConnectionPool(base_url, USERNAME, PASSWORD)
+    for _ in xrange(count):
+        with contextlib.closing(pool.urlopen(urllib2.Request(url))) as resp:
+            resp.read()
+    pool.clear()
+
+
+def main(count=500):
+    server = StubRallyServer(('127.0.0.1', 0), StubRallyHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    base_url = 'http://127.0.0.1:{0}/'.format(server.server_address[1])
+    url = '{0}slm/webservice/1.29/hierarchicalrequirement.js'.format(base_url)
+
+    for name, func in [('opener per request', opener_per_request),
+                       ('pooled keep-alive', pooled)]:
+        start = time.time()
+        func(base_url, url, count)
+        elapsed = time.time() - start
+        print '{0:<20} {1} requests in {2:.3f}s ({3:.2f}ms/request)'.format(
+                            name, count, elapsed, elapsed * 1000 / count)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,98 @@
+"""
+Compare how quickly each installed JSON library decodes pages of query
+results, as returned by Rally for ``fetch=true`` queries.
+
+Pages saved from Rally may be given as arguments, otherwise a synthetic page
+of 100 stories is generated. Run with::
+
+    python benchmarks/bench_json_codecs.py [page.json ...]
+"""
+import sys
+import time
+
+from pyrally.json_codec import PREFERENCE, load_codec
+
+ROUNDS = 50
+BASE_URL = 'https://rally1.rallydev.com/slm/webservice/1.29/'
+
+
+def get_reference(rally_type, object_id, name):
+    return {'_ref': '{0}{1}/{2}.js'.format(BASE_URL, rally_type.lower(),
+                                           object_id),
+            '_refObjectName': name,
+            '_type': rally_type}
+
+
+def get_story(index):
+    object_id = 5128087372 + index
+    name = u'Story number {0} \u2013 do the thing'.format(index)
+    story = get_reference('HierarchicalRequirement', object_id, name)
+    story.update({
+        'ObjectID': object_id,
+        'FormattedID': 'US{0}'.format(1000 + index),
+        'Name': story['_refObjectName'],
+        'Description': '<p>As a user I want feature {0} so that I can get '
+                       'on with my work.</p>'.format(index) * 5,
+        'CreationDate': '2012-03-{0:02d}T10:15:00.000Z'.format(index % 28 + 1),
+        'LastUpdateDate': '2012-04-{0:02d}T16:42:13.512Z'.format(
+                                                            index % 28 + 1),
+        'ScheduleState': 'In-Progress',
+        'KanbanState': 'Development',
+        'PlanEstimate': float(index % 8),
+        'TaskEstimateTotal': 12.5,
+        'TaskRemainingTotal': 4.0,
+        'Blocked': index % 10 == 0,
+        'Rank': index * 1000.0,
+        'Owner': get_reference('User', 100 + index % 7, 'Some Developer'),
+        'Project': get_reference('Project', 200, 'The Project'),
+        'Iteration': get_reference('Iteration', 300, 'Sprint 12'),
+        'Release': get_reference('Release', 400, 'Release 3'),
+        'Workspace': get_reference('Workspace', 500, 'Workspace'),
+        'Tasks': [get_reference('Task', object_id * 10 + task, 'A task')
+                  for task in range(4)],
+        'Tags': [],
+        'Errors': [],
+        'Warnings': [],
+    })
+    return story
+
+
+def get_synthetic_page(codec, count=100):
+    return codec.dumps({'QueryResult': {
+                            'Errors': [],
+                            'Warnings': [],
+                            'TotalResultCount': 7000,
+                            'StartIndex': 1,
+                            'PageSize': count,
+                            'Results': [get_story(i) for i in range(count)]}})
+
+
+def main(paths):
+    codecs = []
+    for name in PREFERENCE:
+        try:
+            codecs.append(load_codec(name))
+        except ImportError:
+            print '{0:<12} not installed'.format(name)
+
+    if paths:
+        pages = [open(path, 'rb').read() for path in paths]
+    else:
+        pages = [get_synthetic_page(codecs[-1])]
+    size = sum(len(page) for page in pages)
+    print 'Decoding {0} page(s), {1} bytes, {2} times'.format(len(pages),
+                                                              size, ROUNDS)
+
+    for codec in codecs:
+        start = time.time()
+        for _ in xrange(ROUNDS):
+            for page in pages:
+                codec.loads(page)
+        elapsed = time.time() - start
+        print '{0:<12} {1:.2f}ms/page ({2:.1f}MB/s)'.format(
+                        codec.name, elapsed * 1000 / (ROUNDS * len(pages)),
+                        size * ROUNDS / elapsed / 1e6)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
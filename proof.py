@@ -26,8 +26,6 @@ if story_to_change.KanbanState == 'In Development':
 else:
     state = 'In Development'
 story_to_change.KanbanState = state
-
-del story_to_change.rally_data['Rank']
 story_to_change.update_rally()
 
 print 'AFTER'
@@ -0,0 +1,407 @@
+"""
+Caches used by :py:class:`~pyrally.rally_access.RallyAccessor` to store API
+responses.
+
+Entries are stored against a ``cache_key`` (the API object type, eg
+``hierarchicalrequirement`` or ``hierarchicalrequirement_query``) and a
+``cache_lookup`` (the object id or query string) as returned by
+:py:meth:`~pyrally.rally_access.RallyAccessor.get_cacheable_info`.
+
+Two backends are provided:
+
+    * :py:class:`~pyrally.cache.MemoryCache` holds entries in the current
+      process.
+    * :py:class:`~pyrally.cache.SqliteCache` holds compressed entries in an
+      sqlite database on disk, so they survive restarts and are shared
+      between processes on the same host.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import simplejson
+
+
+MAX_ENTRIES = 10000
+"""Default maximum number of entries held in a MemoryCache."""
+SWEEP_INTERVAL = 100
+"""Number of sets between each sweep for expired entries."""
+
+
+def estimate_size(data):
+    """
+    Return a rough estimate of the memory used by ``data`` in bytes.
+
+    :param data:
+        Python objects as loaded from the JSON returned by Rally.
+    """
+    size = sys.getsizeof(data)
+    if isinstance(data, dict):
+        for key, value in data.iteritems():
+            size += estimate_size(key) + estimate_size(value)
+    elif isinstance(data, (list, tuple)):
+        for item in data:
+            size += estimate_size(item)
+    return size
+
+
+class BaseCache(object):
+    """The interface every cache backend provides."""
+
+    def get(self, cache_key, cache_lookup, timeout):
+        """
+        Return the data stored for ``cache_key`` and ``cache_lookup``.
+
+        :param timeout:
+            The number of seconds the data is valid for after being stored.
+
+        :returns:
+            The data, or ``None`` if it is not in the cache or has expired.
+        """
+        raise NotImplementedError
+
+    def get_entry(self, cache_key, cache_lookup):
+        """
+        Return everything stored for ``cache_key`` and ``cache_lookup``,
+        whether or not it has expired.
+
+        :returns:
+            A tuple of ``(data, time_stored, metadata)``, or ``None`` if
+            nothing is stored.
+        """
+        raise NotImplementedError
+
+    def set(self, cache_key, cache_lookup, data, timeout=None,
+            metadata=None):
+        """
+        Store ``data`` against ``cache_key`` and ``cache_lookup``.
+
+        :param timeout:
+            The number of seconds the data is expected to be valid for. Used
+            to decide when the entry can be swept away. ``None`` if it should
+            only be removed when evicted.
+
+        :param metadata:
+            An optional dictionary stored alongside ``data``, such as the
+            validators used to revalidate it.
+        """
+        raise NotImplementedError
+
+    def delete(self, cache_key, cache_lookup):
+        """Remove the entry for ``cache_key`` and ``cache_lookup`` if held."""
+        raise NotImplementedError
+
+    def delete_all(self, cache_key):
+        """Remove every entry stored against ``cache_key``."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Return a dictionary of counters describing use of the cache."""
+        raise NotImplementedError
+
+
+class MemoryCache(BaseCache):
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=None,
+                 sweep_interval=SWEEP_INTERVAL):
+        """
+        Set up a size bounded, least recently used cache held in memory.
+
+        :param max_entries:
+            The maximum number of entries to hold. ``None`` for no limit.
+
+        :param max_bytes:
+            The maximum estimated size of all entries held, in bytes.
+            ``None`` for no limit. Sizes are only estimated when this is set.
+
+        :param sweep_interval:
+            Expired entries are removed from the whole cache once every
+            ``sweep_interval`` sets. Until then they are kept so they can be
+            revalidated.
+
+        When either limit is reached the least recently used entries are
+        evicted.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()
+        """(cache_key, cache_lookup):
+        (data, time_stored, timeout, size, metadata)"""
+        self._lock = threading.RLock()
+        self._sets_since_sweep = 0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, cache_key, cache_lookup, timeout):
+        entry_key = (cache_key, cache_lookup)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None or time.time() - entry[1] >= timeout:
+                self.misses += 1
+                return None
+            # Re-insert to mark as most recently used.
+            self._entries[entry_key] = self._entries.pop(entry_key)
+            self.hits += 1
+            return entry[0]
+
+    def get_entry(self, cache_key, cache_lookup):
+        with self._lock:
+            entry = self._entries.get((cache_key, cache_lookup))
+        if entry is None:
+            return None
+        return entry[0], entry[1], entry[4]
+
+    def set(self, cache_key, cache_lookup, data, timeout=None,
+            metadata=None):
+        entry_key = (cache_key, cache_lookup)
+        size = estimate_size(data) if self.max_bytes is not None else 0
+        with self._lock:
+            self._remove(entry_key)
+            self._entries[entry_key] = (data, time.time(), timeout, size,
+                                        metadata)
+            self.total_bytes += size
+            self._evict()
+            self._sets_since_sweep += 1
+            if self._sets_since_sweep >= self.sweep_interval:
+                self.sweep()
+
+    def delete(self, cache_key, cache_lookup):
+        with self._lock:
+            self._remove((cache_key, cache_lookup))
+
+    def delete_all(self, cache_key):
+        with self._lock:
+            for entry_key in self._entries.keys():
+                if entry_key[0] == cache_key:
+                    self._remove(entry_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def sweep(self):
+        """Remove every entry which has outlived its timeout."""
+        now = time.time()
+        with self._lock:
+            self._sets_since_sweep = 0
+            for entry_key, entry in self._entries.items():
+                time_stored, timeout = entry[1:3]
+                if timeout is not None and now - time_stored >= timeout:
+                    self._remove(entry_key)
+                    self.expirations += 1
+
+    def stats(self):
+        """
+        Return counters describing how the cache has been used.
+
+        :returns:
+            A dictionary of ``hits``, ``misses``, ``evictions``,
+            ``expirations``, ``entries`` and ``bytes``.
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'expirations': self.expirations,
+                    'entries': len(self._entries),
+                    'bytes': self.total_bytes}
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self.total_bytes -= entry[3]
+
+    def _evict(self):
+        """Evict least recently used entries until within the limits."""
+        while self._entries and (
+                (self.max_entries is not None and
+                 len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and
+                 self.total_bytes > self.max_bytes)):
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry[3]
+            self.evictions += 1
+
+
+class SqliteCache(BaseCache):
+
+    def __init__(self, path, max_entries=None, sweep_interval=SWEEP_INTERVAL,
+                 compress_level=6):
+        """
+        Set up a cache held in the sqlite database at ``path``.
+
+        Any number of processes may use the same ``path`` at once. Each
+        thread gets its own connection to the database, opened when first
+        needed, and a process forked from this one opens its own
+        connections rather than using this one's.
+
+        :param path:
+            The file to store the database in. It is created if needed.
+
+        :param max_entries:
+            The maximum number of entries to hold. ``None`` for no limit.
+            When exceeded, the oldest entries are removed on the next sweep.
+
+        :param sweep_interval:
+            Expired entries are removed once every ``sweep_interval`` sets
+            made by this process.
+
+        :param compress_level:
+            The ``zlib`` compression level used for stored data.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self.compress_level = compress_level
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sets_since_sweep = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return self._connection().execute(
+                                    'SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def _connection(self):
+        """Return the sqlite connection for the current thread and process.
+        """
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) == pid:
+            return self._local.connection
+        # A connection made before a fork belongs to the parent process, and
+        # sqlite connections can't be shared with it.
+        connection = sqlite3.connect(self.path, timeout=30)
+        # Write ahead logging lets readers carry on while another process is
+        # writing.
+        connection.execute('PRAGMA journal_mode=WAL')
+        with connection:
+            connection.execute(
+                    'CREATE TABLE IF NOT EXISTS cache ('
+                    'cache_key TEXT NOT NULL, '
+                    'cache_lookup TEXT NOT NULL, '
+                    'time_stored REAL NOT NULL, '
+                    'timeout REAL, '
+                    'data BLOB NOT NULL, '
+                    'metadata TEXT, '
+                    'PRIMARY KEY (cache_key, cache_lookup))')
+        self._local.connection = connection
+        self._local.pid = pid
+        return connection
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, cache_key, cache_lookup, timeout):
+        connection = self._connection()
+        row = connection.execute(
+                'SELECT time_stored, data FROM cache '
+                'WHERE cache_key = ? AND cache_lookup = ?',
+                (cache_key, str(cache_lookup))).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        time_stored, data = row
+        if time.time() - time_stored >= timeout:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return simplejson.loads(zlib.decompress(data))
+
+    def get_entry(self, cache_key, cache_lookup):
+        row = self._connection().execute(
+                'SELECT data, time_stored, metadata FROM cache '
+                'WHERE cache_key = ? AND cache_lookup = ?',
+                (cache_key, str(cache_lookup))).fetchone()
+        if row is None:
+            return None
+        data, time_stored, metadata = row
+        if metadata is not None:
+            metadata = simplejson.loads(metadata)
+        return (simplejson.loads(zlib.decompress(data)), time_stored,
+                metadata)
+
+    def set(self, cache_key, cache_lookup, data, timeout=None,
+            metadata=None):
+        compressed = zlib.compress(simplejson.dumps(data),
+                                   self.compress_level)
+        if metadata is not None:
+            metadata = simplejson.dumps(metadata)
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO cache '
+                '(cache_key, cache_lookup, time_stored, timeout, data, '
+                'metadata) VALUES (?, ?, ?, ?, ?, ?)',
+                (cache_key, str(cache_lookup), time.time(), timeout,
+                 sqlite3.Binary(compressed), metadata))
+        with self._lock:
+            self._sets_since_sweep += 1
+            sweep = self._sets_since_sweep >= self.sweep_interval
+            if sweep:
+                self._sets_since_sweep = 0
+        if sweep:
+            self.sweep()
+
+    def delete(self, cache_key, cache_lookup):
+        with self._connection() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE cache_key = ? AND cache_lookup = ?',
+                (cache_key, str(cache_lookup)))
+
+    def delete_all(self, cache_key):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM cache WHERE cache_key = ?',
+                               (cache_key,))
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def sweep(self):
+        """Remove expired entries, then the oldest beyond ``max_entries``."""
+        with self._connection() as connection:
+            expired = connection.execute(
+                'DELETE FROM cache '
+                'WHERE timeout IS NOT NULL AND ? - time_stored >= timeout',
+                (time.time(),)).rowcount
+            if self.max_entries is not None:
+                connection.execute(
+                    'DELETE FROM cache WHERE rowid IN ('
+                    'SELECT rowid FROM cache ORDER BY time_stored DESC '
+                    'LIMIT -1 OFFSET ?)', (self.max_entries,))
+        with self._lock:
+            self.expirations += expired
+
+    def stats(self):
+        """
+        Return counters describing how the cache has been used.
+
+        Counters other than ``entries`` only cover use by this process.
+
+        :returns:
+            A dictionary of ``hits``, ``misses``, ``expirations`` and
+            ``entries``.
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'expirations': self.expirations,
+                    'entries': len(self)}
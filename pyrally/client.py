@@ -4,8 +4,9 @@ from pyrally.rally_access import get_accessor
 
 class RallyAPIClient(object):
 
-    def __init__(self, username, password, base_url):
-        self.rally_access = get_accessor(username, password, base_url)
+    def __init__(self, username, password, base_url, **accessor_kwargs):
+        self.rally_access = get_accessor(username, password, base_url,
+                                         **accessor_kwargs)
 
     def get_all_entities(self):
         """
@@ -67,3 +68,16 @@ class RallyAPIClient(object):
             could be found.
         """
         return Artifact.get_by_formatted_id(entity_id)
+
+    def get_entities_by_formatted_id(self, entity_ids):
+        """
+        Return the entities with the ids ``entity_ids``.
+
+        :param entity_ids:
+            A list of YYXXX ids of stories/defects/tasks.
+
+        :returns:
+            A dictionary of each id to a ``BaseRallyModel`` inheritted object,
+            or None if it could not be found.
+        """
+        return Artifact.get_many_by_formatted_id(entity_ids)
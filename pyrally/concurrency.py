@@ -0,0 +1,130 @@
+"""
+Helpers for running blocking Rally API calls concurrently.
+"""
+import threading
+from multiprocessing.pool import ThreadPool
+
+
+MAX_WORKERS = 4
+"""Default maximum number of API calls to have in flight at once."""
+
+_worker_state = threading.local()
+
+
+def run_as_worker(func, *args, **kwargs):
+    """
+    Call ``func`` with ``args`` and ``kwargs``, marking the current thread as
+    a worker so that :py:func:`~pyrally.concurrency.concurrent_map` calls
+    made from it run serially.
+    """
+    _worker_state.active = True
+    return func(*args, **kwargs)
+
+
+def concurrent_map(func, items, max_workers=None):
+    """
+    Call ``func`` on every item in ``items`` using a bounded thread pool.
+
+    Calls made from a worker thread, eg a ``get_all`` fetching its pages
+    for one of several queries being run at once, run serially. So nested
+    calls never have more than ``max_workers`` calls in flight between them.
+
+    :param func:
+        A callable taking a single item.
+
+    :param items:
+        An iterable of items to call ``func`` with.
+
+    :param max_workers:
+        The maximum number of calls to run at once. Defaults to
+        :py:data:`~pyrally.concurrency.MAX_WORKERS`.
+
+    :returns:
+        A list of the results of ``func`` in the same order as ``items``.
+
+    :raises:
+        The first exception raised by any call to ``func``.
+    """
+    items = list(items)
+    if max_workers is None:
+        max_workers = MAX_WORKERS
+    workers = min(max_workers, len(items))
+    if workers <= 1 or getattr(_worker_state, 'active', False):
+        return [func(item) for item in items]
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(lambda item: run_as_worker(func, item), items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def prefetch_map(func, items):
+    """
+    Lazily call ``func`` on each item in ``items``, one call ahead.
+
+    While the caller is working with the result for one item, the call for
+    the next item is already running in a background thread. At most two
+    results are held at any time.
+
+    :param func:
+        A callable taking a single item.
+
+    :param items:
+        An iterable of items to call ``func`` with.
+
+    :returns:
+        A :py:class:`~pyrally.concurrency.PrefetchIterator` over the results
+        of ``func`` in the same order as ``items``. The call for the first
+        item is started straight away. Call its ``close`` method if it isn't
+        iterated to the end.
+    """
+    return PrefetchIterator(func, items)
+
+
+class PrefetchIterator(object):
+
+    def __init__(self, func, items):
+        """
+        Start calling ``func`` on the first of ``items`` in the background.
+
+        See :py:func:`~pyrally.concurrency.prefetch_map`.
+        """
+        items = list(items)
+        self.func = func
+        self.pool = None
+        self.pending = None
+        self._items = iter(items[1:])
+        if items:
+            self.pool = ThreadPool(1)
+            self.pending = self.pool.apply_async(func, (items[0],))
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self.pending is None:
+            raise StopIteration
+        try:
+            result = self.pending.get()
+        except Exception:
+            self.close()
+            raise
+        try:
+            item = next(self._items)
+        except StopIteration:
+            self.close()
+        else:
+            self.pending = self.pool.apply_async(self.func, (item,))
+        return result
+
+    def close(self):
+        """Stop fetching ahead and end the background thread."""
+        self.pending = None
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,318 @@
+"""
+Persistent HTTP/1.1 connections used by
+:py:class:`~pyrally.rally_access.RallyAccessor`.
+
+Rather than building a new ``urllib2`` opener for every request (and paying
+for a TCP and TLS handshake plus a Basic auth challenge each time), requests
+are sent down keep-alive connections held in a
+:py:class:`~pyrally.connection.ConnectionPool`.
+
+Unlike a ``urllib2`` opener, the pool doesn't follow redirects: a ``3xx``
+response other than ``304 Not Modified`` is raised as a
+``urllib2.HTTPError``. Proxies are taken from the ``http_proxy`` and
+``https_proxy`` environment variables (honouring ``no_proxy``), but
+credentials in a proxy url aren't sent.
+"""
+import base64
+import httplib
+import os
+import socket
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+import zlib
+from collections import defaultdict, deque
+from StringIO import StringIO
+
+from pyrally.retry import IDEMPOTENT_METHODS
+
+
+POOL_SIZE = 4
+"""Maximum number of idle connections kept open per host."""
+IDLE_TIMEOUT = 60
+"""Seconds an idle connection may sit in the pool before being discarded."""
+ACCEPT_ENCODING = 'gzip, deflate'
+"""The response encodings :py:func:`~pyrally.connection.read_body` decodes."""
+READ_CHUNK_SIZE = 65536
+"""Bytes read at a time from compressed responses."""
+
+
+def read_body(response, chunk_size=READ_CHUNK_SIZE):
+    """
+    Read the body of ``response``, decompressing it as it arrives if it was
+    sent with a ``gzip`` or ``deflate`` ``Content-Encoding``.
+
+    :param response:
+        A response as returned by
+        :py:meth:`~pyrally.connection.ConnectionPool.urlopen`.
+
+    :returns:
+        A tuple of the decoded body and the number of bytes received.
+    """
+    encoding = response.info().get('content-encoding')
+    if encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        decompressor = zlib.decompressobj()
+    else:
+        body = response.read()
+        return body, len(body)
+
+    chunks = []
+    received = 0
+    while True:
+        chunk = response.read(chunk_size)
+        if not chunk:
+            break
+        try:
+            chunks.append(decompressor.decompress(chunk))
+        except zlib.error:
+            if encoding != 'deflate' or received:
+                raise
+            # Some servers send raw deflate data without the zlib header.
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            chunks.append(decompressor.decompress(chunk))
+        received += len(chunk)
+    chunks.append(decompressor.flush())
+    return ''.join(chunks), received
+
+
+def gzip_body(body, level=6):
+    """Return ``body`` compressed in the gzip format."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+class PooledResponse(object):
+    """A response read from a pooled connection.
+
+    Behaves enough like the object returned by ``urllib2.urlopen`` to be used
+    in its place. Closing the response hands the connection back to the pool
+    it came from.
+    """
+
+    def __init__(self, pool, pool_key, connection, response, retries=0):
+        self._pool = pool
+        self._pool_key = pool_key
+        self._connection = connection
+        self._response = response
+        self.retries = retries
+        """The number of times the request was resent before succeeding."""
+        self.code = self.status = response.status
+        self.msg = response.reason
+        self.headers = response.msg
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return self.code
+
+    def close(self):
+        """Release the underlying connection.
+
+        The connection is only put back into the pool if the body has been
+        fully read and the server has not asked for the connection to be
+        closed.
+        """
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool.release(self._pool_key, connection)
+        else:
+            self._response.close()
+            connection.close()
+
+
+class ConnectionPool(object):
+
+    def __init__(self, base_url, username, password, pool_size=POOL_SIZE,
+                 idle_timeout=IDLE_TIMEOUT,
+                 timeout=socket._GLOBAL_DEFAULT_TIMEOUT, proxies=None):
+        """
+        Set up a pool of keep-alive connections.
+
+        :param base_url:
+            The URL of the Rally server. Credentials are only ever sent to
+            this host.
+
+        :param username:
+            The username sent pre-emptively as Basic auth.
+
+        :param password:
+            The password sent pre-emptively as Basic auth.
+
+        :param pool_size:
+            The maximum number of idle connections kept per host. Requests
+            made while every pooled connection is busy open a new connection,
+            which is closed rather than pooled if the pool is already full.
+
+        :param idle_timeout:
+            Seconds after which an idle connection is discarded instead of
+            being reused.
+
+        :param timeout:
+            Socket timeout in seconds passed to each new connection.
+
+        :param proxies:
+            Optional dictionary of scheme to proxy url, eg
+            ``{'https': 'http://proxy:3128'}``. Defaults to the proxies set in
+            the environment.
+
+        Idle connections are only reused by the process which opened them,
+        so a pool may be shared with processes forked from this one.
+        """
+        self.auth_netloc = urlparse.urlsplit(base_url).netloc
+        credentials = '{0}:{1}'.format(username, password)
+        self.auth_header = 'Basic {0}'.format(base64.b64encode(credentials))
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.proxies = urllib.getproxies() if proxies is None else proxies
+        self._idle = defaultdict(deque)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _get_proxy(self, scheme, netloc):
+        """Return the ``host:port`` of the proxy to use for ``netloc``, or
+        ``None`` to connect directly."""
+        proxy = self.proxies.get(scheme)
+        if not proxy or urllib.proxy_bypass(netloc.split(':')[0]):
+            return None
+        return urlparse.urlsplit(proxy).netloc or proxy
+
+    def _new_connection(self, scheme, netloc):
+        """Return a new, unconnected ``httplib`` connection."""
+        if scheme == 'https':
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+        proxy = self._get_proxy(scheme, netloc)
+        if proxy is None:
+            return connection_class(netloc, timeout=self.timeout)
+        connection = connection_class(proxy, timeout=self.timeout)
+        if scheme == 'https':
+            connection.set_tunnel(netloc)
+        return connection
+
+    def _get_connection(self, pool_key):
+        """
+        Return a connection for ``pool_key``.
+
+        :returns:
+            A tuple of the connection and a boolean which is ``True`` if the
+            connection was reused from the pool.
+        """
+        now = time.time()
+        with self._lock:
+            if self._pid != os.getpid():
+                # The sockets belong to the parent process, so are left open
+                # for it rather than closed.
+                self._idle = defaultdict(deque)
+                self._pid = os.getpid()
+            idle = self._idle[pool_key]
+            while idle:
+                connection, released_at = idle.pop()
+                if now - released_at < self.idle_timeout:
+                    return connection, True
+                connection.close()
+        return self._new_connection(*pool_key), False
+
+    def release(self, pool_key, connection):
+        """Return ``connection`` to the pool so it can be reused."""
+        with self._lock:
+            idle = self._idle[pool_key]
+            if len(idle) < self.pool_size:
+                idle.append((connection, time.time()))
+                return
+        connection.close()
+
+    def clear(self):
+        """Close every idle connection held in the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, defaultdict(deque)
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+    def urlopen(self, request):
+        """
+        Send ``request`` down a pooled connection.
+
+        Only idempotent requests (see
+        :py:data:`~pyrally.retry.IDEMPOTENT_METHODS`) are sent down a
+        connection reused from the pool. The server may have closed it while
+        it sat idle, and they are sent again on a fresh connection if so.
+        Other requests, such as a ``POST``, always get a fresh connection, as
+        they can't safely be sent twice.
+
+        :param request:
+            A ``urllib2.Request`` object.
+
+        :returns:
+            A :py:class:`~pyrally.connection.PooledResponse`. It should be
+            closed once read so the connection can be reused.
+
+        :raises:
+            ``urllib2.HTTPError`` for responses with a status of 400 or above,
+            or a redirect, ``urllib2.URLError`` if the server could not be
+            reached.
+        """
+        url = request.get_full_url()
+        scheme, netloc, path, query, _ = urlparse.urlsplit(url)
+        selector = path or '/'
+        if query:
+            selector = '{0}?{1}'.format(selector, query)
+        if scheme == 'http' and self._get_proxy(scheme, netloc):
+            selector = url
+
+        headers = dict(request.header_items())
+        headers['Connection'] = 'keep-alive'
+        if netloc == self.auth_netloc:
+            headers['Authorization'] = self.auth_header
+
+        pool_key = (scheme, netloc)
+        method = request.get_method()
+        if method in IDEMPOTENT_METHODS:
+            connection, reused = self._get_connection(pool_key)
+        else:
+            connection, reused = self._new_connection(*pool_key), False
+        retries = 0
+        try:
+            connection.request(method, selector, request.get_data(), headers)
+            response = connection.getresponse()
+        except (httplib.HTTPException, socket.error), e:
+            connection.close()
+            if not reused:
+                raise urllib2.URLError(e)
+            # The server dropped a connection that was sitting idle in the
+            # pool; try once more on a fresh one.
+            connection = self._new_connection(*pool_key)
+            retries += 1
+            try:
+                connection.request(method, selector, request.get_data(),
+                                   headers)
+                response = connection.getresponse()
+            except (httplib.HTTPException, socket.error), e:
+                connection.close()
+                raise urllib2.URLError(e)
+
+        if response.status >= 400 or (response.status >= 300 and
+                                      response.status != 304):
+            error_response = PooledResponse(self, pool_key, connection,
+                                            response)
+            try:
+                body = read_body(error_response)[0]
+            except (httplib.HTTPException, socket.error), e:
+                raise urllib2.URLError(e)
+            finally:
+                error_response.close()
+            raise urllib2.HTTPError(url, response.status, response.reason,
+                                    response.msg, StringIO(body))
+        return PooledResponse(self, pool_key, connection, response, retries)
@@ -0,0 +1,157 @@
+"""
+Checkpoints for resuming queries which fetch many pages of results.
+
+A :py:class:`~pyrally.cursor.QueryCursor` is passed to
+:py:meth:`~pyrally.models.BaseRallyModel.get_all` (or
+:py:meth:`~pyrally.models.BaseRallyModel.get_all_results_for_query`). It
+records each page of results as it arrives and can be saved to disk, so if
+fetching is interrupted it can be continued later without fetching the
+completed pages again.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import simplejson
+
+
+ORDER = 'ObjectID'
+"""The field results are ordered by, so pages stay stable between runs."""
+SAVE_INTERVAL = 10
+"""Number of pages recorded between each save of a cursor with a path."""
+
+
+class QueryCursor(object):
+
+    def __init__(self, path=None, save_interval=SAVE_INTERVAL):
+        """
+        Set up an empty cursor.
+
+        :param path:
+            Optional file to save the cursor to. If given, the cursor is
+            saved every ``save_interval`` pages and whenever fetching stops.
+
+        :param save_interval:
+            The number of pages recorded between each save.
+        """
+        self.path = path
+        self.save_interval = save_interval
+        self.query = None
+        """A tuple of (rally_name, query_string, fields) being fetched."""
+        self.total = None
+        self.page_size = None
+        self.pages = {}
+        """start_index: list of results"""
+        self.total_changed = False
+        self._pages_since_save = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path, save_interval=SAVE_INTERVAL):
+        """
+        Return the cursor saved at ``path``, or a new one if nothing has
+        been saved there yet.
+        """
+        cursor = cls(path, save_interval)
+        if os.path.exists(path):
+            with open(path) as cursor_file:
+                cursor.update_from_dict(simplejson.load(cursor_file))
+        return cursor
+
+    def save(self):
+        """Write the cursor to ``self.path``, replacing it atomically."""
+        with self._lock:
+            self._pages_since_save = 0
+            data = simplejson.dumps(self.to_dict())
+        temp_path = '{0}.tmp'.format(self.path)
+        with open(temp_path, 'w') as cursor_file:
+            cursor_file.write(data)
+        os.rename(temp_path, self.path)
+
+    def to_dict(self):
+        """Return the state of the cursor as a dictionary of JSON types."""
+        with self._lock:
+            return {'query': self.query,
+                    'total': self.total,
+                    'page_size': self.page_size,
+                    'pages': dict((str(start), results)
+                                  for start, results in self.pages.items())}
+
+    def update_from_dict(self, data):
+        """Restore the state saved by :py:meth:`to_dict`."""
+        with self._lock:
+            self.query = data['query'] and tuple(data['query'])
+            self.total = data['total']
+            self.page_size = data['page_size']
+            self.pages = dict((int(start), results)
+                              for start, results in data['pages'].items())
+
+    def start(self, rally_name, query_string, fields):
+        """
+        Begin, or check the cursor is continuing, the given query.
+
+        :raises:
+            ``ValueError`` if the cursor holds pages for a different query.
+        """
+        query = (rally_name, query_string, list(fields) if fields else None)
+        with self._lock:
+            if self.query is None:
+                self.query = query
+            elif list(self.query) != list(query):
+                raise ValueError('QueryCursor holds results for {0!r}, not '
+                                 '{1!r}'.format(self.query, query))
+
+    def add_page(self, page):
+        """
+        Record a page of results.
+
+        :param page:
+            The QueryResult entity as returned by the API.
+
+        If the ``TotalResultCount`` of ``page`` differs from earlier pages,
+        ``total_changed`` is set.
+        """
+        with self._lock:
+            if self.total is not None and \
+                    page['TotalResultCount'] != self.total:
+                self.total_changed = True
+            self.total = page['TotalResultCount']
+            self.page_size = page['PageSize']
+            self.pages[page['StartIndex']] = page['Results']
+            self._pages_since_save += 1
+            save = (self.path is not None and
+                    self._pages_since_save >= self.save_interval)
+        if save:
+            self.save()
+
+    def discard_pages(self, start_indexes):
+        """Forget the pages at ``start_indexes`` so they are fetched again."""
+        with self._lock:
+            for start in start_indexes:
+                self.pages.pop(start, None)
+            self.total_changed = False
+
+    def get_missing_start_indexes(self):
+        """Return the ``start`` of every page which has not been recorded.
+
+        Pages beyond the current total are discarded.
+        """
+        with self._lock:
+            starts = range(1, self.total + 1, self.page_size)
+            for start in set(self.pages) - set(starts):
+                del self.pages[start]
+            return [start for start in starts if start not in self.pages]
+
+    def get_page_ids(self, start):
+        """Return the ObjectIDs of the results recorded at ``start``."""
+        with self._lock:
+            return [result[ORDER] for result in self.pages.get(start, [])]
+
+    def get_results(self):
+        """Return the recorded results in order, without duplicates."""
+        with self._lock:
+            results = OrderedDict()
+            for start in sorted(self.pages):
+                for result in self.pages[start]:
+                    results.setdefault(result[ORDER], result)
+            return results.values()
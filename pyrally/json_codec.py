@@ -0,0 +1,71 @@
+"""
+JSON codecs used to encode requests to and decode responses from Rally.
+
+Several JSON libraries are supported. By default the fastest one installed
+is used, in the order given by :py:data:`~pyrally.json_codec.PREFERENCE`.
+``simplejson`` is always available as it is a requirement of pyrally.
+"""
+
+
+PREFERENCE = ['orjson', 'ujson', 'simplejson', 'json']
+"""Names of the supported JSON libraries, fastest first."""
+
+
+class JSONCodec(object):
+
+    def __init__(self, name, loads, dumps):
+        """
+        Wrap the ``loads`` and ``dumps`` functions of a JSON library.
+
+        :param name:
+            The name of the library.
+
+        :param loads:
+            A callable taking a ``str`` of JSON and returning python objects.
+
+        :param dumps:
+            A callable taking python objects and returning a ``str`` of JSON.
+        """
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return '<JSONCodec {0}>'.format(self.name)
+
+
+def load_codec(name):
+    """
+    Return a :py:class:`~pyrally.json_codec.JSONCodec` for the library
+    ``name``.
+
+    :raises:
+        ``ImportError`` if the library is not installed, or ``ValueError`` if
+        it is not supported.
+    """
+    if name not in PREFERENCE:
+        raise ValueError('Unsupported JSON library {0!r}, expected one of '
+                         '{1}'.format(name, ', '.join(PREFERENCE)))
+    library = __import__(name)
+    return JSONCodec(name, library.loads, library.dumps)
+
+
+def get_codec(name=None):
+    """
+    Return a :py:class:`~pyrally.json_codec.JSONCodec`.
+
+    :param name:
+        The name of the library to use. If ``None``, the first library in
+        :py:data:`~pyrally.json_codec.PREFERENCE` which is installed is used.
+        A :py:class:`~pyrally.json_codec.JSONCodec` may also be passed, in
+        which case it is returned as it is.
+    """
+    if isinstance(name, JSONCodec):
+        return name
+    if name is not None:
+        return load_codec(name)
+    for name in PREFERENCE:
+        try:
+            return load_codec(name)
+        except ImportError:
+            continue
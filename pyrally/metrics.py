@@ -0,0 +1,198 @@
+"""
+Metrics recorded for calls made through
+:py:class:`~pyrally.rally_access.RallyAccessor`.
+
+A :py:class:`~pyrally.metrics.MetricsRegistry` is registered as a request
+hook on each accessor and breaks calls down by Rally type (the ``cache_key``
+returned by :py:meth:`~pyrally.rally_access.RallyAccessor.get_cacheable_info`),
+so cache timeouts can be tuned per type from real data.
+"""
+import bisect
+import threading
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+"""Upper bounds, in seconds, of the buckets latencies are counted in."""
+UNKNOWN_TYPE = 'unknown'
+"""The type metrics are recorded against for urls outside the API."""
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Count observed values in buckets.
+
+        :param buckets:
+            A sorted sequence of bucket upper bounds. Values greater than the
+            last bound are counted in an extra ``+Inf`` bucket.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Count ``value`` in the first bucket it is less than or equal to."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """
+        :returns:
+            A dictionary of ``buckets``, a list of ``(upper_bound,
+            cumulative_count)`` tuples ending with ``float('inf')``, plus
+            ``sum`` and ``count``.
+        """
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'buckets': buckets, 'sum': self.sum, 'count': self.count}
+
+
+class TypeMetrics(object):
+    """The metrics recorded for a single Rally type."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.requests = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.decode_time = 0.0
+        self.latency = Histogram(buckets)
+
+    def snapshot(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_hit_ratio': (float(self.cache_hits) / lookups
+                                    if lookups else None),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'decode_time': self.decode_time,
+                'latency': self.latency.snapshot()}
+
+
+class MetricsRegistry(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Set up an empty registry.
+
+        :param buckets:
+            The latency histogram bucket bounds, in seconds.
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._types = {}
+        """type: TypeMetrics"""
+
+    def record(self, event):
+        """
+        Record a request event, as passed to request hooks by
+        :py:meth:`~pyrally.rally_access.RallyAccessor.add_request_hook`.
+
+        ``GET`` requests answered from the cache count as cache hits, and
+        ones sent to the server as misses. Each attempt sent counts as a
+        request, but a ``GET`` retried by the retry policy only counts as
+        one miss, going by the event's ``attempt``.
+        """
+        rally_type = event.get('type') or UNKNOWN_TYPE
+        with self._lock:
+            metrics = self._types.get(rally_type)
+            if metrics is None:
+                metrics = self._types[rally_type] = TypeMetrics(self.buckets)
+            if event['cache_hit']:
+                metrics.cache_hits += 1
+                return
+            if event['method'] == 'GET' and not event.get('attempt'):
+                metrics.cache_misses += 1
+            metrics.requests += 1
+            if event['error'] is not None:
+                metrics.errors += 1
+            metrics.bytes_in += event['bytes']
+            metrics.bytes_out += event.get('bytes_sent', 0)
+            metrics.decode_time += event.get('decode_time', 0.0)
+            metrics.latency.observe(event['latency'])
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._types = {}
+
+    def snapshot(self):
+        """
+        Return a copy of the metrics recorded so far.
+
+        :returns:
+            A dictionary of type to a dictionary of:
+                * ``requests``: the number of requests sent to the server.
+                * ``errors``: how many of those requests failed.
+                * ``cache_hits`` and ``cache_misses``: ``GET`` calls answered
+                  from the cache, and those sent to the server.
+                * ``cache_hit_ratio``: the proportion of ``GET`` calls
+                  answered from the cache, or ``None`` if there were none.
+                * ``bytes_in`` and ``bytes_out``: response and request body
+                  bytes.
+                * ``decode_time``: total seconds spent loading JSON.
+                * ``latency``: a histogram of request latencies, see
+                  :py:meth:`~pyrally.metrics.Histogram.snapshot`.
+        """
+        with self._lock:
+            return dict((rally_type, metrics.snapshot())
+                        for rally_type, metrics in self._types.items())
+
+    def to_prometheus(self, prefix='pyrally'):
+        """
+        Return the metrics recorded so far in the Prometheus text format.
+
+        :param prefix:
+            Prepended to every metric name.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        counters = [('requests_total', 'requests',
+                     'Requests sent to Rally.'),
+                    ('request_errors_total', 'errors',
+                     'Requests to Rally which failed.'),
+                    ('cache_hits_total', 'cache_hits',
+                     'GET calls answered from the cache.'),
+                    ('cache_misses_total', 'cache_misses',
+                     'GET calls sent to Rally.'),
+                    ('received_bytes_total', 'bytes_in',
+                     'Response body bytes received from Rally.'),
+                    ('sent_bytes_total', 'bytes_out',
+                     'Request body bytes sent to Rally.'),
+                    ('decode_seconds_total', 'decode_time',
+                     'Seconds spent loading JSON responses.')]
+        for name, key, description in counters:
+            name = '{0}_{1}'.format(prefix, name)
+            lines.append('# HELP {0} {1}'.format(name, description))
+            lines.append('# TYPE {0} counter'.format(name))
+            for rally_type in sorted(snapshot):
+                lines.append('{0}{{type="{1}"}} {2}'.format(
+                                name, rally_type, snapshot[rally_type][key]))
+
+        name = '{0}_request_latency_seconds'.format(prefix)
+        lines.append('# HELP {0} Latency of requests sent to Rally.'.format(
+                                                                        name))
+        lines.append('# TYPE {0} histogram'.format(name))
+        for rally_type in sorted(snapshot):
+            latency = snapshot[rally_type]['latency']
+            for bound, count in latency['buckets']:
+                bound = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{0}_bucket{{type="{1}",le="{2}"}} {3}'.format(
+                                            name, rally_type, bound, count))
+            lines.append('{0}_sum{{type="{1}"}} {2!r}'.format(
+                                        name, rally_type, latency['sum']))
+            lines.append('{0}_count{{type="{1}"}} {2}'.format(
+                                        name, rally_type, latency['count']))
+        return '\n'.join(lines) + '\n'
@@ -2,11 +2,37 @@
 For the latest API information go to
 https://rally1.rallydev.com/slm/doc/webservice/
 """
-from pyrally.rally_access import get_accessor
+import threading
+import time
+from collections import OrderedDict
+
+from pyrally.concurrency import concurrent_map, prefetch_map
+from pyrally.cursor import ORDER
+from pyrally.paging import PAGE_SIZE, AdaptivePageSizer, clamp_page_size
+from pyrally.query import MAX_QUERY_LENGTH, Q, chunk_queries
+from pyrally.rally_access import get_accessor, get_async_accessor
 
 from pyrally.register import register_type, API_OBJECT_TYPES
 
 
+INCREMENTAL_FIELDS = ['ObjectID', 'LastUpdateDate']
+"""Fields always fetched for incremental queries."""
+FORMATTED_ID_PREFIXES = {'US': 'HierarchicalRequirement',
+                         'DE': 'Defect',
+                         'TA': 'Task',
+                         'TC': 'TestCase'}
+"""FormattedID prefix: the ``rally_name`` of the type it belongs to."""
+FORMATTED_ID_REFS = OrderedDict()
+"""(rally_name, upper case FormattedID): ``_ref`` of objects seen in query
+results, used to look objects up by FormattedID without a query. Only the
+:py:data:`~pyrally.models.FORMATTED_ID_REFS_SIZE` most recently seen are
+kept."""
+FORMATTED_ID_REFS_SIZE = 10000
+"""The most FormattedIDs held in :py:data:`~pyrally.models.FORMATTED_ID_REFS`.
+"""
+FORMATTED_ID_REFS_LOCK = threading.Lock()
+
+
 class ReferenceNotFoundException(Exception):
     pass
 
@@ -24,23 +50,300 @@ def get_query_clauses(clauses, joiner=' and '):
         are joined together using this operator.
 
     :returns:
-        A single query_clause string containing all of ``clauses``.
+        A single query_clause string containing all of ``clauses``, built as
+        a balanced tree by :py:class:`~pyrally.query.Q`.
+    """
+    return Q.combine(joiner, clauses).to_query()
+
+
+def split_query_clauses(clauses, max_length=MAX_QUERY_LENGTH):
+    """
+    Return query strings which ``and`` together ``clauses``.
+
+    If the query is too long to send to the API, it is split into several
+    with :py:meth:`~pyrally.query.Q.split`. The results of each query should
+    be merged with :py:func:`~pyrally.models.merge_results`.
+
+    :param clauses:
+        A list of clause strings or :py:class:`~pyrally.query.Q` objects.
+
+    :returns:
+        A list of query strings.
+    """
+    return [query.to_query() for query in Q.all_of(clauses).split(max_length)]
+
+
+def merge_results(result_lists):
+    """
+    Merge lists of query results, leaving out repeats of the same object.
+
+    :returns:
+        A list of the results, in the order first seen.
+    """
+    seen = set()
+    merged = []
+    for results in result_lists:
+        for result in results:
+            if result['_ref'] not in seen:
+                seen.add(result['_ref'])
+                merged.append(result)
+    return merged
+
+
+def chunk_clauses(clauses, joiner=' or ', max_length=MAX_QUERY_LENGTH):
+    """
+    Split ``clauses`` into groups which each make a short enough query when
+    joined with ``joiner`` by :py:func:`~pyrally.models.get_query_clauses`.
+    See :py:func:`~pyrally.query.chunk_queries`.
+    """
+    return chunk_queries(clauses, joiner, max_length)
+
+
+def get_object_id(reference):
+    """
+    Return the ObjectID at the end of the API ``reference``.
+
+    :param reference:
+        A reference url such as ``.../1.29/task/5128087372.js``.
+
+    :returns:
+        The ObjectID string, or ``None`` if one can't be found.
+    """
+    object_id = reference.rstrip('/').split('/')[-1].replace('.js', '')
+    if object_id.isdigit():
+        return object_id
+    return None
+
+
+def load_from_refs(skeletons):
+    """
+    Load full objects for a list of reference skeletons.
+
+    Rather than fetching each reference one after another, references are
+    grouped by type and loaded with one ``ObjectID`` query per type, split
+    into several queries if needed by
+    :py:func:`~pyrally.models.chunk_clauses`. References which can't be
+    batched (eg because no ObjectID can be found in them) are fetched
+    concurrently with
+    :py:meth:`~pyrally.models.BaseRallyModel.create_from_ref`.
+
+    :param skeletons:
+        A list of dictionaries with ``_ref`` and ``_type`` keys, as found in
+        ``rally_data`` for collections such as ``Tasks``.
+
+    :returns:
+        A list of :py:class:`~pyrally.models.BaseRallyModel` inheriting
+        objects in the same order as ``skeletons``. References which could
+        not be found in Rally are left out.
+    """
+    batches = {}
+    unbatched = []
+    skeleton_keys = []
+    for skeleton in skeletons:
+        object_class = API_OBJECT_TYPES.get(skeleton['_type'], BaseRallyModel)
+        object_id = get_object_id(skeleton['_ref'])
+        if object_class is not BaseRallyModel and object_id:
+            batches.setdefault(object_class, []).append(object_id)
+            skeleton_keys.append((object_class, object_id))
+        else:
+            unbatched.append((object_class, skeleton['_ref']))
+            skeleton_keys.append((object_class, skeleton['_ref']))
+
+    jobs = []
+    for object_class, object_ids in batches.items():
+        oid_clauses = ['ObjectID = {0}'.format(object_id)
+                       for object_id in object_ids]
+        for chunk in chunk_clauses(oid_clauses):
+            jobs.append((object_class, get_query_clauses(chunk, ' or ')))
+
+    def load_batch(job):
+        object_class, query = job
+        return [((object_class, str(obj.ObjectID)), obj)
+                for obj in object_class.get_all([query])]
+
+    def load_single(job):
+        object_class, reference = job
+        try:
+            return [((object_class, reference),
+                     object_class.create_from_ref(reference))]
+        except ReferenceNotFoundException:
+            return []
+
+    loaded = {}
+    for results in concurrent_map(load_batch, jobs):
+        loaded.update(results)
+    for results in concurrent_map(load_single, unbatched):
+        loaded.update(results)
+
+    return [loaded[key] for key in skeleton_keys if key in loaded]
+
+
+def _remember_formatted_id(rally_name, formatted_id, reference):
+    """Record ``reference`` as the ``_ref`` of ``formatted_id``, forgetting
+    the least recently seen FormattedIDs once there are too many."""
+    index_key = (rally_name, formatted_id.upper())
+    with FORMATTED_ID_REFS_LOCK:
+        FORMATTED_ID_REFS.pop(index_key, None)
+        FORMATTED_ID_REFS[index_key] = reference
+        while len(FORMATTED_ID_REFS) > FORMATTED_ID_REFS_SIZE:
+            FORMATTED_ID_REFS.popitem(last=False)
+
+
+def _reference_key(reference):
+    """Return a key identifying ``reference`` regardless of its form."""
+    return get_object_id(reference) or reference
+
+
+def prefetch_related(objects, *attr_names):
     """
-    if len(clauses) == 1:
-        return '{0}'.format(clauses[0])
-    else:
-        total_clauses = []
-        first_two = clauses[:2]
-        for clause in first_two:
-            formatted_clause = '({0})'.format(get_query_clauses([clause]))
+    Load reference attributes for a whole set of objects at once.
 
-            total_clauses.append(formatted_clause)
+    Without this, touching ``story.Owner`` on each of a list of stories
+    makes a request per story. Instead, the distinct references held in each
+    of ``attr_names`` across all of ``objects`` are collected and loaded in one
+    go by :py:func:`~pyrally.models.load_from_refs`, and the loaded objects
+    are attached to each object so no further requests are needed.
 
-        new_clauses = []
-        new_clauses.append(joiner.join(total_clauses))
-        if len(clauses) > 2:
-            new_clauses.extend(clauses[2:])
-        return get_query_clauses(new_clauses, joiner)
+    :param objects:
+        A list of :py:class:`~pyrally.models.BaseRallyModel` inheriting
+        objects.
+
+    :param attr_names:
+        Names of attributes to load. These may be references held in
+        ``rally_data`` (eg ``Owner``, ``Project``) or properties from
+        ``sub_objects_dynamic_loader`` (eg ``tasks``).
+
+    :returns:
+        ``objects``, for convenience.
+    """
+    skeletons = {}
+    to_attach = []
+    for obj in objects:
+        rally_data = obj.rally_data
+        for attr_name in attr_names:
+            if obj._full_sub_objects and attr_name in obj._full_sub_objects:
+                continue
+            if attr_name in rally_data:
+                rally_item = rally_data[attr_name]
+                if not (isinstance(rally_item, dict) and '_ref' in rally_item):
+                    continue
+                obj_skeletons = [rally_item]
+            elif attr_name in obj.sub_objects_dynamic_loader:
+                rally_data_equivalent = \
+                                    obj.sub_objects_dynamic_loader[attr_name]
+                if obj._partial and rally_data_equivalent not in rally_data:
+                    # Left to be loaded, along with the full object, on
+                    # first access.
+                    continue
+                obj_skeletons = rally_data.get(rally_data_equivalent, [])
+            else:
+                continue
+            for skeleton in obj_skeletons:
+                skeletons.setdefault(_reference_key(skeleton['_ref']),
+                                     skeleton)
+            to_attach.append((obj, attr_name, obj_skeletons))
+
+    loaded = {}
+    for loaded_obj in load_from_refs(skeletons.values()):
+        loaded[_reference_key(loaded_obj.ref)] = loaded_obj
+
+    for obj, attr_name, obj_skeletons in to_attach:
+        keys = [_reference_key(skeleton['_ref'])
+                for skeleton in obj_skeletons]
+        if attr_name in obj.rally_data:
+            obj._memoize(attr_name, loaded.get(keys[0]))
+        else:
+            obj._memoize(attr_name, [loaded[key] for key in keys
+                                     if key in loaded])
+    return objects
+
+
+def _write_all(write, objects, max_workers=None):
+    """
+    Call ``write`` on every object concurrently, collecting failures.
+
+    :returns:
+        A list of ``(obj, exception)`` tuples for each call that raised, in
+        the same order as ``objects``.
+    """
+    def write_one(obj):
+        try:
+            write(obj)
+        except Exception, e:
+            return obj, e
+
+    return [error for error in concurrent_map(write_one, objects, max_workers)
+            if error is not None]
+
+
+def bulk_update(objects, max_workers=None):
+    """
+    Send updates for many objects to Rally at once.
+
+    Each object's changes are sent as in
+    :py:meth:`~pyrally.models.BaseRallyModel.update_rally`, with up to
+    ``max_workers`` requests in flight at a time. A failure doesn't stop the
+    other updates being sent.
+
+    :param objects:
+        A list of :py:class:`~pyrally.models.BaseRallyModel` inheriting
+        objects which already exist in Rally.
+
+    :param max_workers:
+        Passed to :py:func:`~pyrally.concurrency.concurrent_map`.
+
+    :returns:
+        A list of ``(obj, exception)`` tuples for the objects which could not
+        be updated. Empty if every update succeeded.
+    """
+    return _write_all(lambda obj: obj._send_update(), objects, max_workers)
+
+
+def bulk_create(objects, refresh=True, max_workers=None):
+    """
+    Create many objects in Rally at once.
+
+    Creates are sent concurrently as in :py:func:`~pyrally.models.bulk_update`.
+    The ``_ref`` of each new object is stored in its ``rally_data``.
+
+    :param refresh:
+        If ``True``, the created objects are fetched again afterwards with
+        :py:func:`~pyrally.models.load_from_refs` (one ``ObjectID`` query per
+        type rather than one request per object) and their ``rally_data``
+        replaced with what Rally holds. If ``False``, no fetch is made.
+
+    :returns:
+        A list of ``(obj, exception)`` tuples for the objects which could not
+        be created. Empty if every create succeeded.
+    """
+    errors = _write_all(lambda obj: obj._send_create(), objects, max_workers)
+    if refresh:
+        failed = set(id(obj) for obj, _ in errors)
+        created = [obj for obj in objects if id(obj) not in failed]
+        loaded = {}
+        for loaded_obj in load_from_refs([{'_ref': obj.ref,
+                                           '_type': obj.rally_name}
+                                          for obj in created]):
+            loaded[_reference_key(loaded_obj.ref)] = loaded_obj
+        for obj in created:
+            loaded_obj = loaded.get(_reference_key(obj.ref))
+            if loaded_obj is not None:
+                obj.rally_data = loaded_obj.rally_data
+    return errors
+
+
+def bulk_delete(objects, max_workers=None):
+    """
+    Delete many objects from Rally at once.
+
+    Deletes are sent concurrently as in
+    :py:func:`~pyrally.models.bulk_update`.
+
+    :returns:
+        A list of ``(obj, exception)`` tuples for the objects which could not
+        be deleted. Empty if every delete succeeded.
+    """
+    return _write_all(lambda obj: obj.delete(), objects, max_workers)
 
 
 class RegisterModels(type):
@@ -56,9 +359,42 @@ class RegisterModels(type):
         register_type(cls)
 
 
+SLOT_NAMES = ('rally_data', '_partial', '_full_sub_objects', '_changed')
+"""Attributes of every model instance, held in ``__slots__``."""
+
+
+class RallyField(object):
+    """Reads a field from the ``rally_data`` of model instances.
+
+    Added to model classes by
+    :py:meth:`~pyrally.models.BaseRallyModel.__getattr__` for each field read,
+    so the next read of the field doesn't have to fail normal attribute
+    lookup first. If an instance doesn't hold the field, lookup carries on in
+    ``__getattr__``.
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            rally_item = obj.rally_data[self.name]
+        except KeyError:
+            return obj.__getattr__(self.name)
+        if rally_item.__class__ is dict:
+            return obj._resolve_rally_item(self.name, rally_item)
+        return rally_item
+
+
 class BaseRallyModel(object):
 
     __metaclass__ = RegisterModels
+    __slots__ = SLOT_NAMES + ('__dict__', '__weakref__')
+    """Instances only get a ``__dict__`` if other attributes are set on them.
+    """
     sub_objects_dynamic_loader = {}
     """A dictionary of ``property_name``: ``key_name``.
 
@@ -66,69 +402,165 @@ class BaseRallyModel(object):
     refers to a dynamically loaded list of items found in the ``rally_data``
     key ``key_name``.
     """
+    page_size = PAGE_SIZE
+    """The number of results fetched per page by queries for this class, or
+    an :py:class:`~pyrally.paging.AdaptivePageSizer` to tune it as pages are
+    fetched."""
 
-    def __init__(self, data_dict={}):
-        self._full_sub_objects = {}
+    def __init__(self, data_dict={}, partial=False):
+        """
+        Create an object from the data returned by Rally.
+
+        :param data_dict:
+            The dictionary of data for this object returned by the API.
+
+        :param partial:
+            Boolean. ``True`` if ``data_dict`` only holds some of the object's
+            fields (ie it was fetched with a ``fields`` projection). Missing
+            fields are fetched from Rally the first time they are accessed.
+        """
+        self._full_sub_objects = None
+        self._changed = None
+        self._partial = partial
         self.rally_data = data_dict
 
-    def __getattribute__(self, attr_name):
-        """Patch the default __getattribute__ call to be better for us.
+    def __getattr__(self, attr_name):
+        """Look up attributes not found on the object or its class.
 
-        Rather than *only* looking at the __dict__ of the object do determine
-        attribute resolution, improve so that:
+        This is only called once normal attribute lookup has failed, so
+        methods, properties and class attributes are found without any
+        extra work. Then:
 
             * Attributes are looked at in the underlying ``rally_data`` stored
               against the object.
 
-                * If found in this data and it is a dictionary, load a new
-                  python object up with the data.
+                * If found in this data and it is a reference to another
+                  object, load a new python object up with the data.
                 * Otherwise, just return the data.
 
+              A :py:class:`~pyrally.models.RallyField` is added to the class
+              for the attribute, so that it is found by normal lookup from
+              then on.
+
             * If not found there, attributes are looked at in
               ``sub_objects_dynamic_loader``. This is a dictionary of
               ``property_name`` to ``rally_data`` key. If ``attr_name`` exists
-              in this mapping, the corresponding data is dynamically loaded and
-              returned.
-            * If neither of these yield results, return the standard object
-              __getattribute__ result.
-        """
-        # Filter out the attributes we require to make decisions in this
-        # method. Otherwise, we'll get "Maximum recursion depth" errors.
-        if attr_name in ['rally_data', 'sub_objects_dynamic_loader',
-                         '_full_sub_objects']:
-            return object.__getattribute__(self, attr_name)
-
-        rally_data = object.__getattribute__(self, 'rally_data')
+              in this mapping, the corresponding data is dynamically loaded
+              with :py:func:`~pyrally.models.load_from_refs` and returned.
+            * If that fails and the object was only partially fetched, fetch
+              the full object and look again.
+        """
+        if attr_name in SLOT_NAMES or attr_name.startswith('__'):
+            # Not set yet (eg during __init__ or unpickling).
+            raise AttributeError(attr_name)
+
+        rally_data = self.rally_data
         if attr_name in rally_data:
-            rally_item = rally_data[attr_name]
-            if isinstance(rally_item, dict) and '_ref' in rally_item:
-                rally_name = rally_item['_type']
-                object_class = API_OBJECT_TYPES.get(rally_name, BaseRallyModel)
-                try:
-                    return object_class.create_from_ref(rally_item['_ref'])
-                except ReferenceNotFoundException:
-                    return None
-            else:
-                return rally_item
-        else:
-            # If it is not in the rally data, let's check if we're trying to
-            # access an auto-loading attribute.
-            if attr_name in self.sub_objects_dynamic_loader:
-
-                if attr_name not in self._full_sub_objects:
-                    rally_data_equivalent = \
-                                    self.sub_objects_dynamic_loader[attr_name]
-                    self._full_sub_objects[attr_name] = []
-                    for skeleton in self.rally_data.get(rally_data_equivalent,
-                                                        []):
-                        rally_name = skeleton['_type']
-                        object_class = API_OBJECT_TYPES.get(rally_name,
-                                                            BaseRallyModel)
-                        self._full_sub_objects[attr_name].append(
-                                    object_class.create_from_ref(
-                                                             skeleton['_ref']))
-                return self._full_sub_objects[attr_name]
-            return object.__getattribute__(self, attr_name)
+            cls = type(self)
+            if attr_name not in cls.__dict__:
+                setattr(cls, attr_name, RallyField(attr_name))
+            return self._resolve_rally_item(attr_name, rally_data[attr_name])
+
+        # If it is not in the rally data, let's check if we're trying to
+        # access an auto-loading attribute.
+        if attr_name in self.sub_objects_dynamic_loader:
+            full_sub_objects = self._full_sub_objects
+            if full_sub_objects is None or attr_name not in full_sub_objects:
+                rally_data_equivalent = \
+                                self.sub_objects_dynamic_loader[attr_name]
+                if rally_data_equivalent not in self.rally_data:
+                    self._load_missing_fields()
+                return self._memoize(attr_name, load_from_refs(
+                        self.rally_data.get(rally_data_equivalent, [])))
+            return full_sub_objects[attr_name]
+
+        if not self._partial:
+            raise AttributeError(
+                    '{0!r} object has no attribute {1!r}'.format(
+                                            type(self).__name__, attr_name))
+        self._load_missing_fields()
+        return getattr(self, attr_name)
+
+    def _resolve_rally_item(self, attr_name, rally_item):
+        """Return the value of ``rally_item``, the data for ``attr_name``.
+
+        References to other objects are loaded the first time they're read
+        and kept until the field is set again, unless already loaded by
+        :py:func:`~pyrally.models.prefetch_related`.
+        """
+        if isinstance(rally_item, dict) and '_ref' in rally_item:
+            full_sub_objects = self._full_sub_objects
+            if full_sub_objects and attr_name in full_sub_objects:
+                return full_sub_objects[attr_name]
+            rally_name = rally_item['_type']
+            object_class = API_OBJECT_TYPES.get(rally_name, BaseRallyModel)
+            try:
+                obj = object_class.create_from_ref(rally_item['_ref'])
+            except ReferenceNotFoundException:
+                obj = None
+            return self._memoize(attr_name, obj)
+        return rally_item
+
+    def _memoize(self, attr_name, value):
+        """Store ``value`` as the loaded object(s) for ``attr_name``.
+
+        The dictionary they're stored in is only created when first needed.
+
+        :returns:
+            ``value``
+        """
+        if self._full_sub_objects is None:
+            self._full_sub_objects = {}
+        self._full_sub_objects[attr_name] = value
+        return value
+
+    def _forget(self, attr_name):
+        """Forget any loaded object(s) stored for ``attr_name``."""
+        if self._full_sub_objects:
+            self._full_sub_objects.pop(attr_name, None)
+
+    def _mark_changed(self, attr_name):
+        """Record that ``attr_name`` has been changed locally."""
+        if self._changed is None:
+            self._changed = set()
+        self._changed.add(attr_name)
+        self._forget(attr_name)
+
+    def get_changed_data(self):
+        """Return the fields changed since the object was loaded or saved.
+
+        Only changes made by setting attributes or with
+        :py:meth:`~pyrally.models.BaseRallyModel.update` are seen.
+
+        :returns:
+            A dictionary of field name to new value.
+        """
+        return dict((name, self.rally_data[name])
+                    for name in self._changed or ()
+                    if name in self.rally_data)
+
+    def __getstate__(self):
+        state = dict((name, getattr(self, name)) for name in SLOT_NAMES)
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def _load_missing_fields(self):
+        """Fetch the full object from Rally if only some fields are held.
+
+        Fields already held in ``rally_data`` are kept as they are, so any
+        local changes are not lost.
+        """
+        if not self._partial:
+            return
+        full_object = self.__class__.create_from_ref(self.ref,
+                                                     use_identity_map=False)
+        for key, value in full_object.rally_data.items():
+            self.rally_data.setdefault(key, value)
+        self._partial = False
 
     def __setattr__(self, name, value):
         """
@@ -136,12 +568,30 @@ class BaseRallyModel(object):
 
         If the value is present as a key in in self.rally_data, then we'll
         set it there, otherwise we will set it on self.
+
+        The object may be partial, in which case a field that wasn't fetched
+        is set in self.rally_data too, so long as ``name`` is CamelCase like
+        Rally's field names (eg ``KanbanState``) and isn't defined on the
+        class. Use :py:meth:`~pyrally.models.BaseRallyModel.update` to set
+        other fields.
         """
-        if hasattr(self, 'rally_data') and name in self.rally_data:
+        if name in SLOT_NAMES:
+            super(BaseRallyModel, self).__setattr__(name, value)
+        elif name in self.rally_data or self._is_unfetched_field(name):
             self.rally_data[name] = value
+            self._mark_changed(name)
         else:
             super(BaseRallyModel, self).__setattr__(name, value)
 
+    def _is_unfetched_field(self, name):
+        """Return ``True`` if ``name`` may be a field not fetched for a
+        partial object.
+        """
+        if not self._partial or not name[:1].isupper():
+            return False
+        class_attr = getattr(type(self), name, None)
+        return class_attr is None or isinstance(class_attr, RallyField)
+
     @classmethod
     def set_cache_timeout(cls, timeout):
         """Set the cache timeout for this object type.
@@ -152,12 +602,20 @@ class BaseRallyModel(object):
         get_accessor().set_cache_timeout(cls.rally_name, timeout)
 
     @classmethod
-    def create_from_ref(cls, reference):
+    def create_from_ref(cls, reference, use_identity_map=True):
         """Create an instance of ``cls`` by getting data for ``reference``.
 
         :param reference:
             The full url reference to make an api call with.
 
+        :param use_identity_map:
+            Boolean. If ``True`` and an instance loaded for ``reference`` is
+            still in use, that instance is returned, so objects such as a
+            shared ``Iteration`` are only held once. It is brought up to date
+            with the data from the cache, or from Rally once the cache entry
+            has expired. An instance with unsaved changes isn't shared. See
+            :py:meth:`~pyrally.rally_access.RallyAccessor.get_live_object`.
+
         :returns:
             A populated :py:exc:`~pyrally.models.BaseRallyModel` inheriting
             instance which matches the reference.
@@ -166,7 +624,8 @@ class BaseRallyModel(object):
             A :py:class:`~pyrally.models.ReferenceNotFoundException` if we get
             any error back from the API.
         """
-        response = get_accessor().make_api_call(reference, True)
+        accessor = get_accessor()
+        response = accessor.make_api_call(reference, True)
         errors = response.get('OperationResult', {'Errors': []}).get('Errors')
         if errors:
             msg = """
@@ -177,62 +636,477 @@ class BaseRallyModel(object):
         around in Rally after a delete (eg if a User was deleted).
         """.format(cls, reference, errors)
             raise ReferenceNotFoundException(msg)
-        return cls(response[cls.rally_name])
+        rally_data = response[cls.rally_name]
+        if not use_identity_map:
+            return cls(rally_data)
+
+        # Shared objects hold a copy of the data, so changes made to them
+        # don't reach the cache before they're saved.
+        identity_key = (cls.rally_name.lower(), _reference_key(reference))
+        obj = accessor.get_live_object(identity_key)
+        if not isinstance(obj, cls):
+            obj = cls(dict(rally_data))
+            accessor.add_live_object(identity_key, obj)
+        elif obj._changed:
+            return cls(dict(rally_data))
+        elif obj.rally_data != rally_data:
+            obj.rally_data = dict(rally_data)
+            obj._full_sub_objects = None
+        return obj
+
+    @classmethod
+    def create_from_ref_async(cls, reference):
+        """Asynchronous version of
+        :py:meth:`~pyrally.models.BaseRallyModel.create_from_ref`.
+
+        :returns:
+            A ``multiprocessing.pool.AsyncResult`` for the instance. Its
+            ``get`` method raises
+            :py:class:`~pyrally.models.ReferenceNotFoundException` if the
+            API returned errors.
+        """
+        return get_async_accessor().submit(cls.create_from_ref, reference)
+
+    @classmethod
+    def get_all_async(cls, *args, **kwargs):
+        """Asynchronous version of
+        :py:meth:`~pyrally.models.BaseRallyModel.get_all`.
+
+        Takes the same arguments as
+        :py:meth:`~pyrally.models.BaseRallyModel.get_all`.
+
+        :returns:
+            A ``multiprocessing.pool.AsyncResult`` for the list of objects.
+        """
+        return get_async_accessor().submit(cls.get_all, *args, **kwargs)
+
+    def fetch(self, attr_name):
+        """Load the attribute ``attr_name`` without blocking the caller.
+
+        This is most useful for references and
+        ``sub_objects_dynamic_loader`` collections, which are loaded from
+        Rally when first accessed, eg ``story.fetch('tasks').get()``.
+
+        :returns:
+            A ``multiprocessing.pool.AsyncResult`` for the attribute's value.
+        """
+        return get_async_accessor().submit(getattr, self, attr_name)
 
     @classmethod
-    def get_all(cls, clauses=None):
+    def get_all(cls, clauses=None, related=None, fields=None,
+                incremental=False, cursor=None, page_size=None):
         """
         Return all the items for the rally class.
 
         :param clauses:
-            Optional parameter of a list of clauses to be ``and`` ed together
-            by :py:func:`~pyrally.models.get_query_clauses`.
+            Optional parameter of a list of clause strings or
+            :py:class:`~pyrally.query.Q` objects to be ``and`` ed together.
+            If the query is too long for one request, it is split by
+            :py:func:`~pyrally.models.split_query_clauses`, the queries are
+            sent concurrently and their results merged.
+
+        :param related:
+            Optional list of attribute names to load for every object with
+            :py:func:`~pyrally.models.prefetch_related`.
+
+        :param fields:
+            Optional list of field names to fetch, rather than every field.
+            Any other field is fetched the first time it is accessed.
+
+        :param incremental:
+            Boolean. If ``True``, only objects updated since the last call
+            with the same query are fetched, see
+            :py:meth:`~.BaseRallyModel.get_all_results_for_query`.
+
+        :param cursor:
+            Optional :py:class:`~pyrally.cursor.QueryCursor` to record
+            progress in, so an interrupted call can be continued. Can't be
+            used if the query has to be split.
+
+        :param page_size:
+            Optional number of results to fetch per page, or an
+            :py:class:`~pyrally.paging.AdaptivePageSizer`. Defaults to the
+            ``page_size`` of the class.
 
         :returns:
             A list of :py:class:`~pyrally.models.BaseRallyModel` inheriting
             objects.
+
+        :raises:
+            ``ValueError`` if ``cursor`` is given and the query has to be
+            split.
         """
         if clauses:
-            query_string = get_query_clauses(clauses)
+            query_strings = split_query_clauses(clauses)
+        else:
+            query_strings = ['']
+        if len(query_strings) == 1:
+            results = cls.get_all_results_for_query(query_strings[0],
+                                                    fields=fields,
+                                                    incremental=incremental,
+                                                    cursor=cursor,
+                                                    page_size=page_size)
+        elif cursor is not None:
+            raise ValueError("A cursor can't be used for a query split into "
+                             "{0} queries.".format(len(query_strings)))
+        else:
+            get_results = lambda query_string: cls.get_all_results_for_query(
+                                                    query_string,
+                                                    fields=fields,
+                                                    incremental=incremental,
+                                                    page_size=page_size)
+            results = merge_results(concurrent_map(get_results,
+                                                   query_strings))
+
+        objects = cls.convert_from_query_result(results, full_objects=True,
+                                                partial=bool(fields))
+        if related:
+            prefetch_related(objects, *related)
+        return objects
+
+    @classmethod
+    def iter_all(cls, clauses=None, prefetch=False, related=None,
+                 fields=None, page_size=None):
+        """
+        Yield all the items for the rally class, a page at a time.
+
+        Unlike :py:meth:`~pyrally.models.BaseRallyModel.get_all`, objects are
+        yielded as soon as the page containing them has arrived and only one
+        page of results is held in memory at a time.
+
+        :param clauses:
+            Optional list of clauses, see
+            :py:meth:`~pyrally.models.BaseRallyModel.get_all`. If the query
+            has to be split, each query is fetched in turn and objects
+            already yielded are left out.
+
+        :param prefetch:
+            Boolean. If ``True``, the next page is fetched in the background
+            while objects from the current page are being consumed.
+
+        :param related:
+            Optional list of attribute names to load for the objects in each
+            page with :py:func:`~pyrally.models.prefetch_related`.
+
+        :param fields:
+            Optional list of field names to fetch, see
+            :py:meth:`~pyrally.models.BaseRallyModel.get_all`.
+
+        :param page_size:
+            Optional number of results to fetch per page, see
+            :py:meth:`~pyrally.models.BaseRallyModel.get_all`.
+
+        :returns:
+            A generator of :py:class:`~pyrally.models.BaseRallyModel`
+            inheriting objects.
+        """
+        query_strings = split_query_clauses(clauses) if clauses else ['']
+        seen = set()
+        for results in cls._iter_results_for_queries(query_strings, prefetch,
+                                                      fields, page_size):
+            if len(query_strings) > 1:
+                results = [result for result in results
+                           if result['_ref'] not in seen]
+                seen.update(result['_ref'] for result in results)
+            objects = cls.convert_from_query_result(results,
+                                                    full_objects=True,
+                                                    partial=bool(fields))
+            if related:
+                prefetch_related(objects, *related)
+            for obj in objects:
+                yield obj
+
+    @classmethod
+    def _iter_results_for_queries(cls, query_strings, prefetch, fields,
+                                  page_size):
+        """Yield the pages of results of each of ``query_strings`` in turn.
+        """
+        for query_string in query_strings:
+            for results in cls.iter_results_for_query(query_string, prefetch,
+                                                      fields=fields,
+                                                      page_size=page_size):
+                yield results
+
+    @classmethod
+    def iter_results_for_query(cls, query_string, prefetch=False,
+                               fields=None, page_size=None):
+        """
+        Yield the results for the given query one page at a time.
+
+        :param query_string:
+            The query to filter results by. If None, all results are returned
+            for the object.
+
+        :param prefetch:
+            Boolean. If ``True``, each page is requested before the previous
+            one has been consumed, using
+            :py:func:`~pyrally.concurrency.prefetch_map`.
+
+        :param fields:
+            Optional list of field names to fetch. All fields are fetched if
+            not given.
+
+        :param page_size:
+            Optional number of results to fetch per page, see
+            :py:meth:`~pyrally.models.BaseRallyModel._get_results_page`.
+
+        :returns:
+            A generator of lists of object results, one list per page.
+        """
+        page_size, sizer = cls._get_query_page_size(page_size)
+        fetch_page = lambda start: cls._get_results_page(query_string, start,
+                                                         fields=fields,
+                                                         page_size=page_size,
+                                                         sizer=sizer)
+        first_page = fetch_page(1)
+        start_indexes = cls._get_remaining_start_indexes(first_page)
+        if prefetch:
+            pages = prefetch_map(fetch_page, start_indexes)
         else:
-            query_string = ''
-        results = cls.get_all_results_for_query(query_string)
+            pages = (fetch_page(start) for start in start_indexes)
 
-        return cls.convert_from_query_result(results, full_objects=True)
+        try:
+            yield first_page['Results']
+            for page in pages:
+                yield page['Results']
+        finally:
+            # Stops the background thread if the caller stops early.
+            pages.close()
 
     @classmethod
-    def get_all_results_for_query(cls, query_string):
+    def get_all_results_for_query(cls, query_string, fields=None,
+                                  incremental=False, use_cache=True,
+                                  cursor=None, page_size=None):
         """
         Return all the results for the given query.
 
-        Increment the ``start`` argument until entire result set has been
-        retrieved and return just the results.
+        The first page is fetched to find out ``TotalResultCount`` and
+        ``PageSize``, then every remaining page is fetched concurrently using
+        :py:func:`~pyrally.concurrency.concurrent_map`.
 
         :param query_string:
             The query to filter results by. If None, all results are returned
             for the object.
 
+        :param fields:
+            Optional list of field names to fetch. All fields are fetched if
+            not given.
+
+        :param incremental:
+            Boolean. If ``True``, the whole result set is kept in the cache.
+            Once it is older than the ``<type>_query`` cache timeout, only
+            objects with a ``LastUpdateDate`` since the last fetch are
+            requested and merged in. See
+            :py:meth:`~pyrally.models.BaseRallyModel._get_incremental_results`.
+
+        :param use_cache:
+            Boolean. If ``False``, pages are always fetched from Rally rather
+            than the cache.
+
+        :param cursor:
+            Optional :py:class:`~pyrally.cursor.QueryCursor` to record pages
+            in as they arrive, so an interrupted call can be continued by
+            passing the same cursor again. See
+            :py:meth:`~pyrally.models.BaseRallyModel._get_cursor_results`.
+
+        :param page_size:
+            Optional number of results to fetch per page, see
+            :py:meth:`~pyrally.models.BaseRallyModel._get_results_page`.
+
         :returns:
-            A list of full object results (ie fetch=true is set in the API
-            GET)
-        """
-        more_pages = True
-        start_index = 1
-        all_results = []
-        while more_pages:
-            query_result_dict = cls._get_results_page(query_string,
-                                                      start_index)
-            all_results.extend(query_result_dict['Results'])
-            start_index = (query_result_dict['PageSize'] +
-                           query_result_dict['StartIndex'])
-
-            total_results = query_result_dict['TotalResultCount']
-            more_pages = len(all_results) < total_results
+            A list of object results (ie fetch=true is set in the API GET
+            unless ``fields`` is given), in the order the API returned them.
+        """
+        if incremental:
+            return cls._get_incremental_results(query_string, fields)
+        if cursor is not None:
+            return cls._get_cursor_results(query_string, fields, cursor,
+                                           page_size)
+
+        page_size, sizer = cls._get_query_page_size(page_size)
+        fetch_page = lambda start: cls._get_results_page(query_string, start,
+                                                         fields=fields,
+                                                         use_cache=use_cache,
+                                                         page_size=page_size,
+                                                         sizer=sizer)
+        first_page = fetch_page(1)
+        all_results = list(first_page['Results'])
+
+        pages = concurrent_map(fetch_page,
+                               cls._get_remaining_start_indexes(first_page))
+        for page in pages:
+            all_results.extend(page['Results'])
 
         return all_results
 
     @classmethod
-    def _get_results_page(cls, query_string, start_index=1):
+    def _get_cursor_results(cls, query_string, fields, cursor,
+                            page_size=None):
+        """
+        Return all the results for the query, continuing from ``cursor``.
+
+        Results are ordered by ``ObjectID`` so pages hold the same objects
+        between runs. Only pages not already recorded in ``cursor`` are
+        fetched. If the ``TotalResultCount`` changes part way through,
+        objects before some pages have been added or removed, so the
+        ObjectIDs of every recorded page are checked with a cheap query and
+        only the pages which have shifted are fetched again.
+
+        Once ``cursor`` has recorded a page, its page size is used rather
+        than ``page_size``, so that pages line up between runs.
+
+        :raises:
+            ``ValueError`` if ``cursor`` holds results for another query, or
+            whatever error stopped a page being fetched. ``cursor`` keeps the
+            pages which were fetched.
+        """
+        cursor.start(cls.rally_name, query_string, fields)
+        if fields and ORDER not in fields:
+            fields = list(fields) + [ORDER]
+        page_size, sizer = cls._get_query_page_size(page_size)
+
+        def fetch_page(start):
+            cursor.add_page(cls._get_results_page(
+                                query_string, start, fields=fields,
+                                use_cache=False, order=ORDER,
+                                page_size=cursor.page_size or page_size,
+                                sizer=sizer))
+
+        def get_shifted_page(start):
+            page = cls._get_results_page(query_string, start,
+                                         fields=[ORDER], use_cache=False,
+                                         order=ORDER,
+                                         page_size=cursor.page_size)
+            ids = [result[ORDER] for result in page['Results']]
+            if ids != cursor.get_page_ids(start):
+                return start
+
+        try:
+            if cursor.total is None:
+                fetch_page(1)
+            while True:
+                concurrent_map(fetch_page, cursor.get_missing_start_indexes())
+                if not cursor.total_changed:
+                    break
+                shifted = concurrent_map(get_shifted_page, sorted(
+                                                            cursor.pages))
+                cursor.discard_pages([start for start in shifted
+                                      if start is not None])
+        finally:
+            if cursor.path is not None:
+                cursor.save()
+        return cursor.get_results()
+
+    @classmethod
+    def _get_incremental_results(cls, query_string, fields=None):
+        """
+        Return all the results for the query, refreshing only what changed.
+
+        The full result set is stored in the accessor's cache along with the
+        time it was stored. Once that is older than the ``<type>_query``
+        cache timeout:
+
+            * Objects matching the query with a ``LastUpdateDate`` at or after
+              the latest one held are fetched and merged into the result set.
+            * If Rally then reports a different number of results for the
+              query (eg because an object no longer matches it), the whole
+              result set is fetched again.
+
+        :returns:
+            A list of object results.
+        """
+        if fields:
+            fields = list(fields) + [field for field in INCREMENTAL_FIELDS
+                                     if field not in fields]
+        accessor = get_accessor()
+        rally_type = cls.rally_name.lower()
+        cache_key = '{0}_incremental'.format(rally_type)
+        cache_lookup = 'query={0}&fetch={1}'.format(
+                        query_string, ','.join(fields) if fields else 'true')
+        cache_timeout = accessor.cache_timeouts.get(
+                                    '{0}_query'.format(rally_type),
+                                    accessor.default_cache_timeout)
+
+        entry = accessor.cache.get_entry(cache_key, cache_lookup)
+        if entry is None:
+            results = cls.get_all_results_for_query(query_string, fields,
+                                                    use_cache=False)
+        else:
+            results, time_stored, _ = entry
+            if time.time() - time_stored < cache_timeout:
+                return results
+            results = cls._merge_updated_results(query_string, fields,
+                                                 results)
+
+        # Stored with no timeout; the result set is refreshed rather than
+        # thrown away once it is older than cache_timeout.
+        accessor.cache.set(cache_key, cache_lookup, results)
+        return results
+
+    @classmethod
+    def _merge_updated_results(cls, query_string, fields, results):
+        """
+        Merge objects updated since ``results`` were fetched into them.
+
+        :returns:
+            The new list of results, or a fresh full result set if objects
+            have left the query since ``results`` were fetched.
+        """
+        update_dates = [result['LastUpdateDate'] for result in results
+                        if result.get('LastUpdateDate')]
+        if not update_dates:
+            return cls.get_all_results_for_query(query_string, fields,
+                                                 use_cache=False)
+
+        updated_clause = 'LastUpdateDate >= "{0}"'.format(max(update_dates))
+        if query_string:
+            updated_query = get_query_clauses([query_string, updated_clause])
+        else:
+            updated_query = updated_clause
+        updated = cls.get_all_results_for_query(updated_query, fields,
+                                                use_cache=False)
+
+        merged = OrderedDict((result['_ref'], result) for result in results)
+        for result in updated:
+            merged[result['_ref']] = result
+
+        total = cls._get_results_page(query_string, 1, fields=['ObjectID'],
+                                      use_cache=False,
+                                      page_size=1)['TotalResultCount']
+        if total != len(merged):
+            return cls.get_all_results_for_query(query_string, fields,
+                                                 use_cache=False)
+        return merged.values()
+
+    @staticmethod
+    def _get_remaining_start_indexes(first_page):
+        """Return the ``start`` of every page of a query after ``first_page``.
+        """
+        page_size = first_page['PageSize']
+        return range(first_page['StartIndex'] + page_size,
+                     first_page['TotalResultCount'] + 1,
+                     page_size)
+
+    @classmethod
+    def _get_query_page_size(cls, page_size):
+        """
+        Return the ``(page_size, sizer)`` to use for every page of a query.
+
+        The remaining pages of a query start at multiples of the first page's
+        size, so an :py:class:`~pyrally.paging.AdaptivePageSizer` has its
+        page size read just once per query. It is returned as ``sizer`` to
+        observe each page, which changes the page size of later queries.
+        """
+        if page_size is None:
+            page_size = cls.page_size
+        if isinstance(page_size, AdaptivePageSizer):
+            return page_size.page_size, page_size
+        return page_size, None
+
+    @classmethod
+    def _get_results_page(cls, query_string, start_index=1, fields=None,
+                          use_cache=True, order=None, page_size=None,
+                          sizer=None):
         """
         Get a page of results for the query given.
 
@@ -241,11 +1115,33 @@ class BaseRallyModel(object):
             is passed in and all objects for the class will be returned.
 
         :param start_index:
-            The 1-based offset to fetch from. A pagesize of 100 is returned.
+            The 1-based offset to fetch from.
+
+        :param fields:
+            Optional list of field names to fetch, sent as
+            ``fetch=Name,FormattedID,...``. If not given, ``fetch=true`` is
+            sent and every field is returned.
+
+        :param use_cache:
+            Boolean. If ``False``, the page is always fetched from Rally.
+
+        :param order:
+            Optional field name to sort results by.
+
+        :param page_size:
+            The number of results to fetch, at most
+            :py:data:`~pyrally.paging.MAX_PAGE_SIZE`. Defaults to the
+            ``page_size`` of the class. If an
+            :py:class:`~pyrally.paging.AdaptivePageSizer` is given, its
+            current page size is used and it observes the response.
+
+        :param sizer:
+            Optional :py:class:`~pyrally.paging.AdaptivePageSizer` to observe
+            the response, when ``page_size`` was already read from it.
 
         :returns:
             The QueryResult entity as returned by the API, containing at most
-            100 results.
+            ``page_size`` results.
 
         :raises:
             Exception if ['QueryResult']['Errors'] contains anything.
@@ -254,18 +1150,33 @@ class BaseRallyModel(object):
         if query_string:
             query_arg = "query=({0})&".format(query_string)
 
-        url = "{0}.js?{1}pagesize=100&start={2}&fetch=true".format(
-                        cls.rally_name.lower(), query_arg, start_index)
+        if sizer is None:
+            page_size, sizer = cls._get_query_page_size(page_size)
+        elif page_size is None:
+            page_size = sizer.page_size
 
-        query_result_dict = get_accessor().make_api_call(url)
+        fetch = ','.join(fields) if fields else 'true'
+        url = "{0}.js?{1}pagesize={2}&start={3}&fetch={4}".format(
+                        cls.rally_name.lower(), query_arg,
+                        clamp_page_size(page_size), start_index, fetch)
+        if order:
+            url = "{0}&order={1}".format(url, order)
+
+        response_info = {}
+        query_result_dict = get_accessor().make_api_call(
+                        url, use_cache=use_cache, response_info=response_info)
 
         if query_result_dict['QueryResult']['Errors']:
             raise Exception('Errors in query: {0}'.format(
                              query_result_dict['QueryResult']['Errors']))
+        if sizer is not None and 'bytes' in response_info:
+            sizer.observe(len(query_result_dict['QueryResult']['Results']),
+                          response_info['bytes'], response_info['latency'])
         return query_result_dict['QueryResult']
 
     @classmethod
-    def convert_from_query_result(cls, results, full_objects=False):
+    def convert_from_query_result(cls, results, full_objects=False,
+                                  partial=False):
         """Convert a set of Rally results into python objects.
 
         :param results:
@@ -277,6 +1188,10 @@ class BaseRallyModel(object):
             the URL. If ``False``, the full object data is fetched using
             :py:meth:`~pyrally.models.BaseRallyModel.create_from_ref`.
 
+        :param partial:
+            Boolean. If ``True``, ``results`` only hold some fields of each
+            object, and the objects created fetch the rest when needed.
+
         :returns:
             A list of full :py:class:`~pyrally.models.BaseRallyModel`
             inheriting python objects.
@@ -286,37 +1201,139 @@ class BaseRallyModel(object):
             object_class = API_OBJECT_TYPES.get(result['_type'],
                                                 BaseRallyModel)
             if full_objects:
-                new_obj = object_class(result)
+                new_obj = object_class(result, partial=partial)
+                formatted_id = result.get('FormattedID')
+                if formatted_id and '_ref' in result:
+                    _remember_formatted_id(result['_type'], formatted_id,
+                                           result['_ref'])
             else:
                 new_obj = object_class.create_from_ref(result['_ref'])
             converted_results.append(new_obj)
         return converted_results
 
     @classmethod
-    def get_by_formatted_id(cls, formatted_id):
+    def get_class_for_formatted_id(cls, formatted_id):
+        """Return the class to look up ``formatted_id`` with.
+
+        :returns:
+            ``cls``. :py:class:`~pyrally.models.Artifact` finds the type from
+            the prefix of ``formatted_id`` instead.
+        """
+        return cls
+
+    @classmethod
+    def get_by_formatted_id(cls, formatted_id, fields=None):
         """Return all the objects by the given formatted_id.
 
+        If an object with this FormattedID has been seen in the results of an
+        earlier query, it is loaded from its ``_ref`` (and so may come from
+        the cache) rather than being queried for.
+
         :param name:
             The name to search for. The get is performed by setting
             FormattedID=``formatted_id`` in the url.
 
+        :param fields:
+            Optional list of field names to fetch, see
+            :py:meth:`~pyrally.models.BaseRallyModel.get_all`.
+            ``FormattedID`` is always fetched. Ignored if the object is loaded
+            from its ``_ref``.
+
         :returns:
             A single :py:class:`~pyrally.models.BaseRallyModel` inheriting
             object with the FormattedID = formatted_id. Or ``None`` if one
             cannot be found.
         """
+        object_class = cls.get_class_for_formatted_id(formatted_id)
+        if object_class is not cls:
+            return object_class.get_by_formatted_id(formatted_id, fields)
+        index_key = (cls.rally_name, formatted_id.upper())
+        reference = FORMATTED_ID_REFS.get(index_key)
+        if reference is not None:
+            try:
+                return cls.create_from_ref(reference)
+            except ReferenceNotFoundException:
+                with FORMATTED_ID_REFS_LOCK:
+                    FORMATTED_ID_REFS.pop(index_key, None)
         clauses = ['FormattedID = "{0}"'.format(formatted_id)]
-        all_objects = cls.get_all(clauses)
+        if fields and 'FormattedID' not in fields:
+            fields = list(fields) + ['FormattedID']
+        all_objects = cls.get_all(clauses, fields=fields)
         # Strangely, this returns for us444: de444, ta444 and us444.
         for obj in all_objects:
             if obj.FormattedID.lower() == formatted_id.lower():
                 return obj
         return None
 
+    @classmethod
+    def get_many_by_formatted_id(cls, formatted_ids, fields=None):
+        """Return the objects for many FormattedIDs at once.
+
+        FormattedIDs seen in earlier query results are loaded with
+        :py:func:`~pyrally.models.load_from_refs`. The rest are looked up
+        with one ``or`` query per type, split into several queries if needed
+        by :py:func:`~pyrally.models.chunk_clauses`.
+
+        :param formatted_ids:
+            A list of FormattedIDs, eg ``['US123', 'US124']``.
+
+        :param fields:
+            Optional list of field names to fetch for objects which are
+            queried for, see
+            :py:meth:`~pyrally.models.BaseRallyModel.get_all`.
+
+        :returns:
+            A dictionary of each of ``formatted_ids`` to its object, or
+            ``None`` if it cannot be found.
+        """
+        formatted_ids_by_class = OrderedDict()
+        for formatted_id in formatted_ids:
+            object_class = cls.get_class_for_formatted_id(formatted_id)
+            formatted_ids_by_class.setdefault(object_class, []).append(
+                                                        formatted_id.upper())
+
+        found = {}
+        for object_class, class_ids in formatted_ids_by_class.items():
+            found.update(object_class._get_many_by_formatted_id(class_ids,
+                                                                fields))
+        return dict((formatted_id, found.get(formatted_id.upper()))
+                    for formatted_id in formatted_ids)
+
+    @classmethod
+    def _get_many_by_formatted_id(cls, formatted_ids, fields=None):
+        """Return a dictionary of upper case FormattedID to object for
+        ``formatted_ids``, all of which belong to ``cls``."""
+        skeletons = []
+        for formatted_id in formatted_ids:
+            reference = FORMATTED_ID_REFS.get((cls.rally_name, formatted_id))
+            if reference is not None:
+                skeletons.append({'_ref': reference, '_type': cls.rally_name})
+        found = {}
+        for obj in load_from_refs(skeletons):
+            found[obj.FormattedID.upper()] = obj
+
+        missing = set(formatted_ids) - set(found)
+        if fields and 'FormattedID' not in fields:
+            fields = list(fields) + ['FormattedID']
+        clauses = ['FormattedID = "{0}"'.format(formatted_id)
+                   for formatted_id in sorted(missing)]
+
+        def query_chunk(chunk):
+            return cls.get_all([get_query_clauses(chunk, ' or ')],
+                               fields=fields)
+
+        for objects in concurrent_map(query_chunk, chunk_clauses(clauses)):
+            for obj in objects:
+                formatted_id = obj.FormattedID.upper()
+                if formatted_id in missing:
+                    found.setdefault(formatted_id, obj)
+        return found
+
     def update(self, **kwargs):
         """Update all the attributes in ``rally_data`` specified in kwargs."""
         for attrname, value in kwargs.items():
             self.rally_data[attrname] = value
+            self._mark_changed(attrname)
 
     @property
     def title(self):
@@ -336,39 +1353,72 @@ class BaseRallyModel(object):
         """Update or create ``self`` on Rally.
 
         If there is no sign of a _ref internally, a create is sent,
-        otherwise an update is sent.
+        otherwise an update is sent. Updates only send the fields returned by
+        :py:meth:`~pyrally.models.BaseRallyModel.get_changed_data`, and
+        aren't sent at all if nothing has changed.
 
         :param refresh:
             Used on creates. If ``True`` a fetch is performed after the object
             is created in Rally and ``self`` is populated with the new data.
+            Otherwise only the new ``_ref`` is stored.
 
         :returns:
-            The response from the server.
+            The response from the server, or ``None`` if there was nothing to
+            update.
         """
         if self.ref:
-            # Do update
-            data = {self.rally_name: self.rally_data}
-            response = get_accessor().make_api_call(self.ref,
-                                                    True,
-                                                    method='POST',
-                                                    data=data)
-            if response['OperationResult']['Errors']:
-                raise Exception('Errors in query: {0}'.format(
-                                 response['OperationResult']['Errors']))
-        else:
-            data = {self.rally_name: self.rally_data}
-            url = "{0}/create.js".format(self.rally_name.lower())
-            response = get_accessor().make_api_call(url,
-                                                    method='POST',
-                                                    data=data)
-            if response['CreateResult']['Errors']:
-                raise Exception('Errors in query: {0}'.format(
-                                 response['CreateResult']['Errors']))
-            reference = response['CreateResult']['Object']['_ref']
-            if refresh:
-                self.delete_from_cache()
-                new_data = get_accessor().make_api_call(reference, True)
-                self.rally_data = new_data[self.rally_name]
+            return self._send_update()
+        response = self._send_create()
+        if refresh:
+            self.delete_from_cache()
+            new_data = get_accessor().make_api_call(self.ref, True)
+            self.rally_data = new_data[self.rally_name]
+        return response
+
+    def _send_update(self):
+        """POST the changed fields to Rally as an update of ``self``.
+
+        The cache is brought up to date by the accessor, see
+        :py:meth:`~pyrally.rally_access.RallyAccessor._write_through`.
+
+        :returns:
+            The response from the server, or ``None`` if nothing has changed.
+        """
+        if not self.ref:
+            raise Exception("Cannot update item that is not synced with Rally."
+                            " Try running update_rally() to create it.")
+        changes = self.get_changed_data()
+        if not changes:
+            return None
+        data = {self.rally_name: changes}
+        response = get_accessor().make_api_call(self.ref,
+                                                True,
+                                                method='POST',
+                                                data=data)
+        if response['OperationResult']['Errors']:
+            raise Exception('Errors in query: {0}'.format(
+                             response['OperationResult']['Errors']))
+        self._changed = None
+        return response
+
+    def _send_create(self):
+        """POST ``rally_data`` to Rally to create ``self``.
+
+        The ``_ref`` of the new object is stored in ``rally_data``.
+
+        :returns:
+            The response from the server.
+        """
+        data = {self.rally_name: self.rally_data}
+        url = "{0}/create.js".format(self.rally_name.lower())
+        response = get_accessor().make_api_call(url,
+                                                method='POST',
+                                                data=data)
+        if response['CreateResult']['Errors']:
+            raise Exception('Errors in query: {0}'.format(
+                             response['CreateResult']['Errors']))
+        self.rally_data['_ref'] = response['CreateResult']['Object']['_ref']
+        self._changed = None
         return response
 
     def delete(self):
@@ -382,16 +1432,30 @@ class BaseRallyModel(object):
         if response['OperationResult']['Errors']:
             raise Exception('Errors in delete: {0}'.format(
                                  response['OperationResult']['Errors']))
-        self.delete_from_cache()
 
     def delete_from_cache(self):
         """Remove this item from the cache"""
-        get_accessor().delete_from_cache(self.rally_name, self.ref)
+        get_accessor().delete_url_from_cache(self.ref)
 
 
 class Artifact(BaseRallyModel):
     rally_name = 'Artifact'
 
+    @classmethod
+    def get_class_for_formatted_id(cls, formatted_id):
+        """Return the class to look up ``formatted_id`` with.
+
+        Rather than searching every type of artifact, the type is found from
+        the prefix of ``formatted_id`` in
+        :py:data:`~pyrally.models.FORMATTED_ID_PREFIXES`, eg ``Defect`` for
+        ``DE123``.
+
+        :returns:
+            The class for the type, or ``cls`` if the prefix isn't known.
+        """
+        prefix = formatted_id.rstrip('0123456789').upper()
+        return API_OBJECT_TYPES.get(FORMATTED_ID_PREFIXES.get(prefix), cls)
+
 
 class Task(BaseRallyModel):
     rally_name = 'Task'
@@ -416,26 +1480,42 @@ class HierarchicalRequirement(BaseRallyModel):
     sub_objects_dynamic_loader = {'tasks': 'Tasks', 'children': 'Children'}
 
     @classmethod
-    def get_all_in_kanban_states(cls, kanban_states):
+    def get_all_in_kanban_states(cls, kanban_states, **kwargs):
         """
         Get all the stories in the given kanban_state.
 
         :param kanban_state:
             A list of kanban states to search on.
 
+        :param kwargs:
+            Passed on to :py:meth:`~pyrally.models.BaseRallyModel.get_all`,
+            eg ``related``, ``fields`` or ``incremental``.
+
         :returns:
             A list of ``Story`` objects, as returned by get_all
         """
         or_clauses = ['KanbanState = "{0}"'.format(state) \
                       for state in kanban_states]
-        clauses = get_query_clauses(or_clauses, ' or ')
 
-        return cls.get_all([clauses])
+        return cls.get_all([Q.any_of(or_clauses)], **kwargs)
 
     @classmethod
-    def get_all_in_iteration(cls, iteration_name):
+    def get_all_in_iteration(cls, iteration_name, **kwargs):
+        """
+        Get all the stories in the iteration named ``iteration_name``.
+
+        :param iteration_name:
+            The name of the iteration to search on.
+
+        :param kwargs:
+            Passed on to :py:meth:`~pyrally.models.BaseRallyModel.get_all`,
+            eg ``related``, ``fields`` or ``incremental``.
+
+        :returns:
+            A list of ``Story`` objects, as returned by get_all
+        """
         clauses = ['Iteration.Name = "{0}"'.format(iteration_name)]
-        return cls.get_all(clauses)
+        return cls.get_all(clauses, **kwargs)
 
     @property
     def rally_url(self):
@@ -451,21 +1531,24 @@ class Defect(BaseRallyModel):
     sub_objects_dynamic_loader = {'tasks': 'Tasks'}
 
     @classmethod
-    def get_all_in_kanban_states(cls, kanban_states):
+    def get_all_in_kanban_states(cls, kanban_states, **kwargs):
         """
         Get all the defects in the given kanban_state.
 
         :param kanban_state:
             A list of kanban states to search on.
 
+        :param kwargs:
+            Passed on to :py:meth:`~pyrally.models.BaseRallyModel.get_all`,
+            eg ``related``, ``fields`` or ``incremental``.
+
         :returns:
             A list of ``Defect`` objects, as returned by get_all
         """
         or_clauses = ['KanbanState = "{0}"'.format(state) \
                       for state in kanban_states]
-        clauses = get_query_clauses(or_clauses, ' or ')
 
-        return cls.get_all([clauses])
+        return cls.get_all([Q.any_of(or_clauses)], **kwargs)
 
     @property
     def rally_url(self):
@@ -0,0 +1,86 @@
+"""
+Page sizes used when fetching query results from Rally.
+
+Models fetch :py:data:`~pyrally.paging.PAGE_SIZE` results per request by
+default. This can be changed per call, or per class with the ``page_size``
+class attribute of :py:class:`~pyrally.models.BaseRallyModel`. Either may be
+an :py:class:`~pyrally.paging.AdaptivePageSizer`, which tunes the page size
+from the size and latency of the responses it sees.
+"""
+import threading
+
+
+PAGE_SIZE = 100
+"""Default number of results fetched per page."""
+MAX_PAGE_SIZE = 200
+"""The largest page size the Rally API allows."""
+TARGET_BYTES = 1024 * 1024
+"""Response size an :py:class:`~pyrally.paging.AdaptivePageSizer` aims for."""
+TARGET_LATENCY = 2.0
+"""Response time in seconds an :py:class:`~pyrally.paging.AdaptivePageSizer`
+aims for."""
+
+
+def clamp_page_size(page_size):
+    """Return ``page_size`` limited to between 1 and ``MAX_PAGE_SIZE``."""
+    return max(1, min(MAX_PAGE_SIZE, int(page_size)))
+
+
+class AdaptivePageSizer(object):
+
+    def __init__(self, initial=PAGE_SIZE, target_bytes=TARGET_BYTES,
+                 target_latency=TARGET_LATENCY, smoothing=0.5):
+        """
+        Choose page sizes from the pages fetched so far.
+
+        Fewer, larger pages mean fewer round trips, so pages grow up to
+        :py:data:`~pyrally.paging.MAX_PAGE_SIZE` unless a page of that size
+        would be larger than ``target_bytes`` or take longer than
+        ``target_latency`` to arrive. Narrow ``fields`` projections quickly
+        reach the maximum, whereas pages of large objects shrink.
+
+        :param initial:
+            The page size used before any pages have been seen.
+
+        :param target_bytes:
+            The largest response, in bytes, to aim for.
+
+        :param target_latency:
+            The longest response time, in seconds, to aim for.
+
+        :param smoothing:
+            Between 0 and 1. How far each observation moves the page size
+            towards the size it suggests.
+        """
+        self.page_size = clamp_page_size(initial)
+        self.target_bytes = target_bytes
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def observe(self, result_count, response_bytes, latency):
+        """
+        Adjust the page size given a page which was fetched.
+
+        :param result_count:
+            The number of results in the page.
+
+        :param response_bytes:
+            The size of the response in bytes.
+
+        :param latency:
+            The seconds taken to get the response.
+        """
+        if not result_count:
+            return
+        suggested = MAX_PAGE_SIZE
+        if response_bytes:
+            suggested = min(suggested,
+                            self.target_bytes * result_count / response_bytes)
+        if latency:
+            suggested = min(suggested,
+                            self.target_latency * result_count / latency)
+        with self._lock:
+            self.page_size = clamp_page_size(round(
+                    self.page_size +
+                    self.smoothing * (suggested - self.page_size)))
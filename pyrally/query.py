@@ -0,0 +1,251 @@
+"""
+Building query strings for the Rally API.
+
+The API only joins two clauses at a time, each in brackets, eg
+``(A = 1) and (B = 2)``. A :py:class:`~pyrally.query.Q` holds any number of
+clauses joined by ``and`` or ``or``, and renders them as a balanced tree of
+these pairs::
+
+    >>> owners = Q.any_of(['Owner.Name = "a"', 'Owner.Name = "b"'])
+    >>> print (owners & ~Q('State = "Accepted"')).to_query()
+    ((Owner.Name = "a") or (Owner.Name = "b")) and (State != "Accepted")
+
+Queries with too many clauses to fit in a url can be split into several
+shorter ones with :py:meth:`~pyrally.query.Q.split`.
+"""
+import re
+
+
+MAX_QUERY_LENGTH = 2000
+"""The maximum length, once made url safe, of a query sent to the API."""
+AND = ' and '
+OR = ' or '
+NEGATED_JOINERS = {AND: OR, OR: AND}
+NEGATED_OPERATORS = {'=': '!=', '!=': '=',
+                     '<': '>=', '>=': '<',
+                     '>': '<=', '<=': '>',
+                     'contains': '!contains', '!contains': 'contains'}
+CLAUSE_PATTERN = re.compile(r'^(\S+)\s+(!=|<=|>=|=|<|>|!contains|contains)\s+'
+                            r'(.*)$', re.DOTALL)
+
+
+def url_safe_length(clause):
+    """Return the length of ``clause`` once it has been made url safe."""
+    return len(clause) + 2 * sum(clause.count(char) for char in ' ()"')
+
+
+def negate_clause(clause):
+    """
+    Return the opposite of a single ``clause``, eg ``A != 1`` for ``A = 1``.
+
+    :raises:
+        ``ValueError`` if ``clause`` isn't a single comparison.
+    """
+    match = None
+    if not clause.startswith('('):
+        match = CLAUSE_PATTERN.match(clause.strip())
+    if match is None:
+        raise ValueError("Can't negate the clause {0!r}".format(clause))
+    field, operator, value = match.groups()
+    return '{0} {1} {2}'.format(field, NEGATED_OPERATORS[operator], value)
+
+
+def chunk_queries(items, joiner=OR, max_length=MAX_QUERY_LENGTH):
+    """
+    Split ``items`` into groups which each make a short enough query.
+
+    :param items:
+        A list of clause strings or :py:class:`~pyrally.query.Q` objects.
+
+    :param joiner:
+        The operator the items in each group will be joined with.
+
+    :param max_length:
+        The maximum url safe length of the query built from each group.
+
+    :returns:
+        A list of lists of items. Every item appears in exactly one group, in
+        the original order.
+    """
+    # In a balanced tree, there are two pairs of brackets and one joiner for
+    # each item at most.
+    overhead = url_safe_length('(())') + url_safe_length(joiner)
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for item in items:
+        item_length = url_safe_length(str(item)) + overhead
+        if current_chunk and current_length + item_length > max_length:
+            chunks.append(current_chunk)
+            current_chunk = []
+            current_length = 0
+        current_chunk.append(item)
+        current_length += item_length
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+class Q(object):
+
+    def __init__(self, clause):
+        """
+        Create a query of a single clause.
+
+        :param clause:
+            A clause string, eg ``'Name = "Fred"'``.
+
+        Queries are combined with ``&`` (and), ``|`` (or) and ``~`` (not),
+        or with :py:meth:`~pyrally.query.Q.all_of` and
+        :py:meth:`~pyrally.query.Q.any_of` for lists of clauses.
+        """
+        self.clause = clause
+        self.joiner = None
+        self.children = []
+        self.negated = False
+
+    @classmethod
+    def combine(cls, joiner, items):
+        """
+        Return a query joining ``items`` with ``joiner``.
+
+        :param joiner:
+            Either :py:data:`~pyrally.query.AND` or
+            :py:data:`~pyrally.query.OR`.
+
+        :param items:
+            A list of clause strings or :py:class:`~pyrally.query.Q` objects.
+            Queries already joined by ``joiner`` have their items added
+            directly, so chains like ``a | b | c`` stay balanced.
+        """
+        query = cls(None)
+        query.joiner = joiner
+        for item in items:
+            if not isinstance(item, Q):
+                query.children.append(cls(item))
+            elif item.joiner == joiner and not item.negated:
+                query.children.extend(item.children)
+            else:
+                query.children.append(item)
+        return query
+
+    @classmethod
+    def all_of(cls, items):
+        """Return a query matching all of ``items``."""
+        return cls.combine(AND, items)
+
+    @classmethod
+    def any_of(cls, items):
+        """Return a query matching any of ``items``."""
+        return cls.combine(OR, items)
+
+    def __and__(self, other):
+        return Q.combine(AND, [self, other])
+
+    def __or__(self, other):
+        return Q.combine(OR, [self, other])
+
+    def __invert__(self):
+        query = Q(self.clause)
+        query.joiner = self.joiner
+        query.children = self.children
+        query.negated = not self.negated
+        return query
+
+    def __str__(self):
+        return self.to_query()
+
+    def __repr__(self):
+        return 'Q({0!r})'.format(self.to_query())
+
+    def _get_effective(self):
+        """
+        Return the ``(joiner, children)`` this query really joins, once any
+        negation is pushed down to its children.
+        """
+        if not self.negated:
+            return self.joiner, self.children
+        return (NEGATED_JOINERS[self.joiner],
+                [~child for child in self.children])
+
+    def to_query(self):
+        """
+        Return the query string for the API.
+
+        The items of each ``and`` or ``or`` are split in half, and each half
+        in half again, until single items are reached. So ``n`` items are
+        nested at most ``log2(n)`` brackets deep. A stack is used rather than
+        recursion, and the string is built in time linear in its length.
+        Negation is applied to single clauses with
+        :py:func:`~pyrally.query.negate_clause`.
+        """
+        tokens = []
+        # Items are strings to output, or tuples of (query, negated) for a
+        # query, or (query, negated, start, end) for a slice of its children.
+        stack = [(self, False)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, basestring):
+                tokens.append(item)
+            elif len(item) == 2:
+                query, negated = item
+                negated = negated != query.negated
+                if query.joiner is None:
+                    clause = query.clause
+                    tokens.append(negate_clause(clause) if negated else clause)
+                elif query.children:
+                    stack.append((query, negated, 0, len(query.children)))
+            else:
+                query, negated, start, end = item
+                if end - start == 1:
+                    stack.append((query.children[start], negated))
+                    continue
+                middle = start + (end - start + 1) // 2
+                joiner = query.joiner
+                if negated:
+                    joiner = NEGATED_JOINERS[joiner]
+                stack.extend([')', (query, negated, middle, end), '(',
+                              joiner,
+                              ')', (query, negated, start, middle), '('])
+        return ''.join(tokens)
+
+    def split(self, max_length=MAX_QUERY_LENGTH):
+        """
+        Split into queries short enough to send to the API.
+
+        An ``or`` query is split into several ``or`` queries of some of its
+        items. An ``and`` query has its longest ``or`` item split, with the
+        rest of the ``and`` kept in each new query.
+
+        :param max_length:
+            The maximum url safe length of each query.
+
+        :returns:
+            A list of :py:class:`~pyrally.query.Q` objects. Together they
+            match the same objects as ``self``, though an object may be
+            matched by more than one of them. ``[self]`` if ``self`` is short
+            enough or can't be split.
+        """
+        length = url_safe_length(self.to_query())
+        if length <= max_length or self.joiner is None:
+            return [self]
+        joiner, children = self._get_effective()
+        if joiner == OR:
+            return [Q.any_of(chunk)
+                    for chunk in chunk_queries(children, OR, max_length)]
+
+        longest = None
+        for index, child in enumerate(children):
+            if child.joiner is None or child._get_effective()[0] != OR:
+                continue
+            child_length = url_safe_length(child.to_query())
+            if longest is None or child_length > longest[1]:
+                longest = (index, child_length)
+        if longest is None:
+            return [self]
+        index, child_length = longest
+        # Each part takes the place of the child in the tree, so has the same
+        # room around it.
+        parts = children[index].split(max_length - (length - child_length))
+        return [Q.all_of(children[:index] + [part] + children[index + 1:])
+                for part in parts]
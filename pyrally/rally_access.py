@@ -1,22 +1,50 @@
 import urllib2
-import simplejson
-import time
 import contextlib
-from collections import defaultdict
+import httplib
+import logging
+import socket
+import threading
+import time
+import weakref
+from multiprocessing.pool import ThreadPool
+
+from pyrally.cache import MemoryCache
+from pyrally.concurrency import MAX_WORKERS, run_as_worker
+from pyrally.connection import (ConnectionPool, POOL_SIZE, IDLE_TIMEOUT,
+                                ACCEPT_ENCODING, read_body, gzip_body)
+from pyrally.json_codec import get_codec
+from pyrally.metrics import MetricsRegistry
+from pyrally.retry import RetryPolicy, TokenBucket
 
 
 class UnexpectedResponse(Exception):
     pass
 
+logger = logging.getLogger(__name__)
+
 ACCESSOR = None
+ACCESSOR_LOCK = threading.Lock()
+ASYNC_ACCESSOR = None
 
-MEM_CACHE = defaultdict(dict)
-"""Dictionary of request_type: {request: (response, time_of_stored_request)}"""
+MEM_CACHE = MemoryCache()
+"""The :py:class:`~pyrally.cache.MemoryCache` shared by default between
+accessors."""
 CACHE_TIMEOUT = 120
 """Seconds to store an item in memory for, before it needs refreshing"""
+COMPRESS_THRESHOLD = 16384
+"""Bytes a request body must reach before it is compressed."""
+ARTIFACT_TYPES = frozenset(['defect', 'defectsuite', 'hierarchicalrequirement',
+                            'task', 'testcase', 'testset'])
+"""Cache keys of the types returned by ``artifact`` queries."""
+
 
+def get_accessor(username=None, password=None, rally_base_url=None,
+                 **kwargs):
+    """Return the global ``RallyAccessor``, creating it if required.
 
-def get_accessor(username=None, password=None, rally_base_url=None):
+    Any extra keyword arguments are passed on to
+    :py:class:`~pyrally.rally_access.RallyAccessor` when it is created.
+    """
     global ACCESSOR
     if not ACCESSOR:
         if not (username and password and rally_base_url):
@@ -24,13 +52,59 @@ def get_accessor(username=None, password=None, rally_base_url=None):
                             ' before accessing without username, password and'
                             'rally_base_url\n'
                             'Try instantiating a client object first.')
-        ACCESSOR = RallyAccessor(username, password, rally_base_url)
+        with ACCESSOR_LOCK:
+            if not ACCESSOR:
+                ACCESSOR = RallyAccessor(username, password, rally_base_url,
+                                         **kwargs)
     return ACCESSOR
 
 
+def get_async_accessor(max_workers=None):
+    """Return the global ``AsyncRallyAccessor``, creating it if required.
+
+    The global ``RallyAccessor`` must already have been created, see
+    :py:func:`~pyrally.rally_access.get_accessor`.
+
+    :param max_workers:
+        Passed to :py:class:`~pyrally.rally_access.AsyncRallyAccessor` when
+        it is created.
+    """
+    global ASYNC_ACCESSOR
+    if not ASYNC_ACCESSOR:
+        accessor = get_accessor()
+        with ACCESSOR_LOCK:
+            if not ASYNC_ACCESSOR:
+                ASYNC_ACCESSOR = AsyncRallyAccessor(accessor, max_workers)
+    return ASYNC_ACCESSOR
+
+
+class InFlightRequest(object):
+    """A GET being sent on behalf of every thread that asked for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+        self.error = None
+
+    def wait(self):
+        """Block until the request completes, then return its data.
+
+        :raises:
+            Whatever exception the request raised.
+        """
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+
 class RallyAccessor(object):
 
-    def __init__(self, username, password, base_url):
+    def __init__(self, username, password, base_url, pool_size=POOL_SIZE,
+                 idle_timeout=IDLE_TIMEOUT, cache=None, revalidate=False,
+                 metrics=True, json_codec=None, compress_requests=False,
+                 compress_threshold=COMPRESS_THRESHOLD, retry_policy=None,
+                 rate_limit=None, identity_map=True):
         """
         Set up access to rally with the given url and credentials.
 
@@ -45,16 +119,184 @@ class RallyAccessor(object):
                 * https://rally1.rallydev.com/
                 * https://community.rallydev.com/
                 * https://trial.rallydev.com/
+
+        :param pool_size:
+            The maximum number of idle keep-alive connections to hold open to
+            Rally. See :py:class:`~pyrally.connection.ConnectionPool`.
+
+        :param idle_timeout:
+            Seconds an idle connection is kept open for before being
+            discarded.
+
+        :param cache:
+            The cache to store responses in. Defaults to the module level
+            ``MEM_CACHE``.
+
+        :param revalidate:
+            Boolean. If ``True``, responses are kept in the cache after they
+            expire, and are revalidated with a conditional GET (using the
+            ``ETag`` and ``Last-Modified`` headers the server sent) rather
+            than being fetched again in full.
+
+        :param metrics:
+            Boolean. If ``True``, record metrics for every API call in a
+            :py:class:`~pyrally.metrics.MetricsRegistry`, see
+            :py:meth:`~pyrally.rally_access.RallyAccessor.stats`.
+
+        :param json_codec:
+            The name of the JSON library to encode and decode with, eg
+            ``'ujson'``. Defaults to the fastest one installed, see
+            :py:func:`~pyrally.json_codec.get_codec`.
+
+        :param compress_requests:
+            Boolean. If ``True``, ``POST`` bodies of at least
+            ``compress_threshold`` bytes are sent gzip compressed. If the
+            server rejects one with ``415 Unsupported Media Type`` it is sent
+            again uncompressed, and compression is turned off.
+
+        :param compress_threshold:
+            The smallest body, in bytes, which is compressed.
+
+        :param retry_policy:
+            The :py:class:`~pyrally.retry.RetryPolicy` deciding which failed
+            requests are sent again. Defaults to retrying idempotent requests
+            up to three times. Pass ``RetryPolicy(max_retries=0)`` to never
+            retry.
+
+        :param rate_limit:
+            The most requests per second to send to Rally, shared between
+            every thread using this accessor. ``None`` for no limit.
+
+        :param identity_map:
+            Boolean. If ``True``, keep one live model object per reference,
+            see :py:meth:`~pyrally.rally_access.RallyAccessor.get_live_object`.
+
+        Responses are always requested with gzip or deflate compression.
         """
         self.base_url = base_url
         self.api_url = '{0}slm/webservice/1.29/'.format(self.base_url)
-        password_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        password_manager.add_password(
-                None, base_url, username, password
-        )
-        self.auth_handler = urllib2.HTTPBasicAuthHandler(password_manager)
+        self.pool = ConnectionPool(base_url, username, password,
+                                   pool_size=pool_size,
+                                   idle_timeout=idle_timeout)
+        self.cache = MEM_CACHE if cache is None else cache
         self.cache_timeouts = {}
         self.default_cache_timeout = CACHE_TIMEOUT
+        self.revalidate = revalidate
+        self.json_codec = get_codec(json_codec)
+        self.compress_requests = compress_requests
+        self.compress_threshold = compress_threshold
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+        self._in_flight = {}
+        """full_url: InFlightRequest for GETs currently being sent."""
+        self._in_flight_lock = threading.Lock()
+        self.identity_map = None
+        """(cache_key, object id): the live model object loaded for it."""
+        if identity_map:
+            self.identity_map = weakref.WeakValueDictionary()
+        self._identity_lock = threading.Lock()
+        self.request_hooks = []
+        """Callables run with the event for every API call, see
+        :py:meth:`~pyrally.rally_access.RallyAccessor.add_request_hook`."""
+        self.metrics = None
+        if metrics:
+            self.metrics = MetricsRegistry()
+            self.add_request_hook(self.metrics.record)
+
+    def get_live_object(self, key):
+        """Return the model object loaded for ``key`` if it is still in use.
+
+        Objects are only held weakly, so once nothing else refers to one it
+        is dropped and the next lookup loads the reference again.
+
+        :param key:
+            A tuple of ``(cache_key, object id)``, as returned by
+            :py:meth:`~pyrally.rally_access.RallyAccessor.get_cacheable_info`
+            for the object's url.
+
+        :returns:
+            The object, or ``None`` if there isn't one or the identity map is
+            turned off.
+        """
+        if self.identity_map is None:
+            return None
+        with self._identity_lock:
+            return self.identity_map.get(key)
+
+    def add_live_object(self, key, obj):
+        """Store ``obj`` as the live model object for ``key``."""
+        if self.identity_map is None:
+            return
+        with self._identity_lock:
+            self.identity_map[key] = obj
+
+    def forget_live_object(self, key):
+        """Stop returning a live model object for ``key``."""
+        if self.identity_map is None:
+            return
+        with self._identity_lock:
+            self.identity_map.pop(key, None)
+
+    def add_request_hook(self, hook):
+        """Call ``hook`` with an event for every call made to the API.
+
+        :param hook:
+            A callable taking one argument, a dictionary with the keys:
+                * ``url``: the full url of the request.
+                * ``type``: the ``cache_key`` of the url, see
+                  :py:meth:`~.RallyAccessor.get_cacheable_info`, or
+                  ``None`` if it is not an API url.
+                * ``method``: the HTTP method used.
+                * ``cache_hit``: ``True`` if answered from the cache without
+                  contacting the server.
+                * ``status``: the HTTP status returned, or ``None``.
+                * ``bytes``: the size of the response body as received,
+                  before decompression.
+                * ``bytes_sent``: the size of the request body.
+                * ``latency``: seconds taken to get the response.
+                * ``retries``: the number of times the request was resent.
+                * ``attempt``: the number of times the retry policy had
+                  already sent the request before this event, so ``0`` for
+                  the first attempt of each call.
+                * ``decode_time``: seconds taken to load the JSON response.
+                * ``error``: the exception raised, or ``None``.
+
+            Hooks are run on the thread that made the call, so should be
+            quick. Exceptions raised by a hook are logged and ignored.
+
+        Events are also logged to the ``pyrally.rally_access`` logger at
+        ``DEBUG`` level.
+        """
+        self.request_hooks.append(hook)
+
+    def remove_request_hook(self, hook):
+        """Stop calling ``hook`` for calls made to the API."""
+        self.request_hooks.remove(hook)
+
+    def stats(self):
+        """
+        Return the metrics recorded for calls made to the API.
+
+        :returns:
+            A dictionary as returned by
+            :py:meth:`~pyrally.metrics.MetricsRegistry.snapshot`, or an
+            empty dictionary if metrics are not being recorded.
+        """
+        if self.metrics is None:
+            return {}
+        return self.metrics.snapshot()
+
+    def _notify(self, event):
+        """Log ``event`` and pass it to each of the request hooks."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%(method)s %(url)s status=%(status)s '
+                         'cache_hit=%(cache_hit)s bytes=%(bytes)s '
+                         'latency=%(latency).3fs retries=%(retries)s', event)
+        for hook in self.request_hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception('Request hook %r failed', hook)
 
     def make_url_safe(self, url):
         """
@@ -94,10 +336,36 @@ class RallyAccessor(object):
 
         This does not raise a KeyError if the object can't be found.
         """
-        try:
-            del MEM_CACHE[cache_key.lower()][cache_index]
-        except KeyError:
-            pass
+        self.cache.delete(cache_key.lower(), cache_index)
+
+    def delete_url_from_cache(self, url):
+        """Delete the cached response for ``url``, if there is one.
+
+        :param url:
+            The full url, eg the ``_ref`` of an object. Urls outside the API
+            are ignored.
+        """
+        if self._get_cache_key(url) is None:
+            return
+        self.cache.delete(*self.get_cacheable_info(url))
+
+    def invalidate_queries(self, object_type):
+        """Delete every cached query result which may hold ``object_type``.
+
+        This is both the ``<type>_query`` pages and the ``<type>_incremental``
+        result sets, for ``object_type`` and also for ``artifact`` if it is
+        one of the :py:data:`~pyrally.rally_access.ARTIFACT_TYPES`.
+
+        :param object_type:
+            The API object type, eg ``HierarchicalRequirement``.
+        """
+        object_type = object_type.lower()
+        query_types = [object_type]
+        if object_type in ARTIFACT_TYPES:
+            query_types.append('artifact')
+        for query_type in query_types:
+            self.cache.delete_all('{0}_query'.format(query_type))
+            self.cache.delete_all('{0}_incremental'.format(query_type))
 
     def get_cacheable_info(self, url):
         """
@@ -125,11 +393,22 @@ class RallyAccessor(object):
             # Different cache_key because we want to be able to cache these
             # separately with different timeouts to the actual object type
             cache_key = '{0}_query'.format(lookup_tuple[0])
+        else:
+            # A request for a type with no id or query, like subscription.js
+            lookup_tuple = [url_of_interest, '']
+            cache_key = url_of_interest
 
         cache_lookup = lookup_tuple[1]
 
         return cache_key, cache_lookup
 
+    def _get_cache_key(self, url):
+        """Return the ``cache_key`` of ``url``, or ``None`` if not an API url.
+        """
+        if not url or not url.startswith(self.api_url):
+            return None
+        return self.get_cacheable_info(url)[0]
+
     def get_from_cache(self, url):
         """
         Attempt to get the url result from the cache.
@@ -144,12 +423,12 @@ class RallyAccessor(object):
         cache_timeout = self.cache_timeouts.get(cache_key,
                                                 self.default_cache_timeout)
 
-        data, access_time = MEM_CACHE[cache_key].get(cache_lookup, (None, 0))
-        if data and time.time() - access_time < cache_timeout:
+        data = self.cache.get(cache_key, cache_lookup, cache_timeout)
+        if data:
             return data
         return False
 
-    def set_to_cache(self, url, data):
+    def set_to_cache(self, url, data, validators=None):
         """
         Set the url in the cache to have this data.
 
@@ -159,11 +438,23 @@ class RallyAccessor(object):
 
         :param data:
             The data to store against the broken down url.
+
+        :param validators:
+            Optional dictionary of ``etag`` and ``last-modified`` header
+            values used to revalidate ``data`` once it has expired.
         """
         cache_key, cache_lookup = self.get_cacheable_info(url)
-        MEM_CACHE[cache_key][cache_lookup] = (data, time.time())
+        if self.revalidate:
+            # Keep expired entries around so they can be revalidated.
+            cache_timeout = None
+        else:
+            cache_timeout = self.cache_timeouts.get(cache_key,
+                                                    self.default_cache_timeout)
+        self.cache.set(cache_key, cache_lookup, data, cache_timeout,
+                       metadata=validators)
 
-    def make_api_call(self, url, full_url=False, method='GET', data=None):
+    def make_api_call(self, url, full_url=False, method='GET', data=None,
+                      use_cache=True, response_info=None):
         """
         Make a call against the API at the given url.
 
@@ -184,10 +475,25 @@ class RallyAccessor(object):
         :param data:
             Dictionary. Used as part of a ``PUT`` or ``POST`` request.
 
+        :param use_cache:
+            Boolean. If ``False``, a ``GET`` is always sent to the server
+            rather than being answered from the cache. The response is still
+            stored in the cache.
+
+        :param response_info:
+            Optional dictionary. If a ``GET`` is sent to the server, it is
+            filled as described in
+            :py:meth:`~pyrally.rally_access.RallyAccessor._get_json_response`.
+
         :returns:
             The JSON data as returned by the API converted into python
             dictionary objects. This is done either by looking in the cache,
             or by actually getting it from the server.
+
+        Concurrent ``GET`` calls for the same uncached url share a single
+        request to the server. After a ``POST`` or ``DELETE`` the cache is
+        brought up to date, see
+        :py:meth:`~pyrally.rally_access.RallyAccessor._write_through`.
         """
         url = self.make_url_safe(url)
         if not full_url:
@@ -195,38 +501,296 @@ class RallyAccessor(object):
         else:
             full_url = url
 
-        print full_url
-
         if method == 'GET':
-            data = self.get_from_cache(full_url)
+            start = time.time()
+            data = self.get_from_cache(full_url) if use_cache else False
             if not data:
-                request = urllib2.Request(full_url)
-                data = self._get_json_response(request)
-                self.set_to_cache(full_url, data)
+                data = self._get_coalesced(full_url, response_info)
+            elif self.request_hooks or logger.isEnabledFor(logging.DEBUG):
+                self._notify({'url': full_url,
+                              'type': self._get_cache_key(full_url),
+                              'method': method, 'cache_hit': True,
+                              'status': None, 'bytes': 0, 'bytes_sent': 0,
+                              'latency': time.time() - start, 'retries': 0,
+                              'attempt': 0, 'decode_time': 0.0,
+                              'error': None})
             return data
-        elif method == 'POST':
-            encoded_data = simplejson.dumps(data)
-            request = urllib2.Request(full_url, encoded_data,
-                                 {'Content-Type': 'application/json'})
+
+        response = self._send_write(full_url, method, data)
+        self._write_through(full_url, method, response)
+        return response
+
+    def _send_write(self, full_url, method, data):
+        """Send a ``POST`` of ``data`` or a ``DELETE`` to ``full_url``.
+
+        :returns:
+            A dictionary loaded with json response content from Rally.
+        """
+        if method == 'POST':
+            encoded_data = self.json_codec.dumps(data)
+            headers = {'Content-Type': 'application/json'}
+            if (self.compress_requests and
+                    len(encoded_data) >= self.compress_threshold):
+                request = urllib2.Request(full_url, gzip_body(encoded_data),
+                                          dict(headers,
+                                               **{'Content-Encoding': 'gzip'}))
+                try:
+                    return self._get_json_response(request)
+                except urllib2.HTTPError, e:
+                    if e.code != 415:
+                        raise
+                    # The server doesn't accept compressed bodies.
+                    self.compress_requests = False
+            request = urllib2.Request(full_url, encoded_data, headers)
         elif method == 'DELETE':
             request = urllib2.Request(full_url)
             request.get_method = lambda: 'DELETE'
 
         return self._get_json_response(request)
 
-    def _get_json_response(self, request_obj):
-        """Call urlopen with a request object and return a dictionary.
+    def _write_through(self, full_url, method, response):
+        """Bring the cache up to date after a write to ``full_url``.
 
-        :param request_obj:
-            A ``urllib2.request`` object to call opener.open with.
+        The cached copy of the object written to is replaced with the object
+        Rally sent back in ``response``, or removed if there isn't one.
+        Every cached query result which may hold the object is removed (see
+        :py:meth:`~pyrally.rally_access.RallyAccessor.invalidate_queries`),
+        as the write may change which objects they match and what they
+        hold. The live model object for ``full_url`` is forgotten, so it is
+        loaded again from the cache when next asked for.
+        """
+        cache_key = self._get_cache_key(full_url)
+        if cache_key is None:
+            return
+        self.forget_live_object(self.get_cacheable_info(full_url))
+        written = None
+        if method == 'POST' and isinstance(response, dict):
+            written = (response.get('OperationResult') or {}).get('Object')
+        if written and written.get('_type'):
+            self.set_to_cache(full_url, {written['_type']: written})
+        else:
+            self.delete_url_from_cache(full_url)
+        self.invalidate_queries(cache_key)
+
+    def _get_coalesced(self, full_url, response_info=None):
+        """GET ``full_url`` and cache it, sharing requests between threads.
+
+        If another thread is already fetching ``full_url``, wait for its
+        response rather than sending a second identical request. In that case
+        ``response_info`` is left empty.
 
         :returns:
             A dictionary loaded with json response content from Rally.
         """
-        opener = urllib2.build_opener(self.auth_handler)
-        with contextlib.closing(opener.open(request_obj)) as open_url:
-            response = open_url.read()
-        # Reset the auth_handler as urllib2 doesn't seem to want to behave
-        # properly.
-        self.auth_handler.retried = 0
-        return simplejson.loads(response)
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(full_url)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight[full_url] = InFlightRequest()
+        if not leader:
+            return in_flight.wait()
+
+        try:
+            if self.revalidate:
+                in_flight.data = self._get_revalidated_json_response(
+                                                    full_url, response_info)
+            else:
+                request = urllib2.Request(full_url)
+                in_flight.data = self._get_json_response(
+                                        request, response_info=response_info)
+                self.set_to_cache(full_url, in_flight.data)
+        except Exception, e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[full_url]
+            in_flight.done.set()
+        return in_flight.data
+
+    def _get_revalidated_json_response(self, full_url, response_info=None):
+        """GET ``full_url``, revalidating any expired copy in the cache.
+
+        If an expired copy is held along with validators, a conditional GET
+        is sent. When the server answers ``304 Not Modified`` the cached copy
+        is kept and marked as fresh again.
+
+        :returns:
+            A dictionary loaded with json response content from Rally.
+        """
+        cache_key, cache_lookup = self.get_cacheable_info(full_url)
+        entry = self.cache.get_entry(cache_key, cache_lookup)
+        request = urllib2.Request(full_url)
+        if entry and entry[2]:
+            validators = entry[2]
+            if 'etag' in validators:
+                request.add_header('If-None-Match', validators['etag'])
+            if 'last-modified' in validators:
+                request.add_header('If-Modified-Since',
+                                   validators['last-modified'])
+
+        if response_info is None:
+            response_info = {}
+        data = self._get_json_response(request, response_info)
+        if response_info['status'] == 304:
+            data = entry[0]
+        headers = response_info['headers']
+        validators = dict((name, headers[name])
+                          for name in ['etag', 'last-modified']
+                          if headers.get(name))
+        self.set_to_cache(full_url, data, validators or None)
+        return data
+
+    def _get_json_response(self, request_obj, response_info=None):
+        """Send a request over a pooled connection and return a dictionary.
+
+        Failed requests are retried as allowed by ``self.retry_policy``, and
+        every attempt waits for ``self.rate_limiter``.
+
+        :param request_obj:
+            A ``urllib2.request`` object to send through ``self.pool``.
+
+        :param response_info:
+            Optional dictionary which is filled with the ``status``,
+            ``headers``, ``bytes`` (as received) and ``latency`` of the
+            response.
+
+        :returns:
+            A dictionary loaded with json response content from Rally, or
+            ``None`` if the server answered ``304 Not Modified``.
+
+        :raises:
+            The ``urllib2.URLError`` or ``HTTPError`` of the last attempt if
+            it failed.
+        """
+        if not request_obj.has_header('Accept-encoding'):
+            request_obj.add_header('Accept-Encoding', ACCEPT_ENCODING)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return self._send_request(request_obj, response_info, attempt)
+            except urllib2.URLError, e:
+                if not self.retry_policy.should_retry(
+                                        request_obj.get_method(), e, attempt):
+                    raise
+                self.retry_policy.wait(attempt, e)
+                attempt += 1
+
+    def _send_request(self, request_obj, response_info, attempt):
+        """Make a single attempt at sending ``request_obj``.
+
+        See :py:meth:`~pyrally.rally_access.RallyAccessor._get_json_response`.
+
+        :param attempt:
+            The number of times the request has already been retried.
+        """
+        url = request_obj.get_full_url()
+        event = {'url': url, 'type': self._get_cache_key(url),
+                 'method': request_obj.get_method(), 'cache_hit': False,
+                 'status': None, 'bytes': 0,
+                 'bytes_sent': len(request_obj.get_data() or ''),
+                 'retries': attempt, 'attempt': attempt, 'decode_time': 0.0,
+                 'error': None}
+        start = time.time()
+        try:
+            with contextlib.closing(
+                                self.pool.urlopen(request_obj)) as open_url:
+                try:
+                    response, event['bytes'] = read_body(open_url)
+                except (httplib.HTTPException, socket.error), e:
+                    # The connection was lost part way through the body, so
+                    # the request may be retried like any other failure.
+                    raise urllib2.URLError(e)
+                event['status'] = open_url.code
+                event['retries'] += open_url.retries
+            event['latency'] = time.time() - start
+            if response_info is not None:
+                response_info['status'] = open_url.code
+                response_info['headers'] = open_url.info()
+                response_info['bytes'] = event['bytes']
+                response_info['latency'] = event['latency']
+            if open_url.code == 304:
+                return None
+            data = self.json_codec.loads(response)
+            event['decode_time'] = time.time() - start - event['latency']
+            return data
+        except urllib2.HTTPError, e:
+            event['status'] = e.code
+            event['error'] = e
+            raise
+        except Exception, e:
+            event['error'] = e
+            raise
+        finally:
+            event.setdefault('latency', time.time() - start)
+            self._notify(event)
+
+
+class AsyncRallyAccessor(object):
+
+    def __init__(self, accessor, max_workers=None):
+        """
+        Make calls through ``accessor`` without blocking the caller.
+
+        Every call is run on a pool of worker threads and returns a
+        ``multiprocessing.pool.AsyncResult`` straight away. Its ``get`` method
+        blocks until the result is ready, then returns it or raises the
+        exception the call raised. Calls share the connection pool, cache and
+        in-flight requests of ``accessor``.
+
+        :param accessor:
+            The :py:class:`~pyrally.rally_access.RallyAccessor` to make calls
+            with.
+
+        :param max_workers:
+            The maximum number of calls to run at once. Defaults to
+            :py:data:`~pyrally.concurrency.MAX_WORKERS`.
+        """
+        self.accessor = accessor
+        self.max_workers = max_workers or MAX_WORKERS
+        self._workers = None
+        self._workers_lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Call ``func`` with ``args`` and ``kwargs`` on a worker thread.
+
+        Calls ``func`` makes to :py:func:`~pyrally.concurrency.concurrent_map`
+        run serially, so at most ``max_workers`` calls are in flight.
+
+        :param callback:
+            Optional keyword argument. A callable run on the worker thread
+            with the result of ``func`` once it succeeds.
+
+        :returns:
+            A ``multiprocessing.pool.AsyncResult``.
+        """
+        callback = kwargs.pop('callback', None)
+        with self._workers_lock:
+            if self._workers is None:
+                self._workers = ThreadPool(self.max_workers)
+            workers = self._workers
+        return workers.apply_async(run_as_worker, (func,) + args, kwargs,
+                                   callback)
+
+    def make_api_call(self, url, full_url=False, method='GET', data=None,
+                      use_cache=True):
+        """
+        Asynchronous version of
+        :py:meth:`~pyrally.rally_access.RallyAccessor.make_api_call`.
+
+        :returns:
+            A ``multiprocessing.pool.AsyncResult`` for the JSON data.
+        """
+        return self.submit(self.accessor.make_api_call, url, full_url, method,
+                           data, use_cache)
+
+    def close(self):
+        """Wait for submitted calls to finish, then stop the workers."""
+        with self._workers_lock:
+            workers, self._workers = self._workers, None
+        if workers is not None:
+            workers.close()
+            workers.join()
@@ -0,0 +1,153 @@
+"""
+Retrying failed requests and limiting the rate requests are sent at.
+
+Used by :py:class:`~pyrally.rally_access.RallyAccessor` so that a single
+overloaded response or dropped connection doesn't abort a long running
+query, and so that concurrent callers stay within the request quota of a
+Rally subscription.
+"""
+import calendar
+import random
+import threading
+import time
+import urllib2
+from email.utils import parsedate_tz, mktime_tz
+
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+"""HTTP methods which can be safely sent more than once."""
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+"""HTTP statuses which indicate a request may succeed if sent again."""
+
+
+def get_retry_after(error):
+    """
+    Return the seconds to wait asked for by the ``Retry-After`` header of
+    ``error``.
+
+    :param error:
+        A ``urllib2.HTTPError``.
+
+    :returns:
+        A number of seconds, or ``None`` if there is no valid header.
+    """
+    headers = getattr(error, 'hdrs', None)
+    value = headers.get('retry-after') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0, mktime_tz(parsed) - calendar.timegm(time.gmtime()))
+
+
+class RetryPolicy(object):
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30,
+                 retry_statuses=RETRY_STATUSES, methods=IDEMPOTENT_METHODS,
+                 jitter=True):
+        """
+        Decide whether, and after how long, to resend a failed request.
+
+        Requests are retried if the server could not be reached, or answered
+        with one of ``retry_statuses``. Waits between attempts grow
+        exponentially, unless the server gave a ``Retry-After`` header.
+
+        :param max_retries:
+            The number of times a request may be resent.
+
+        :param backoff_factor:
+            The wait in seconds before the first retry. It doubles for each
+            further retry.
+
+        :param max_backoff:
+            The longest wait in seconds between attempts.
+
+        :param retry_statuses:
+            The HTTP statuses to retry.
+
+        :param methods:
+            The HTTP methods which may be retried. By default only idempotent
+            ones, so a ``POST`` which did reach the server is never repeated.
+
+        :param jitter:
+            Boolean. If ``True``, each wait is a random time up to the
+            exponential backoff, so that concurrent callers spread out.
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+        self.methods = methods
+        self.jitter = jitter
+
+    def should_retry(self, method, error, attempt):
+        """
+        Return ``True`` if a request should be sent again.
+
+        :param method:
+            The HTTP method of the request.
+
+        :param error:
+            The ``urllib2.URLError`` (or ``HTTPError``) it failed with.
+
+        :param attempt:
+            The number of retries already made.
+        """
+        if attempt >= self.max_retries or method not in self.methods:
+            return False
+        if isinstance(error, urllib2.HTTPError):
+            return error.code in self.retry_statuses
+        return isinstance(error, urllib2.URLError)
+
+    def get_backoff(self, attempt, error=None):
+        """Return the seconds to wait before retry number ``attempt + 1``."""
+        if error is not None:
+            retry_after = get_retry_after(error)
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        backoff = min(self.max_backoff, self.backoff_factor * 2 ** attempt)
+        if self.jitter:
+            return random.uniform(0, backoff)
+        return backoff
+
+    def wait(self, attempt, error=None):
+        """Sleep before retry number ``attempt + 1``."""
+        time.sleep(self.get_backoff(attempt, error))
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate, capacity=None):
+        """
+        Limit the rate calls are made at, across every thread.
+
+        :param rate:
+            The number of calls allowed per second on average.
+
+        :param capacity:
+            The number of calls which may be made at once after a quiet
+            period. Defaults to ``rate``.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # Reserve the token now, so waiting callers queue in turn.
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
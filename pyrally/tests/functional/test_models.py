@@ -132,3 +132,35 @@ def test_set_attr_behaviour():
     assert_equal(brm.rally_data['a'], 'changed')
     # And this works because of __getattribute__'s redirect:
     assert_equal(brm.a, 'changed')
+
+
+def test_get_attribute_fetches_missing_fields_of_partial_objects():
+    """Test ``__get_attribute__`` completes partially fetched objects.
+
+    Test that:
+        * Fields held are returned without any API calls.
+        * The first access of a missing field fetches the full object once,
+          without losing local changes.
+        * Attributes that don't exist still raise ``AttributeError``.
+    """
+    class DummyRallyModel(BaseRallyModel):
+        rally_name = 'FakeRallyName'
+
+    DummyRallyModel.create_from_ref = Mock()
+    DummyRallyModel.create_from_ref.return_value = DummyRallyModel(
+                                            {'_ref': 'some_reference',
+                                             'Name': 'Server name',
+                                             'Description': 'Long text'})
+    brm = DummyRallyModel({'_ref': 'some_reference', 'Name': 'Name'},
+                          partial=True)
+    brm.Name = 'Local name'
+
+    assert_equal(brm.Name, 'Local name')
+    assert_false(DummyRallyModel.create_from_ref.called)
+
+    assert_equal(brm.Description, 'Long text')
+    assert_equal(brm.Name, 'Local name')
+    assert_raises(AttributeError, getattr, brm, 'some_other_attr')
+    assert_equal(DummyRallyModel.create_from_ref.call_count, 1)
+    assert_equal(DummyRallyModel.create_from_ref.call_args[0],
+                 ('some_reference',))
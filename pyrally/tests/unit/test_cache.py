@@ -0,0 +1,220 @@
+import os
+import shutil
+import tempfile
+
+from mock import patch
+from nose.tools import assert_equal, assert_true, assert_false
+
+from pyrally.cache import MemoryCache, SqliteCache
+
+
+def test_get_returns_data_until_expired():
+    """Test :py:meth:`~.MemoryCache.get` respects the timeout given.
+
+    Test that:
+        * Data is returned while younger than ``timeout``.
+        * ``None`` is returned once it has expired.
+        * The expired entry is kept until swept, so it can be revalidated.
+    """
+    cache = MemoryCache()
+    with patch('pyrally.cache.time') as time_import:
+        time_import.time.return_value = 100
+        cache.set('story', '1', 'data', 10)
+
+        time_import.time.return_value = 109
+        assert_equal(cache.get('story', '1', 10), 'data')
+
+        time_import.time.return_value = 110
+        assert_equal(cache.get('story', '1', 10), None)
+        assert_equal(cache.get_entry('story', '1'), ('data', 100, None))
+
+        cache.sweep()
+
+    assert_equal(len(cache), 0)
+    assert_equal(cache.stats()['expirations'], 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    """Test that :py:class:`~.MemoryCache` evicts by least recent use."""
+    cache = MemoryCache(max_entries=2)
+    cache.set('story', '1', 'data_1')
+    cache.set('story', '2', 'data_2')
+    # Reading 1 makes 2 the least recently used.
+    cache.get('story', '1', 10)
+    cache.set('story', '3', 'data_3')
+
+    assert_equal(cache.get('story', '1', 10), 'data_1')
+    assert_equal(cache.get('story', '2', 10), None)
+    assert_equal(cache.get('story', '3', 10), 'data_3')
+    assert_equal(cache.stats()['evictions'], 1)
+
+
+def test_entries_are_evicted_to_stay_within_max_bytes():
+    """Test that :py:class:`~.MemoryCache` keeps within ``max_bytes``."""
+    cache = MemoryCache(max_entries=None, max_bytes=2000)
+    for index in range(10):
+        cache.set('story', index, {'Description': 'x' * 500})
+
+    stats = cache.stats()
+    assert_equal(stats['entries'], len(cache))
+    assert_equal(stats['entries'] + stats['evictions'], 10)
+    assert_equal(cache.get('story', 9, 10), {'Description': 'x' * 500})
+    assert_equal(cache.get('story', 0, 10), None)
+    assert_equal(stats['bytes'] <= 2000, True)
+
+
+def test_expired_entries_are_swept():
+    """Test that expired entries are removed without being read.
+
+    A sweep happens once every ``sweep_interval`` sets.
+    """
+    cache = MemoryCache(sweep_interval=3)
+    with patch('pyrally.cache.time') as time_import:
+        time_import.time.return_value = 100
+        cache.set('story', '1', 'short lived', 5)
+        cache.set('user', '2', 'long lived', 60)
+
+        time_import.time.return_value = 110
+        cache.set('user', '3', 'new')
+
+        assert_equal(len(cache), 2)
+        assert_equal(cache.get('user', '2', 60), 'long lived')
+    assert_equal(cache.stats()['expirations'], 1)
+
+
+def test_stats_counts_hits_and_misses():
+    """Test :py:meth:`~.MemoryCache.stats` counts hits and misses."""
+    cache = MemoryCache()
+    cache.set('story', '1', 'data')
+    cache.get('story', '1', 10)
+    cache.get('story', '1', 10)
+    cache.get('story', '2', 10)
+
+    stats = cache.stats()
+    assert_equal((stats['hits'], stats['misses']), (2, 1))
+
+
+def get_sqlite_path():
+    directory = tempfile.mkdtemp()
+    return os.path.join(directory, 'cache.db'), directory
+
+
+def test_sqlite_cache_round_trip():
+    """Test :py:class:`~.SqliteCache` stores and returns data.
+
+    Test that:
+        * Data comes back as it was stored.
+        * Data is stored compressed.
+        * Deleted entries are no longer returned.
+    """
+    path, directory = get_sqlite_path()
+    try:
+        cache = SqliteCache(path)
+        data = {'QueryResult': {'Results': [{'Name': 'x' * 1000}]}}
+        cache.set('story_query', 'query=1', data, 10, {'etag': '"abc"'})
+
+        assert_equal(cache.get('story_query', 'query=1', 10), data)
+        assert_equal(cache.get_entry('story_query', 'query=1')[2],
+                     {'etag': '"abc"'})
+        stored = cache._connection().execute(
+                                'SELECT data FROM cache').fetchone()[0]
+        assert_true(len(stored) < 1000)
+
+        cache.delete('story_query', 'query=1')
+        assert_equal(cache.get('story_query', 'query=1', 10), None)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_sqlite_cache_is_shared_between_instances():
+    """Test :py:class:`~.SqliteCache` entries are seen by other instances.
+
+    Two caches using the same file stand in for two processes, or one process
+    before and after a restart.
+    """
+    path, directory = get_sqlite_path()
+    try:
+        SqliteCache(path).set('user', '1234', {'Name': 'Alex'}, 60)
+
+        assert_equal(SqliteCache(path).get('user', '1234', 60),
+                     {'Name': 'Alex'})
+    finally:
+        shutil.rmtree(directory)
+
+
+@patch('pyrally.cache.os.getpid')
+def test_sqlite_cache_reconnects_after_fork(getpid):
+    """Test :py:class:`~.SqliteCache` connections aren't shared by processes.
+
+    Test that:
+        * No connection is opened until the cache is used.
+        * A connection opened before a fork isn't used after it.
+    """
+    path, directory = get_sqlite_path()
+    try:
+        getpid.return_value = 100
+        cache = SqliteCache(path)
+        assert_false(os.path.exists(path))
+
+        cache.set('user', '1234', {'Name': 'Alex'}, 60)
+        parent_connection = cache._connection()
+        assert_true(cache._connection() is parent_connection)
+
+        getpid.return_value = 101
+        assert_false(cache._connection() is parent_connection)
+        assert_equal(cache.get('user', '1234', 60), {'Name': 'Alex'})
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_sqlite_cache_expiry_and_sweep():
+    """Test :py:class:`~.SqliteCache` expires and sweeps old entries.
+
+    Test that:
+        * Expired entries are not returned.
+        * A sweep removes expired entries and any beyond ``max_entries``.
+    """
+    path, directory = get_sqlite_path()
+    try:
+        cache = SqliteCache(path, max_entries=2, sweep_interval=4)
+        with patch('pyrally.cache.time') as time_import:
+            time_import.time.return_value = 100
+            cache.set('story', '1', 'short lived', 5)
+            cache.set('story', '2', 'oldest', 60)
+            time_import.time.return_value = 101
+            cache.set('story', '3', 'middle', 60)
+
+            time_import.time.return_value = 110
+            assert_equal(cache.get('story', '1', 5), None)
+            assert_equal(cache.get_entry('story', '1'),
+                         ('short lived', 100, None))
+            cache.set('story', '4', 'newest', 60)
+
+            assert_equal(len(cache), 2)
+            assert_equal(cache.get('story', '2', 60), None)
+            assert_equal(cache.get('story', '4', 60), 'newest')
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_delete_all_removes_only_that_cache_key():
+    """Test ``delete_all`` on :py:class:`~.MemoryCache` and
+    :py:class:`~.SqliteCache`.
+
+    Test that every entry for the cache key is removed and entries for other
+    cache keys are kept.
+    """
+    path, directory = get_sqlite_path()
+    try:
+        for cache in [MemoryCache(), SqliteCache(path)]:
+            cache.set('story_query', 'query=1', {'a': 1}, 10)
+            cache.set('story_query', 'query=2', {'a': 2}, 10)
+            cache.set('story', '1234', {'a': 3}, 10)
+
+            cache.delete_all('story_query')
+
+            assert_equal(cache.get('story_query', 'query=1', 10), None)
+            assert_equal(cache.get('story_query', 'query=2', 10), None)
+            assert_equal(cache.get('story', '1234', 10), {'a': 3})
+    finally:
+        shutil.rmtree(directory)
@@ -93,3 +93,18 @@ def test_get_entity_by_name(Artifact):
     assert_equal(Artifact.get_by_formatted_id.call_args[0][0], 'mock_name')
     assert_equal(result, Artifact.get_by_formatted_id.return_value)
 
+
+@patch('pyrally.client.Artifact')
+def test_get_entities_by_formatted_id(Artifact):
+    """Test that ``get_entities_by_formatted_id`` calls the expected method.
+
+    Tests that
+    :py:meth:`~pyrally.client.RallyAPIClient.get_entities_by_formatted_id`
+    returns the value returned by method
+    :py:meth:`~pyrally.models.Artifact.get_many_by_formatted_id`
+    """
+    result = TEST_RA_CLIENT.get_entities_by_formatted_id(['US1', 'DE2'])
+    assert_equal(Artifact.get_many_by_formatted_id.call_args[0][0],
+                 ['US1', 'DE2'])
+    assert_equal(result, Artifact.get_many_by_formatted_id.return_value)
+
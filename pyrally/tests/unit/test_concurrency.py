@@ -0,0 +1,130 @@
+import threading
+import time
+
+from nose.tools import assert_equal, assert_raises, assert_true
+
+from pyrally.concurrency import concurrent_map, prefetch_map
+
+
+def test_concurrent_map_preserves_order():
+    """Test :py:func:`~pyrally.concurrency.concurrent_map` keeps item order.
+
+    Items which take longer to process must not be returned out of order.
+    """
+    def slow_double(item):
+        time.sleep(0.01 * (5 - item))
+        return item * 2
+
+    assert_equal(concurrent_map(slow_double, range(5), max_workers=5),
+                 [0, 2, 4, 6, 8])
+
+
+def test_concurrent_map_is_bounded():
+    """Test that no more than ``max_workers`` calls run at once."""
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def track(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    concurrent_map(track, range(10), max_workers=3)
+
+    assert_true(1 < peak[0] <= 3)
+
+
+def test_nested_concurrent_map_is_bounded():
+    """
+    Test :py:func:`~pyrally.concurrency.concurrent_map` called from within
+    ``func`` runs serially, so nesting doesn't raise the limit.
+    """
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def track(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    concurrent_map(lambda item: concurrent_map(track, range(5), 3),
+                   range(3), max_workers=3)
+
+    assert_true(1 < peak[0] <= 3)
+
+
+def test_concurrent_map_raises_errors():
+    """Test that exceptions raised by ``func`` are passed to the caller."""
+    def fail(item):
+        raise ValueError(item)
+
+    assert_raises(ValueError, concurrent_map, fail, range(3), 2)
+    assert_raises(ValueError, concurrent_map, fail, range(3), 1)
+
+
+def test_prefetch_map_starts_next_call_before_it_is_requested():
+    """Test :py:func:`~pyrally.concurrency.prefetch_map` fetches one ahead.
+
+    Test that:
+        * The call for the first item starts before iteration begins.
+        * The call for the next item starts while the caller still holds
+          the current result.
+        * Results are returned in order.
+    """
+    started = []
+    events = dict((item, threading.Event()) for item in range(3))
+
+    def record(item):
+        started.append(item)
+        events[item].set()
+        return item * 2
+
+    results = prefetch_map(record, range(3))
+    events[0].wait(1)
+    assert_equal(started, [0])
+
+    assert_equal(next(results), 0)
+    events[1].wait(1)
+    assert_equal(started, [0, 1])
+
+    assert_equal(list(results), [2, 4])
+
+
+def test_prefetch_map_handles_no_items():
+    """Test that :py:func:`~pyrally.concurrency.prefetch_map` handles []."""
+    assert_equal(list(prefetch_map(lambda item: item, [])), [])
+
+
+def wait_for_thread_count(count):
+    for _ in range(100):
+        if threading.active_count() <= count:
+            break
+        time.sleep(0.01)
+    return threading.active_count()
+
+
+def test_prefetch_map_close_ends_the_thread():
+    """Test :py:func:`~pyrally.concurrency.prefetch_map` can be abandoned.
+
+    Test that:
+        * Closing the iterator part way through ends its threads.
+        * Iterating to the end ends its threads.
+    """
+    thread_count = threading.active_count()
+
+    results = prefetch_map(lambda item: item, range(5))
+    assert_equal(next(results), 0)
+    results.close()
+    assert_equal(list(results), [])
+    assert_equal(wait_for_thread_count(thread_count), thread_count)
+
+    assert_equal(list(prefetch_map(lambda item: item, range(5))), range(5))
+    assert_equal(wait_for_thread_count(thread_count), thread_count)
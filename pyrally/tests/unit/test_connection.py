@@ -0,0 +1,300 @@
+import socket
+import urllib2
+import zlib
+from StringIO import StringIO
+
+from mock import patch, Mock
+from nose.tools import assert_equal, assert_raises, assert_true, assert_false
+
+from pyrally.connection import ConnectionPool, read_body, gzip_body
+
+
+def get_mock_response(status=200, body='{}', will_close=False):
+    response = Mock()
+    response.status = status
+    response.will_close = will_close
+    response.read.return_value = body
+    response.isclosed.return_value = True
+    return response
+
+
+def get_pool(**kwargs):
+    kwargs.setdefault('proxies', {})
+    return ConnectionPool('https://rally1.rallydev.com/', 'uname', 'pword',
+                          **kwargs)
+
+
+def test_urlopen_sends_preemptive_basic_auth():
+    """Test :py:meth:`~.ConnectionPool.urlopen` sends auth straight away.
+
+    Test that:
+        * The Authorization header is sent with the first request.
+        * The request is sent to the path and query of the url.
+    """
+    pool = get_pool()
+    connection = Mock()
+    connection.getresponse.return_value = get_mock_response()
+    pool._new_connection = Mock(return_value=connection)
+
+    request = urllib2.Request(
+                        'https://rally1.rallydev.com/slm/obj.js?start=1')
+    pool.urlopen(request)
+
+    method, selector, data, headers = connection.request.call_args[0]
+    assert_equal((method, selector, data), ('GET', '/slm/obj.js?start=1',
+                                            None))
+    assert_equal(headers['Authorization'], 'Basic dW5hbWU6cHdvcmQ=')
+    assert_equal(headers['Connection'], 'keep-alive')
+
+
+def test_urlopen_does_not_send_auth_to_other_hosts():
+    """Test :py:meth:`~.ConnectionPool.urlopen` keeps credentials private.
+
+    Test that the Authorization header is only sent to the Rally host.
+    """
+    pool = get_pool()
+    connection = Mock()
+    connection.getresponse.return_value = get_mock_response()
+    pool._new_connection = Mock(return_value=connection)
+
+    pool.urlopen(urllib2.Request('https://example.com/some/path'))
+
+    headers = connection.request.call_args[0][3]
+    assert_false('Authorization' in headers)
+
+
+def test_connections_are_reused_once_released():
+    """Test that closing a response puts its connection back in the pool."""
+    pool = get_pool()
+    connection = Mock()
+    connection.getresponse.return_value = get_mock_response()
+    pool._new_connection = Mock(return_value=connection)
+
+    request = urllib2.Request('https://rally1.rallydev.com/slm/obj.js')
+    pool.urlopen(request).close()
+    pool.urlopen(request).close()
+
+    assert_equal(pool._new_connection.call_count, 1)
+    assert_equal(connection.request.call_count, 2)
+    assert_false(connection.close.called)
+
+
+def test_connections_are_not_reused_if_server_closes():
+    """Test that connections the server will close are not pooled."""
+    pool = get_pool()
+    pool._new_connection = Mock()
+    pool._new_connection.return_value.getresponse.return_value = \
+                                        get_mock_response(will_close=True)
+
+    request = urllib2.Request('https://rally1.rallydev.com/slm/obj.js')
+    pool.urlopen(request).close()
+    pool.urlopen(request).close()
+
+    assert_equal(pool._new_connection.call_count, 2)
+    assert_true(pool._new_connection.return_value.close.called)
+
+
+@patch('pyrally.connection.time')
+def test_idle_connections_expire(time_import):
+    """Test that connections idle for longer than idle_timeout are closed."""
+    pool = get_pool(idle_timeout=10)
+    old_connection = Mock()
+    time_import.time.return_value = 0
+    pool.release(('https', 'rally1.rallydev.com'), old_connection)
+
+    time_import.time.return_value = 11
+    pool._new_connection = Mock()
+    connection, reused = pool._get_connection(('https',
+                                               'rally1.rallydev.com'))
+
+    assert_true(old_connection.close.called)
+    assert_false(reused)
+    assert_equal(connection, pool._new_connection.return_value)
+
+
+def test_release_closes_connections_beyond_pool_size():
+    """Test that the pool never holds more than ``pool_size`` connections."""
+    pool = get_pool(pool_size=1)
+    connection_1 = Mock()
+    connection_2 = Mock()
+
+    pool.release('key', connection_1)
+    pool.release('key', connection_2)
+
+    assert_false(connection_1.close.called)
+    assert_true(connection_2.close.called)
+
+
+def test_stale_pooled_connection_is_retried_on_fresh_connection():
+    """Test a dropped keep-alive connection is transparently replaced."""
+    pool = get_pool()
+    stale_connection = Mock()
+    stale_connection.request.side_effect = socket.error('reset')
+    pool.release(('https', 'rally1.rallydev.com'), stale_connection)
+    fresh_connection = Mock()
+    fresh_connection.getresponse.return_value = get_mock_response()
+    pool._new_connection = Mock(return_value=fresh_connection)
+
+    response = pool.urlopen(
+                    urllib2.Request('https://rally1.rallydev.com/slm/obj.js'))
+
+    assert_true(stale_connection.close.called)
+    assert_equal(fresh_connection.request.call_count, 1)
+    assert_equal(response.retries, 1)
+
+
+def test_post_is_not_sent_on_pooled_connection():
+    """
+    Test a ``POST`` is never sent down a connection reused from the pool.
+
+    Test that:
+        * A ``POST`` is sent on a fresh connection, leaving the idle one.
+        * A ``POST`` which fails raises ``URLError`` without being sent
+          again.
+    """
+    pool_key = ('https', 'rally1.rallydev.com')
+    request = urllib2.Request('https://rally1.rallydev.com/slm/obj.js', '{}')
+    pool = get_pool()
+    idle_connection = Mock()
+    pool.release(pool_key, idle_connection)
+    fresh_connection = Mock()
+    fresh_connection.getresponse.return_value = get_mock_response()
+    pool._new_connection = Mock(return_value=fresh_connection)
+
+    assert_equal(pool.urlopen(request).retries, 0)
+    assert_false(idle_connection.request.called)
+    assert_equal(fresh_connection.request.call_count, 1)
+
+    fresh_connection.getresponse.side_effect = socket.error('reset')
+    assert_raises(urllib2.URLError, pool.urlopen, request)
+    assert_equal(fresh_connection.request.call_count, 2)
+    assert_equal(pool._new_connection.call_count, 2)
+
+
+@patch('pyrally.connection.os')
+def test_idle_connections_are_not_shared_with_forked_processes(os_import):
+    """
+    Test connections pooled by a parent process aren't used after a fork.
+
+    Test that a new connection is opened and the parent's is left open.
+    """
+    os_import.getpid.return_value = 100
+    pool = get_pool()
+    parent_connection = Mock()
+    pool.release(('https', 'rally1.rallydev.com'), parent_connection)
+    pool._new_connection = Mock()
+
+    os_import.getpid.return_value = 101
+    connection, reused = pool._get_connection(('https',
+                                               'rally1.rallydev.com'))
+
+    assert_equal((connection, reused), (pool._new_connection.return_value,
+                                        False))
+    assert_false(parent_connection.close.called)
+
+
+@patch('pyrally.connection.urllib.proxy_bypass', Mock(return_value=False))
+@patch('pyrally.connection.httplib')
+def test_connections_use_proxies(httplib_import):
+    """
+    Test :py:class:`~.ConnectionPool` connects through proxies.
+
+    Test that:
+        * https connections are tunnelled through the proxy.
+        * http requests are sent to the proxy with the full url.
+    """
+    pool = get_pool(proxies={'https': 'http://proxy:3128',
+                             'http': 'http://proxy:3128'})
+
+    connection = pool._new_connection('https', 'rally1.rallydev.com')
+    assert_equal(httplib_import.HTTPSConnection.call_args[0], ('proxy:3128',))
+    assert_equal(connection.set_tunnel.call_args[0],
+                 ('rally1.rallydev.com',))
+
+    connection = Mock()
+    connection.getresponse.return_value = get_mock_response()
+    pool._new_connection = Mock(return_value=connection)
+    pool.urlopen(urllib2.Request('http://example.com/some/path'))
+    assert_equal(connection.request.call_args[0][1],
+                 'http://example.com/some/path')
+
+
+def test_urlopen_raises_http_error_for_error_status():
+    """
+    Test :py:meth:`~.ConnectionPool.urlopen` raises ``HTTPError``.
+
+    Test that error statuses and redirects raise ``HTTPError``, but
+    ``304 Not Modified`` is returned.
+    """
+    pool = get_pool()
+    connection = Mock()
+    connection.getresponse.return_value = get_mock_response(status=503)
+    pool._new_connection = Mock(return_value=connection)
+
+    assert_raises(urllib2.HTTPError, pool.urlopen,
+                  urllib2.Request('https://rally1.rallydev.com/slm/obj.js'))
+
+    connection.getresponse.return_value = get_mock_response(status=302)
+    assert_raises(urllib2.HTTPError, pool.urlopen,
+                  urllib2.Request('https://rally1.rallydev.com/slm/obj.js'))
+
+    connection.getresponse.return_value = get_mock_response(status=304)
+    assert_equal(pool.urlopen(urllib2.Request(
+                    'https://rally1.rallydev.com/slm/obj.js')).status, 304)
+
+
+def test_urlopen_decompresses_http_error_body():
+    """
+    Test :py:meth:`~.ConnectionPool.urlopen` decodes the body of errors.
+
+    Test that:
+        * The body of the ``HTTPError`` is decompressed.
+        * The connection is released once the body is read.
+    """
+    body = '{"OperationResult": {"Errors": ["Not authorized"]}}'
+    pool = get_pool()
+    response = get_mock_response(status=401)
+    response.msg = {'content-encoding': 'gzip'}
+    response.read.side_effect = StringIO(gzip_body(body)).read
+    connection = Mock()
+    connection.getresponse.return_value = response
+    pool._new_connection = Mock(return_value=connection)
+
+    try:
+        pool.urlopen(
+                urllib2.Request('https://rally1.rallydev.com/slm/obj.js'))
+    except urllib2.HTTPError, e:
+        assert_equal(e.read(), body)
+    else:
+        raise AssertionError('HTTPError not raised')
+    assert_false(connection.close.called)
+
+
+def get_encoded_response(body, encoding):
+    response = Mock()
+    response.info.return_value = {'content-encoding': encoding}
+    response.read.side_effect = StringIO(body).read
+    return response
+
+
+def test_read_body_decompresses_responses():
+    """
+    Test :py:func:`~.read_body` with each content encoding.
+
+    Test that:
+        * gzip, deflate and raw deflate bodies are decompressed across
+          several reads.
+        * Other bodies are returned as they are.
+        * The number of bytes received is returned.
+    """
+    body = '{"QueryResult": {"Results": []}}' * 20
+    raw_deflate = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    raw_deflated = raw_deflate.compress(body) + raw_deflate.flush()
+
+    for encoded, encoding in [(gzip_body(body), 'gzip'),
+                              (zlib.compress(body), 'deflate'),
+                              (raw_deflated, 'deflate'),
+                              (body, None)]:
+        response = get_encoded_response(encoded, encoding)
+        assert_equal(read_body(response, chunk_size=16),
+                     (body, len(encoded)))
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_raises, assert_true, assert_false
+
+from pyrally.cursor import QueryCursor
+
+
+def get_page(start, ids, total=None, page_size=2):
+    return {'StartIndex': start,
+            'PageSize': page_size,
+            'TotalResultCount': total if total is not None else len(ids),
+            'Results': [{'ObjectID': object_id}
+                        for object_id in ids[start - 1:start - 1 + page_size]]}
+
+
+def test_add_page_records_progress():
+    """
+    Test :py:meth:`~.QueryCursor.add_page`.
+
+    Test that:
+        * Pages not yet recorded are reported as missing.
+        * Results are returned in order.
+        * A change in the total is flagged.
+    """
+    ids = [1, 2, 3, 4, 5]
+    cursor = QueryCursor()
+    cursor.add_page(get_page(1, ids))
+    cursor.add_page(get_page(5, ids))
+
+    assert_equal(cursor.get_missing_start_indexes(), [3])
+    assert_false(cursor.total_changed)
+
+    cursor.add_page(get_page(3, ids, total=6))
+
+    assert_true(cursor.total_changed)
+    assert_equal(cursor.get_missing_start_indexes(), [])
+    assert_equal([result['ObjectID'] for result in cursor.get_results()],
+                 ids)
+
+
+def test_get_missing_start_indexes_drops_pages_past_total():
+    """Test pages beyond a reduced total are discarded."""
+    cursor = QueryCursor()
+    cursor.add_page(get_page(5, [1, 2, 3, 4, 5]))
+    cursor.add_page(get_page(1, [1, 2, 3], total=3))
+
+    assert_equal(cursor.get_missing_start_indexes(), [3])
+    assert_equal(cursor.pages.keys(), [1])
+
+
+def test_start_rejects_other_queries():
+    """Test :py:meth:`~.QueryCursor.start` checks the query matches."""
+    cursor = QueryCursor()
+    cursor.start('Defect', 'Name = "x"', ['Name'])
+    cursor.start('Defect', 'Name = "x"', ['Name'])
+
+    assert_raises(ValueError, cursor.start, 'Defect', 'Name = "y"', ['Name'])
+
+
+def test_save_and_load():
+    """Test a saved cursor is loaded with the same state."""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'cursor.json')
+        assert_equal(QueryCursor.load(path).total, None)
+
+        cursor = QueryCursor(path)
+        cursor.start('Defect', '', None)
+        cursor.add_page(get_page(1, [1, 2, 3]))
+        cursor.save()
+
+        loaded = QueryCursor.load(path)
+        assert_equal(loaded.to_dict(), cursor.to_dict())
+        assert_equal(loaded.get_missing_start_indexes(), [3])
+        loaded.start('Defect', '', None)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_pages_are_saved_periodically():
+    """Test a cursor with a path is saved every ``save_interval`` pages."""
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'cursor.json')
+        cursor = QueryCursor(path, save_interval=2)
+        ids = [1, 2, 3, 4, 5]
+
+        cursor.add_page(get_page(1, ids))
+        assert_false(os.path.exists(path))
+        cursor.add_page(get_page(3, ids))
+        assert_equal(QueryCursor.load(path).pages.keys(), [1, 3])
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,33 @@
+import json
+
+from mock import patch
+from nose.tools import assert_equal, assert_raises
+
+from pyrally.json_codec import JSONCodec, get_codec, load_codec
+
+
+def test_get_codec_uses_named_library():
+    """Test :py:func:`~.get_codec` with a library name."""
+    codec = get_codec('json')
+
+    assert_equal(codec.name, 'json')
+    assert_equal(codec.loads('{"a": [1, 2]}'), {'a': [1, 2]})
+    assert_equal(codec.dumps({'a': 1}), '{"a": 1}')
+
+
+@patch('pyrally.json_codec.PREFERENCE', ['not_a_json_library', 'json'])
+def test_get_codec_defaults_to_first_installed_library():
+    """Test :py:func:`~.get_codec` skips libraries which aren't installed."""
+    assert_equal(get_codec().name, 'json')
+
+
+def test_get_codec_returns_codec_given():
+    """Test :py:func:`~.get_codec` accepts a :py:class:`~.JSONCodec`."""
+    codec = JSONCodec('custom', json.loads, json.dumps)
+
+    assert_equal(get_codec(codec), codec)
+
+
+def test_load_codec_rejects_unsupported_libraries():
+    """Test :py:func:`~.load_codec` only loads supported libraries."""
+    assert_raises(ValueError, load_codec, 'pickle')
@@ -0,0 +1,105 @@
+from nose.tools import assert_equal, assert_true
+
+from pyrally.metrics import Histogram, MetricsRegistry
+
+
+def get_event(**kwargs):
+    event = {'url': 'url', 'type': 'defect', 'method': 'GET',
+             'cache_hit': False, 'status': 200, 'bytes': 100,
+             'bytes_sent': 0, 'latency': 0.2, 'retries': 0, 'attempt': 0,
+             'decode_time': 0.01, 'error': None}
+    event.update(kwargs)
+    return event
+
+
+def test_histogram_counts_cumulatively():
+    """Test :py:meth:`~.Histogram.snapshot` returns cumulative counts."""
+    histogram = Histogram([0.1, 1])
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+
+    assert_equal(snapshot['buckets'], [(0.1, 2), (1, 3), (float('inf'), 4)])
+    assert_equal(snapshot['count'], 4)
+    assert_equal(snapshot['sum'], 3.65)
+
+
+def test_record_breaks_metrics_down_by_type():
+    """
+    Test :py:meth:`~.MetricsRegistry.record`.
+
+    Test that:
+        * Requests, errors, bytes and decode time are totalled per type.
+        * Cache hits are counted but not timed.
+        * The cache hit ratio covers ``GET`` calls only.
+    """
+    registry = MetricsRegistry()
+    registry.record(get_event())
+    registry.record(get_event(cache_hit=True, bytes=0, latency=0.0))
+    registry.record(get_event(cache_hit=True, bytes=0, latency=0.0))
+    registry.record(get_event(method='POST', bytes_sent=50, status=500,
+                              error=Exception()))
+    registry.record(get_event(type=None))
+
+    snapshot = registry.snapshot()
+
+    defects = snapshot['defect']
+    assert_equal(defects['requests'], 2)
+    assert_equal(defects['errors'], 1)
+    assert_equal((defects['cache_hits'], defects['cache_misses']), (2, 1))
+    assert_equal(round(defects['cache_hit_ratio'], 2), 0.67)
+    assert_equal((defects['bytes_in'], defects['bytes_out']), (200, 50))
+    assert_equal(defects['decode_time'], 0.02)
+    assert_equal(defects['latency']['count'], 2)
+    assert_equal(snapshot['unknown']['requests'], 1)
+
+
+def test_retries_count_as_requests_but_not_misses():
+    """
+    Test :py:meth:`~.MetricsRegistry.record` with a retried ``GET``.
+
+    Test that:
+        * Each attempt counts as a request, but the call only counts as one
+          cache miss.
+        * A first attempt which the connection pool had to resend still
+          counts as a miss.
+    """
+    registry = MetricsRegistry()
+    for attempt in range(3):
+        registry.record(get_event(retries=attempt, attempt=attempt,
+                                  error=Exception()))
+    registry.record(get_event(retries=1, attempt=0))
+
+    defects = registry.snapshot()['defect']
+    assert_equal(defects['requests'], 4)
+    assert_equal(defects['cache_misses'], 2)
+
+
+def test_reset_forgets_metrics():
+    """Test :py:meth:`~.MetricsRegistry.reset` empties the registry."""
+    registry = MetricsRegistry()
+    registry.record(get_event())
+
+    registry.reset()
+
+    assert_equal(registry.snapshot(), {})
+
+
+def test_to_prometheus():
+    """Test :py:meth:`~.MetricsRegistry.to_prometheus` output."""
+    registry = MetricsRegistry(buckets=[0.5])
+    registry.record(get_event())
+
+    lines = registry.to_prometheus().splitlines()
+
+    assert_true('# TYPE pyrally_requests_total counter' in lines)
+    assert_true('pyrally_requests_total{type="defect"} 1' in lines)
+    assert_true('pyrally_received_bytes_total{type="defect"} 100' in lines)
+    assert_true('# TYPE pyrally_request_latency_seconds histogram' in lines)
+    assert_true('pyrally_request_latency_seconds_bucket'
+                '{type="defect",le="0.5"} 1' in lines)
+    assert_true('pyrally_request_latency_seconds_bucket'
+                '{type="defect",le="+Inf"} 1' in lines)
+    assert_true('pyrally_request_latency_seconds_count'
+                '{type="defect"} 1' in lines)
@@ -1,7 +1,17 @@
+import pickle
+import threading
+import time
+
 from mock import patch, Mock
 from nose.tools import assert_equal, assert_raises, assert_true, assert_false
 
-from pyrally.models import BaseRallyModel, ReferenceNotFoundException
+from pyrally.cache import MemoryCache
+from pyrally.cursor import QueryCursor
+from pyrally.paging import AdaptivePageSizer
+from pyrally.query import Q
+from pyrally.models import (BaseRallyModel, ReferenceNotFoundException,
+                            RallyField, Artifact, Defect, FORMATTED_ID_REFS)
+from pyrally.rally_access import RallyAccessor, AsyncRallyAccessor
 
 
 def get_inherited_class_object():
@@ -46,20 +56,20 @@ def test_create_from_ref_with_errors(get_accessor):
                   'test_reference')
 
 
-@patch('pyrally.models.get_query_clauses')
-def test_get_all_with_clauses(get_query_clauses):
+@patch('pyrally.models.split_query_clauses')
+def test_get_all_with_clauses(split_query_clauses):
     """
     Test :py:meth:`~.BaseRallyModel.get_all` with clauses passed in.
 
     Test that:
-        * ``get_all`` calls ``get_query_clauses``
+        * ``get_all`` calls ``split_query_clauses``
         * Uses the result to call ``get_all_results_for_query``
         * returns the set of objects as returned by
           ``convert_from_query_result``
     """
     DummyClass = get_inherited_class_object()
 
-    get_query_clauses.return_value = 'mock_query'
+    split_query_clauses.return_value = ['mock_query']
 
     mock_get_all_results_for_query = Mock()
     mock_get_all_results_for_query.return_value = 'mock_results'
@@ -70,7 +80,7 @@ def test_get_all_with_clauses(get_query_clauses):
 
     response = DummyClass.get_all('clauses')
 
-    assert_equal(get_query_clauses.call_args[0][0], 'clauses')
+    assert_equal(split_query_clauses.call_args[0][0], 'clauses')
     assert_equal(mock_get_all_results_for_query.call_args[0][0],
                  'mock_query')
     assert_equal(mock_convert_from_query_result.call_args[0][0],
@@ -78,13 +88,13 @@ def test_get_all_with_clauses(get_query_clauses):
     assert_equal(response, 'mock_conversion')
 
 
-@patch('pyrally.models.get_query_clauses')
-def test_get_all_without_clauses(get_query_clauses):
+@patch('pyrally.models.split_query_clauses')
+def test_get_all_without_clauses(split_query_clauses):
     """
     Test :py:meth:`~.BaseRallyModel.get_all` with no clauses passed in.
 
     Test that:
-        * ``get_all`` does not call ``get_query_clauses``
+        * ``get_all`` does not call ``split_query_clauses``
         * Calls ``get_all_results_for_query`` with a blank query.
         * returns the set of objects as returned by
           ``convert_from_query_result``
@@ -100,7 +110,7 @@ def test_get_all_without_clauses(get_query_clauses):
 
     response = DummyClass.get_all()
 
-    assert_false(get_query_clauses.called)
+    assert_false(split_query_clauses.called)
     assert_equal(mock_get_all_results_for_query.call_args[0][0],
                  '')
     assert_equal(mock_convert_from_query_result.call_args[0][0],
@@ -128,7 +138,8 @@ def test_get_all_results_for_query():
 
     DummyClass = get_inherited_class_object()
     DummyClass._get_results_page = Mock()
-    DummyClass._get_results_page.side_effect = lambda x, y: results_pages.pop()
+    DummyClass._get_results_page.side_effect = \
+                            lambda x, y, **kwargs: results_pages.pop()
 
     response = DummyClass.get_all_results_for_query('query_string')
     assert_equal(DummyClass._get_results_page.call_count, 2)
@@ -136,6 +147,112 @@ def test_get_all_results_for_query():
     assert_equal(DummyClass._get_results_page.call_args[0][0], 'query_string')
 
 
+def test_get_all_results_for_query_fetches_remaining_pages_in_order():
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all_results_for_query` paging.
+
+    Test that:
+        * Every remaining page is requested from the ``TotalResultCount``
+          and ``PageSize`` of the first page.
+        * Results are returned in page order regardless of the order in which
+          pages are fetched.
+    """
+    def get_page(query_string, start_index, **kwargs):
+        return {'Results': range(start_index, min(start_index + 2, 8)),
+                'PageSize': 2,
+                'StartIndex': start_index,
+                'TotalResultCount': 7}
+
+    DummyClass = get_inherited_class_object()
+    DummyClass._get_results_page = Mock()
+    DummyClass._get_results_page.side_effect = get_page
+
+    response = DummyClass.get_all_results_for_query('query_string')
+
+    assert_equal(response, range(1, 8))
+    assert_equal(sorted(call[0][1] for call in
+                        DummyClass._get_results_page.call_args_list),
+                 [1, 3, 5, 7])
+
+
+def test_iter_all_yields_objects_page_by_page():
+    """
+    Test :py:meth:`~.BaseRallyModel.iter_all` is lazy.
+
+    Test that:
+        * Objects from the first page are yielded before the second page is
+          requested.
+        * Every page is eventually fetched and converted.
+    """
+    def get_page(query_string, start_index, **kwargs):
+        return {'Results': [{'_type': 'FakeRallyName', 'Name': start_index}],
+                'PageSize': 1,
+                'StartIndex': start_index,
+                'TotalResultCount': 2}
+
+    DummyClass = get_inherited_class_object()
+    DummyClass._get_results_page = Mock()
+    DummyClass._get_results_page.side_effect = get_page
+
+    objects = DummyClass.iter_all()
+    first = next(objects)
+
+    assert_equal(first.Name, 1)
+    assert_equal(DummyClass._get_results_page.call_count, 1)
+    assert_equal([obj.Name for obj in objects], [2])
+    assert_equal(DummyClass._get_results_page.call_count, 2)
+
+
+def test_iter_all_with_prefetch():
+    """
+    Test :py:meth:`~.BaseRallyModel.iter_all` with ``prefetch=True``.
+
+    Test that every page is fetched and the objects come back in order.
+    """
+    def get_page(query_string, start_index, **kwargs):
+        return {'Results': [{'_type': 'FakeRallyName', 'Name': start_index}],
+                'PageSize': 1,
+                'StartIndex': start_index,
+                'TotalResultCount': 3}
+
+    DummyClass = get_inherited_class_object()
+    DummyClass._get_results_page = Mock()
+    DummyClass._get_results_page.side_effect = get_page
+
+    objects = list(DummyClass.iter_all(['Name > 0'], prefetch=True))
+
+    assert_equal([obj.Name for obj in objects], [1, 2, 3])
+    assert_equal(DummyClass._get_results_page.call_args[0][0], 'Name > 0')
+
+
+def test_iter_all_with_prefetch_stopped_early():
+    """
+    Test :py:meth:`~.BaseRallyModel.iter_all` with ``prefetch=True`` when
+    the caller stops after the first object.
+
+    Test that no threads are left running.
+    """
+    def get_page(query_string, start_index, **kwargs):
+        return {'Results': [{'_type': 'FakeRallyName', 'Name': start_index}],
+                'PageSize': 1,
+                'StartIndex': start_index,
+                'TotalResultCount': 3}
+
+    DummyClass = get_inherited_class_object()
+    DummyClass._get_results_page = Mock(side_effect=get_page)
+    thread_count = threading.active_count()
+
+    for _ in range(5):
+        for obj in DummyClass.iter_all(prefetch=True):
+            break
+
+    for _ in range(100):
+        if threading.active_count() <= thread_count:
+            break
+        time.sleep(0.01)
+    assert_equal(threading.active_count(), thread_count)
+
+
 @patch('pyrally.models.get_accessor')
 def test__get_results_page_with_no_errors(get_accessor):
     """
@@ -159,6 +276,107 @@ def test__get_results_page_with_no_errors(get_accessor):
     assert_equal(response, query_result)
 
 
+@patch('pyrally.models.get_accessor')
+def test__get_results_page_with_fields(get_accessor):
+    """
+    Test :py:meth:`~.BaseRallyModel._get_results_page` with ``fields``.
+
+    Test that only the fields asked for are fetched.
+    """
+    mock_api_response = {'QueryResult': {'Errors': []}}
+    get_accessor().make_api_call.return_value = mock_api_response
+    expected_url = ('fakerallyname.js?pagesize=100&start=101&'
+                    'fetch=Name,FormattedID')
+    DummyClass = get_inherited_class_object()
+
+    DummyClass._get_results_page('', 101, fields=['Name', 'FormattedID'])
+
+    assert_equal(get_accessor().make_api_call.call_args[0][0], expected_url)
+
+
+def test_get_all_with_fields_creates_partial_objects():
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all` with ``fields``.
+
+    Test that the fields are passed on for the query and the objects created
+    are marked as partial.
+    """
+    DummyClass = get_inherited_class_object()
+    DummyClass.get_all_results_for_query = Mock()
+    DummyClass.get_all_results_for_query.return_value = [
+                                            {'_type': 'FakeRallyName',
+                                             'Name': 'Some name'}]
+
+    objects = DummyClass.get_all(fields=['Name'])
+
+    assert_equal(DummyClass.get_all_results_for_query.call_args[1]['fields'],
+                 ['Name'])
+    assert_true(objects[0]._partial)
+
+
+@patch('pyrally.cache.time')
+@patch('pyrally.models.time')
+@patch('pyrally.models.get_accessor')
+def test_incremental_results_only_fetch_updated_objects(get_accessor,
+                                                        time_import,
+                                                        cache_time_import):
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all_results_for_query` with
+    ``incremental=True``.
+
+    Test that:
+        * The first call fetches the full result set and stores it.
+        * A call within the cache timeout makes no requests.
+        * A later call only fetches objects updated since the newest
+          ``LastUpdateDate`` held, and merges them in.
+    """
+    get_accessor.return_value = RallyAccessor('uname', 'pword', 'base_url',
+                                              cache=MemoryCache())
+    get_accessor().set_cache_timeout('FakeRallyName_query', 120)
+    DummyClass = get_inherited_class_object()
+    queries = []
+
+    def get_page(query_string, start_index, **kwargs):
+        queries.append(query_string)
+        if 'LastUpdateDate' in query_string:
+            results = [{'_ref': 'ref/2', 'Name': 'changed',
+                        'LastUpdateDate': '2012-01-03'},
+                       {'_ref': 'ref/3', 'Name': 'new',
+                        'LastUpdateDate': '2012-01-04'}]
+        else:
+            results = [{'_ref': 'ref/1', 'Name': 'one',
+                        'LastUpdateDate': '2012-01-01'},
+                       {'_ref': 'ref/2', 'Name': 'two',
+                        'LastUpdateDate': '2012-01-02'}]
+        total = 3 if len(queries) > 2 else 2
+        return {'Results': results, 'PageSize': 100, 'StartIndex': 1,
+                'TotalResultCount': len(results) if kwargs.get('fields') != [
+                                                'ObjectID'] else total}
+
+    DummyClass._get_results_page = Mock()
+    DummyClass._get_results_page.side_effect = get_page
+
+    time_import.time = cache_time_import.time
+    time_import.time.return_value = 1000
+    first = DummyClass.get_all_results_for_query('Name != ""',
+                                                 incremental=True)
+    assert_equal([result['Name'] for result in first], ['one', 'two'])
+
+    time_import.time.return_value = 1060
+    DummyClass.get_all_results_for_query('Name != ""', incremental=True)
+    assert_equal(len(queries), 1)
+
+    time_import.time.return_value = 1200
+    refreshed = DummyClass.get_all_results_for_query('Name != ""',
+                                                     incremental=True)
+    assert_equal([result['Name'] for result in refreshed],
+                 ['one', 'changed', 'new'])
+    assert_equal(queries[1],
+                 '(Name != "") and (LastUpdateDate >= "2012-01-02")')
+    assert_false(any(call[1]['use_cache'] for call in
+                     DummyClass._get_results_page.call_args_list))
+
+
 @patch('pyrally.models.get_accessor')
 def test__get_results_page_with_errors(get_accessor):
     """
@@ -280,6 +498,110 @@ def test_get_by_formatted_id_no_match():
                  (['FormattedID = "Some_ID"'],))
 
 
+@patch.dict('pyrally.models.FORMATTED_ID_REFS', clear=True)
+def test_get_by_formatted_id_uses_refs_seen_in_queries():
+    """
+    Test :py:meth:`~.BaseRallyModel.get_by_formatted_id` uses earlier queries.
+
+    Test that:
+        * Query results record the ``_ref`` of each FormattedID.
+        * A FormattedID seen before is loaded from its ``_ref`` without a
+          query.
+        * If the reference no longer exists, it is forgotten and queried for.
+    """
+    DummyClass = get_inherited_class_object()
+    DummyClass.get_all = Mock(return_value=[])
+    DummyClass.create_from_ref = Mock()
+    DummyClass.convert_from_query_result(
+            [{'_ref': 'fake/1234.js', '_type': 'FakeRallyName',
+              'FormattedID': 'US12'}], full_objects=True)
+
+    assert_equal(DummyClass.get_by_formatted_id('us12'),
+                 DummyClass.create_from_ref.return_value)
+    assert_equal(DummyClass.create_from_ref.call_args[0], ('fake/1234.js',))
+    assert_false(DummyClass.get_all.called)
+
+    DummyClass.create_from_ref.side_effect = ReferenceNotFoundException()
+    assert_equal(DummyClass.get_by_formatted_id('US12'), None)
+    assert_equal(DummyClass.get_all.call_count, 1)
+    assert_equal(DummyClass.create_from_ref.call_count, 2)
+    DummyClass.get_by_formatted_id('US12')
+    assert_equal(DummyClass.create_from_ref.call_count, 2)
+
+
+def test_artifact_get_by_formatted_id_queries_the_prefix_type():
+    """
+    Test :py:meth:`~.Artifact.get_by_formatted_id` picks the type to query.
+
+    Test that:
+        * ``DE`` ids are looked up as ``Defect`` s.
+        * Ids with an unknown prefix are looked up as ``Artifact`` s.
+    """
+    with patch.object(Defect, 'get_all') as defect_get_all:
+        with patch.object(Artifact, 'get_all') as artifact_get_all:
+            defect_get_all.return_value = []
+            artifact_get_all.return_value = []
+
+            Artifact.get_by_formatted_id('de12')
+            assert_equal(defect_get_all.call_args[0],
+                         (['FormattedID = "de12"'],))
+            assert_false(artifact_get_all.called)
+
+            Artifact.get_by_formatted_id('XY12')
+            assert_equal(artifact_get_all.call_args[0],
+                         (['FormattedID = "XY12"'],))
+
+
+@patch.dict('pyrally.models.FORMATTED_ID_REFS',
+            {('FakeRallyName', 'US1'): 'fake/1.js'}, clear=True)
+@patch('pyrally.models.load_from_refs')
+def test_get_many_by_formatted_id(load_from_refs):
+    """
+    Test :py:meth:`~.BaseRallyModel.get_many_by_formatted_id`.
+
+    Test that:
+        * FormattedIDs seen in earlier queries are loaded from their refs.
+        * The rest are fetched with a single ``or`` query.
+        * Every FormattedID asked for is returned, with ``None`` for those
+          which can't be found.
+    """
+    DummyClass = get_inherited_class_object()
+    loaded = DummyClass({'FormattedID': 'US1'})
+    queried = DummyClass({'FormattedID': 'US2'})
+    load_from_refs.return_value = [loaded]
+    DummyClass.get_all = Mock(return_value=[queried])
+
+    result = DummyClass.get_many_by_formatted_id(['US1', 'us2', 'US3'])
+
+    assert_equal(result, {'US1': loaded, 'us2': queried, 'US3': None})
+    assert_equal(load_from_refs.call_args[0][0],
+                 [{'_ref': 'fake/1.js', '_type': 'FakeRallyName'}])
+    assert_equal(DummyClass.get_all.call_count, 1)
+    assert_equal(DummyClass.get_all.call_args[0],
+                 (['(FormattedID = "US2") or (FormattedID = "US3")'],))
+
+
+@patch('pyrally.models.FORMATTED_ID_REFS_SIZE', 2)
+@patch.dict('pyrally.models.FORMATTED_ID_REFS', clear=True)
+def test_formatted_id_refs_are_bounded():
+    """
+    Test the FormattedIDs seen in query results are bounded.
+
+    Test that only the most recently seen FormattedIDs are kept.
+    """
+    DummyClass = get_inherited_class_object()
+    for object_id in [1, 2, 1, 3]:
+        DummyClass.convert_from_query_result(
+                [{'_ref': 'fake/{0}.js'.format(object_id),
+                  '_type': 'FakeRallyName',
+                  'FormattedID': 'us{0}'.format(object_id)}],
+                full_objects=True)
+
+    assert_equal(FORMATTED_ID_REFS.items(),
+                 [(('FakeRallyName', 'US1'), 'fake/1.js'),
+                  (('FakeRallyName', 'US3'), 'fake/3.js')])
+
+
 def test_title_property():
     """
     Test the ``title`` property of :py:class:`.BaseRallyModel`.
@@ -287,3 +609,382 @@ def test_title_property():
     DummyClass = get_inherited_class_object()
     mock_instance = DummyClass({'_refObjectName': 'some ref'})
     assert_equal(mock_instance.title, 'some ref')
+
+
+@patch('pyrally.models.get_async_accessor')
+def test_async_methods_run_in_background(get_async_accessor):
+    """
+    Test the asynchronous methods of :py:class:`.BaseRallyModel`.
+
+    Test that:
+        * ``get_all_async`` and ``create_from_ref_async`` call their blocking
+          versions with the same arguments.
+        * ``fetch`` loads the attribute.
+        * Each returns a result to ``get`` the value from.
+    """
+    async_accessor = AsyncRallyAccessor(Mock(), max_workers=2)
+    get_async_accessor.return_value = async_accessor
+    DummyClass = get_inherited_class_object()
+    DummyClass.sub_objects_dynamic_loader = {'tasks': 'Tasks'}
+    DummyClass.get_all = Mock(return_value=['obj'])
+    DummyClass.create_from_ref = Mock(return_value='obj')
+
+    try:
+        assert_equal(DummyClass.get_all_async(['Name = "x"'],
+                                              fields=['Name']).get(1), ['obj'])
+        assert_equal(DummyClass.get_all.call_args,
+                     ((['Name = "x"'],), {'fields': ['Name']}))
+        assert_equal(DummyClass.create_from_ref_async('ref/1').get(1), 'obj')
+        assert_equal(DummyClass.create_from_ref.call_args[0], ('ref/1',))
+
+        instance = DummyClass({'Tasks': []})
+        instance._memoize('tasks', ['task'])
+        assert_equal(instance.fetch('tasks').get(1), ['task'])
+    finally:
+        async_accessor.close()
+
+
+def get_fake_results_page(ids, fetched, fail_at=None):
+    """Return a stand in for ``_get_results_page`` over ObjectIDs ``ids``.
+
+    Full pages fetched are appended to ``fetched``.
+    """
+    def get_results_page(query_string, start, fields=None, use_cache=True,
+                         order=None, page_size=None, sizer=None):
+        assert_equal(order, 'ObjectID')
+        if start == fail_at:
+            raise Exception('Connection reset')
+        if fields != ['ObjectID']:
+            fetched.append(start)
+        return {'StartIndex': start, 'PageSize': 2,
+                'TotalResultCount': len(ids),
+                'Results': [{'ObjectID': object_id}
+                            for object_id in ids[start - 1:start + 1]]}
+    return get_results_page
+
+
+def test_get_all_results_for_query_resumes_from_cursor():
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all_results_for_query` with a cursor.
+
+    Test that:
+        * Pages fetched before a failure are kept in the cursor.
+        * Calling again only fetches the missing pages.
+    """
+    DummyClass = get_inherited_class_object()
+    ids = [1, 2, 3, 4, 5, 6, 7]
+    fetched = []
+    cursor = QueryCursor()
+    DummyClass._get_results_page = Mock(
+                side_effect=get_fake_results_page(ids, fetched, fail_at=5))
+
+    assert_raises(Exception, DummyClass.get_all_results_for_query, '',
+                  cursor=cursor)
+    assert_equal(sorted(fetched), [1, 3, 7])
+
+    del fetched[:]
+    DummyClass._get_results_page = Mock(
+                side_effect=get_fake_results_page(ids, fetched))
+    results = DummyClass.get_all_results_for_query('', cursor=cursor)
+
+    assert_equal(fetched, [5])
+    assert_equal([result['ObjectID'] for result in results], ids)
+
+
+def test_get_all_results_for_query_refetches_shifted_pages():
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all_results_for_query` with a cursor
+    when results change part way through.
+
+    Test that only pages whose objects have shifted are fetched again.
+    """
+    DummyClass = get_inherited_class_object()
+    ids = [1, 2, 3, 4, 5, 6, 7, 8]
+    fetched = []
+    cursor = QueryCursor()
+    DummyClass._get_results_page = Mock(
+                side_effect=get_fake_results_page(ids, fetched, fail_at=7))
+    assert_raises(Exception, DummyClass.get_all_results_for_query, '',
+                  cursor=cursor)
+
+    # Object 4 is deleted, shifting every page from start=3 on.
+    ids.remove(4)
+    del fetched[:]
+    DummyClass._get_results_page = Mock(
+                side_effect=get_fake_results_page(ids, fetched))
+    results = DummyClass.get_all_results_for_query('', cursor=cursor)
+
+    assert_equal(sorted(fetched), [3, 5, 7])
+    assert_equal([result['ObjectID'] for result in results], ids)
+
+
+@patch('pyrally.models.get_accessor')
+def test__get_results_page_with_page_size(get_accessor):
+    """
+    Test :py:meth:`~.BaseRallyModel._get_results_page` with ``page_size``.
+
+    Test that:
+        * The class ``page_size`` is used by default.
+        * A ``page_size`` given is used instead, limited to the maximum.
+    """
+    get_accessor().make_api_call.return_value = {'QueryResult': {
+                                                        'Errors': []}}
+    DummyClass = get_inherited_class_object()
+    DummyClass.page_size = 20
+
+    for page_size, expected in [(None, 20), (50, 50), (1000, 200)]:
+        DummyClass._get_results_page('', page_size=page_size)
+        assert_equal(get_accessor().make_api_call.call_args[0][0],
+                     'fakerallyname.js?pagesize={0}&start=1&'
+                     'fetch=true'.format(expected))
+
+
+@patch('pyrally.models.get_accessor')
+def test__get_results_page_adapts_page_size(get_accessor):
+    """
+    Test :py:meth:`~.BaseRallyModel._get_results_page` with an
+    :py:class:`~.AdaptivePageSizer`.
+
+    Test that the sizer's page size is used and it observes the response.
+    """
+    def make_api_call(url, use_cache=True, response_info=None):
+        response_info.update({'bytes': 5000, 'latency': 0.1})
+        return {'QueryResult': {'Errors': [], 'Results': [{}] * 10}}
+    get_accessor().make_api_call.side_effect = make_api_call
+    sizer = AdaptivePageSizer(initial=10)
+    sizer.observe = Mock()
+    DummyClass = get_inherited_class_object()
+
+    DummyClass._get_results_page('', page_size=sizer)
+
+    assert_true('pagesize=10&' in get_accessor().make_api_call.call_args[0][0])
+    assert_equal(sizer.observe.call_args[0], (10, 5000, 0.1))
+
+
+@patch('pyrally.models.get_accessor')
+def test_get_all_results_for_query_keeps_page_size_for_query(get_accessor):
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all_results_for_query` with an
+    :py:class:`~.AdaptivePageSizer` that changes part way through.
+
+    Test that:
+        * Every page of the query is fetched with the first page's size, so
+          no results are skipped or repeated.
+        * The sizer observes every page and its new size is used by the next
+          query.
+    """
+    ids = range(1, 401)
+
+    def make_api_call(url, use_cache=True, response_info=None):
+        args = dict(arg.split('=') for arg in url.split('?')[1].split('&'))
+        page_size, start = int(args['pagesize']), int(args['start'])
+        response_info.update({'bytes': 1000, 'latency': 0.1})
+        return {'QueryResult': {
+                    'Errors': [], 'StartIndex': start, 'PageSize': page_size,
+                    'TotalResultCount': len(ids),
+                    'Results': [{'ObjectID': object_id} for object_id in
+                                ids[start - 1:start - 1 + page_size]]}}
+    get_accessor().make_api_call.side_effect = make_api_call
+    sizer = AdaptivePageSizer(initial=20, smoothing=1)
+    DummyClass = get_inherited_class_object()
+    DummyClass.page_size = sizer
+
+    results = DummyClass.get_all_results_for_query('')
+    assert_equal([result['ObjectID'] for result in results], ids)
+    assert_equal(get_accessor().make_api_call.call_count, 20)
+    assert_equal(sizer.page_size, 200)
+
+    for prefetch in [False, True]:
+        sizer.page_size = 20
+        results = [result['ObjectID'] for page in
+                   DummyClass.iter_results_for_query('', prefetch=prefetch)
+                   for result in page]
+        assert_equal(results, ids)
+
+    DummyClass.get_all_results_for_query('')
+    assert_true('pagesize=200&' in
+                get_accessor().make_api_call.call_args[0][0])
+
+
+def test_fields_are_read_through_rally_field_descriptors():
+    """
+    Test fields read from ``rally_data`` are added to the class.
+
+    Test that:
+        * A :py:class:`~.RallyField` is added for a field once read.
+        * It reads the field for other instances.
+        * Instances without the field still raise ``AttributeError``.
+    """
+    DummyClass = get_inherited_class_object()
+    first = DummyClass({'Rank': 10})
+    second = DummyClass({'Rank': 20})
+
+    assert_equal(first.Rank, 10)
+    assert_true(isinstance(DummyClass.__dict__['Rank'], RallyField))
+    assert_equal(second.Rank, 20)
+    assert_raises(AttributeError, getattr, DummyClass({}), 'Rank')
+
+
+def test_setting_unfetched_fields_of_partial_objects():
+    """
+    Test setting a field that wasn't fetched for a partial object.
+
+    Test that:
+        * A CamelCase field is set in ``rally_data`` and marked as changed.
+        * Other attributes are still set on the object.
+        * Objects which aren't partial set other attributes on the object.
+    """
+    DummyClass = get_inherited_class_object()
+    instance = DummyClass({'Name': 'Fred'}, partial=True)
+
+    instance.KanbanState = 'new'
+    instance._note = 'note'
+    instance.local_note = 'note'
+
+    assert_equal(instance.rally_data, {'Name': 'Fred', 'KanbanState': 'new'})
+    assert_equal(instance.get_changed_data(), {'KanbanState': 'new'})
+    assert_equal((instance._note, instance.local_note), ('note', 'note'))
+
+    instance = DummyClass({'Name': 'Fred'})
+    instance.local_note = 'note'
+    assert_equal(instance.get_changed_data(), {})
+    assert_equal(instance.rally_data, {'Name': 'Fred'})
+
+
+def test_instances_are_slotted_and_picklable():
+    """
+    Test the layout of :py:class:`.BaseRallyModel` instances.
+
+    Test that:
+        * No dictionary of loaded objects is made until one is loaded.
+        * Other attributes can still be set.
+        * Instances survive pickling.
+    """
+    instance = BaseRallyModel({'Name': 'Fred'})
+    assert_equal(instance._full_sub_objects, None)
+
+    instance.local_note = 'note'
+    copied = pickle.loads(pickle.dumps(instance, pickle.HIGHEST_PROTOCOL))
+
+    assert_equal(copied.Name, 'Fred')
+    assert_equal(copied.local_note, 'note')
+    assert_false(copied._partial)
+
+
+@patch('pyrally.models.get_accessor')
+def test_create_from_ref_returns_live_objects(get_accessor):
+    """
+    Test :py:meth:`~.BaseRallyModel.create_from_ref` uses the identity map.
+
+    Test that:
+        * A reference still in use is returned again.
+        * It is brought up to date with the data from the accessor, which
+          comes from the cache until it expires.
+        * An object with unsaved changes isn't returned.
+        * ``use_identity_map=False`` always creates a new object.
+    """
+    DummyClass = get_inherited_class_object()
+    accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/')
+    cached = {'FakeRallyName': {'KanbanState': 'old'}}
+    accessor.make_api_call = Mock(return_value=cached)
+    get_accessor.return_value = accessor
+
+    first = DummyClass.create_from_ref('http://dummy_url/fake/1234.js')
+    first._memoize('Owner', 'owner')
+    second = DummyClass.create_from_ref('http://dummy_url/fake/1234.js')
+    assert_true(first is second)
+    assert_equal(first._full_sub_objects, {'Owner': 'owner'})
+
+    accessor.make_api_call.return_value = {'FakeRallyName': {
+                                                    'KanbanState': 'new'}}
+    third = DummyClass.create_from_ref('http://dummy_url/fake/1234.js')
+    assert_true(first is third)
+    assert_equal(first.KanbanState, 'new')
+    assert_equal(first._full_sub_objects, None)
+
+    first.KanbanState = 'changed'
+    unsaved = DummyClass.create_from_ref('http://dummy_url/fake/1234.js')
+    assert_false(first is unsaved)
+    assert_equal(unsaved.KanbanState, 'new')
+
+    fresh = DummyClass.create_from_ref('http://dummy_url/fake/1234.js',
+                                       use_identity_map=False)
+    assert_false(first is fresh)
+    assert_equal(accessor.make_api_call.call_count, 5)
+
+
+@patch('pyrally.models.API_OBJECT_TYPES')
+def test_references_are_memoized(API_OBJECT_TYPES):
+    """
+    Test reference fields are only loaded once per instance.
+
+    Test that:
+        * Reading a reference twice loads it once.
+        * Setting the field loads the new reference when next read.
+    """
+    create_from_ref = API_OBJECT_TYPES.get.return_value.create_from_ref
+    instance = BaseRallyModel({'Owner': {'_ref': 'user/1.js',
+                                         '_type': 'User'}})
+
+    assert_true(instance.Owner is instance.Owner)
+    assert_equal(create_from_ref.call_count, 1)
+
+    instance.Owner = {'_ref': 'user/2.js', '_type': 'User'}
+    instance.Owner
+    assert_equal(create_from_ref.call_count, 2)
+    assert_equal(create_from_ref.call_args[0], ('user/2.js',))
+
+
+@patch('pyrally.models.get_accessor')
+def test_update_rally_sends_only_changed_fields(get_accessor):
+    """
+    Test :py:meth:`~.BaseRallyModel.update_rally` on an existing object.
+
+    Test that:
+        * Nothing is sent when nothing has changed.
+        * Only fields changed by setting attributes or ``update`` are sent.
+        * Changes are forgotten once sent.
+    """
+    DummyClass = get_inherited_class_object()
+    get_accessor().make_api_call.return_value = {
+                                            'OperationResult': {'Errors': []}}
+    obj = DummyClass({'_ref': 'fake/1234.js', 'Name': 'Fred', 'Rank': 'a',
+                      'Notes': ''})
+
+    assert_equal(obj.update_rally(), None)
+    assert_false(get_accessor().make_api_call.called)
+
+    obj.Name = 'Barney'
+    obj.update(Notes='Some notes')
+    assert_equal(obj.get_changed_data(), {'Name': 'Barney',
+                                          'Notes': 'Some notes'})
+    obj.update_rally()
+
+    assert_equal(get_accessor().make_api_call.call_args[1]['data'],
+                 {'FakeRallyName': {'Name': 'Barney', 'Notes': 'Some notes'}})
+    assert_equal(obj.get_changed_data(), {})
+
+
+@patch('pyrally.models.split_query_clauses')
+def test_get_all_merges_split_queries(split_query_clauses):
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all` with a query split in two.
+
+    Test that:
+        * Results for each query are fetched and merged, without repeats.
+        * A cursor can't be used.
+    """
+    DummyClass = get_inherited_class_object()
+    split_query_clauses.return_value = ['query_1', 'query_2']
+    results = {'query_1': [{'_ref': 'a', '_type': 'FakeRallyName'},
+                           {'_ref': 'b', '_type': 'FakeRallyName'}],
+               'query_2': [{'_ref': 'b', '_type': 'FakeRallyName'},
+                           {'_ref': 'c', '_type': 'FakeRallyName'}]}
+    DummyClass.get_all_results_for_query = Mock(
+            side_effect=lambda query_string, **kwargs: results[query_string])
+
+    objects = DummyClass.get_all([Q('A = 1')])
+
+    assert_equal([obj.ref for obj in objects], ['a', 'b', 'c'])
+    assert_raises(ValueError, DummyClass.get_all, [Q('A = 1')],
+                  cursor=QueryCursor())
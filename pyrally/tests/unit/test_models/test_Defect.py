@@ -23,5 +23,6 @@ def test_get_all_in_kanban_states():
     response = MockDefect.get_all_in_kanban_states(['Kanban State Name'])
 
     assert_equal(response, MockDefect.get_all.return_value)
-    assert_equal(MockDefect.get_all.call_args[0],
-                (['KanbanState = "Kanban State Name"'],))
+    clauses = MockDefect.get_all.call_args[0][0]
+    assert_equal([str(clause) for clause in clauses],
+                 ['KanbanState = "Kanban State Name"'])
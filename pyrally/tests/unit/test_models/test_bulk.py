@@ -0,0 +1,111 @@
+from mock import patch, Mock
+from nose.tools import assert_equal, assert_true
+
+from pyrally.models import (BaseRallyModel, bulk_create, bulk_delete,
+                            bulk_update)
+
+
+def get_inherited_class_object():
+    class DummyRallyModel(BaseRallyModel):
+        rally_name = 'FakeRallyName'
+    return DummyRallyModel
+
+
+def get_reference(object_id):
+    return 'https://rally/slm/webservice/1.29/fake/{0}.js'.format(object_id)
+
+
+@patch('pyrally.models.get_accessor')
+def test_bulk_update_collects_errors(get_accessor):
+    """Test :py:func:`~pyrally.models.bulk_update` sends every update.
+
+    Test that:
+        * An update is POSTed for each object.
+        * Failures are returned with their object, without stopping the
+          other updates.
+        * Objects not yet in Rally are returned as failures.
+    """
+    DummyClass = get_inherited_class_object()
+    objects = [DummyClass({'_ref': get_reference(i), 'Name': None})
+               for i in range(3)]
+    for i, obj in enumerate(objects):
+        obj.Name = str(i)
+    unsynced = DummyClass({'Name': 'new'})
+
+    def make_api_call(url, full_url=False, method='GET', data=None):
+        errors = ['Bad Name'] if data['FakeRallyName']['Name'] == '1' else []
+        return {'OperationResult': {'Errors': errors}}
+    get_accessor().make_api_call.side_effect = make_api_call
+
+    errors = bulk_update(objects + [unsynced])
+
+    assert_equal([obj for obj, _ in errors], [objects[1], unsynced])
+    assert_true('Bad Name' in str(errors[0][1]))
+    assert_equal(get_accessor().make_api_call.call_count, 3)
+
+
+@patch('pyrally.models.load_from_refs')
+@patch('pyrally.models.get_accessor')
+def test_bulk_create_refreshes_in_one_batch(get_accessor, load_from_refs):
+    """Test :py:func:`~pyrally.models.bulk_create` with ``refresh=True``.
+
+    Test that:
+        * The new ``_ref`` is stored on each created object.
+        * Created objects are refreshed with a single ``load_from_refs``
+          call, leaving out objects which failed.
+    """
+    DummyClass = get_inherited_class_object()
+    objects = [DummyClass({'Name': str(i)}) for i in range(3)]
+
+    def make_api_call(url, full_url=False, method='GET', data=None):
+        name = data['FakeRallyName']['Name']
+        if name == '2':
+            return {'CreateResult': {'Errors': ['Failed']}}
+        return {'CreateResult': {'Errors': [],
+                                 'Object': {'_ref': get_reference(name)}}}
+    get_accessor().make_api_call.side_effect = make_api_call
+    load_from_refs.return_value = [
+                    DummyClass({'_ref': get_reference(0), 'Name': 'Loaded'})]
+
+    errors = bulk_create(objects)
+
+    assert_equal([obj for obj, _ in errors], [objects[2]])
+    assert_equal(objects[1].ref, get_reference(1))
+    assert_equal(load_from_refs.call_count, 1)
+    assert_equal(load_from_refs.call_args[0][0],
+                 [{'_ref': get_reference(0), '_type': 'FakeRallyName'},
+                  {'_ref': get_reference(1), '_type': 'FakeRallyName'}])
+    assert_equal(objects[0].Name, 'Loaded')
+    assert_equal(objects[1].Name, '1')
+
+
+@patch('pyrally.models.load_from_refs')
+@patch('pyrally.models.get_accessor')
+def test_bulk_create_without_refresh(get_accessor, load_from_refs):
+    """Test :py:func:`~pyrally.models.bulk_create` with ``refresh=False``.
+
+    Test that the objects are created but not fetched again.
+    """
+    DummyClass = get_inherited_class_object()
+    get_accessor().make_api_call.return_value = {
+            'CreateResult': {'Errors': [], 'Object': {'_ref': 'new_ref'}}}
+    obj = DummyClass({'Name': 'Fred'})
+
+    assert_equal(bulk_create([obj], refresh=False), [])
+    assert_equal(obj.ref, 'new_ref')
+    assert_equal(get_accessor().make_api_call.call_count, 1)
+    assert_equal(load_from_refs.call_count, 0)
+
+
+def test_bulk_delete_collects_errors():
+    """Test :py:func:`~pyrally.models.bulk_delete` deletes every object.
+
+    Test that each object is deleted and failures are returned with their
+    object.
+    """
+    objects = [Mock(), Mock()]
+    error = Exception('Errors in delete')
+    objects[0].delete.side_effect = error
+
+    assert_equal(bulk_delete(objects), [(objects[0], error)])
+    assert_equal(objects[1].delete.call_count, 1)
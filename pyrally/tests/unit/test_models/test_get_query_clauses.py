@@ -1,4 +1,4 @@
-from nose.tools import assert_equal
+from nose.tools import assert_equal, assert_true
 from pyrally.models import get_query_clauses
 
 
@@ -26,17 +26,17 @@ def test_full_example():
                                            'State = "Accepted"'], ' or '))
 
     assert_equal(clauses[1],
-                 '(((State = "Defined") or (State = "In Progress")) '
-                 'or (State = "Completed")) or (State = "Accepted")')
+                 '((State = "Defined") or (State = "In Progress")) '
+                 'or ((State = "Completed") or (State = "Accepted"))')
 
     clauses.append(get_query_clauses(
                                         ['WorkProduct.FormattedId = "US524"']))
     result = get_query_clauses(clauses)
     assert_equal(result,
                 '(((Owner.name = alex.couper@test.com) or '
-                '(Owner.name = bill@twe.com)) and ((((State = "Defined") '
-                'or (State = "In Progress")) or (State = "Completed")) '
-                'or (State = "Accepted"))) and '
+                '(Owner.name = bill@twe.com)) and (((State = "Defined") '
+                'or (State = "In Progress")) or ((State = "Completed") '
+                'or (State = "Accepted")))) and '
                 '(WorkProduct.FormattedId = "US524")')
 
 
@@ -69,4 +69,13 @@ def test_long_or_set():
                               'D = "4"'], ' or ')
 
     assert_equal(result,
-                 '(((A = "1") or (B = "2")) or (C = "3")) or (D = "4")')
+                 '((A = "1") or (B = "2")) or ((C = "3") or (D = "4"))')
+
+
+def test_long_or_set_is_balanced():
+    clauses = ['ObjectID = {0}'.format(i) for i in range(5000)]
+    result = get_query_clauses(clauses, ' or ')
+
+    assert_equal(result.count('(ObjectID = 0)'), 1)
+    assert_true(result.startswith('(' * 13 + 'ObjectID = 0)'))
+    assert_true(result.endswith('(ObjectID = 4999)' + ')' * 11))
@@ -0,0 +1,100 @@
+from mock import patch, Mock
+from nose.tools import assert_equal, assert_true, assert_false
+
+from pyrally.models import (BaseRallyModel, ReferenceNotFoundException,
+                            chunk_clauses, get_object_id, load_from_refs)
+
+
+def get_inherited_class_object():
+    class DummyRallyModel(BaseRallyModel):
+        rally_name = 'FakeRallyName'
+    return DummyRallyModel
+
+
+def get_skeleton(object_id, rally_type='FakeRallyName'):
+    return {'_ref': 'https://rally/slm/webservice/1.29/fake/{0}.js'.format(
+                                                                   object_id),
+            '_type': rally_type}
+
+
+def test_get_object_id():
+    """Test :py:func:`~pyrally.models.get_object_id` parses references."""
+    for reference, expected_id in [
+                ('https://rally/slm/webservice/1.29/task/5128087372.js',
+                 '5128087372'),
+                ('https://rally/slm/webservice/1.29/task/5128087372',
+                 '5128087372'),
+                ('some_reference', None)]:
+        assert_equal(get_object_id(reference), expected_id)
+
+
+def test_chunk_clauses_keeps_every_clause_in_order():
+    """Test :py:func:`~pyrally.models.chunk_clauses` splits long lists.
+
+    Test that:
+        * No chunk builds a query longer than ``max_length``.
+        * All clauses are returned, in order.
+    """
+    clauses = ['ObjectID = {0}'.format(i) for i in range(100)]
+
+    chunks = chunk_clauses(clauses, max_length=200)
+
+    assert_true(len(chunks) > 1)
+    assert_equal(sum(chunks, []), clauses)
+    for chunk in chunks:
+        assert_true(len(chunk) * len('ObjectID = 99') < 200)
+
+
+def test_chunk_clauses_short_list_is_one_chunk():
+    """Test :py:func:`~pyrally.models.chunk_clauses` with a short list."""
+    assert_equal(chunk_clauses(['a = 1', 'b = 2']), [['a = 1', 'b = 2']])
+
+
+def test_load_from_refs_batches_by_type():
+    """Test :py:func:`~pyrally.models.load_from_refs` batches references.
+
+    Test that:
+        * A single ObjectID query is made for all references of a type.
+        * ``create_from_ref`` is not called.
+        * Objects are returned in the order of the references given, leaving
+          out any not returned by the query.
+    """
+    DummyClass = get_inherited_class_object()
+    DummyClass.get_all = Mock()
+    DummyClass.get_all.return_value = [DummyClass({'ObjectID': 3}),
+                                       DummyClass({'ObjectID': 1})]
+    DummyClass.create_from_ref = Mock()
+
+    objects = load_from_refs([get_skeleton(1), get_skeleton(2),
+                              get_skeleton(3)])
+
+    assert_equal([obj.ObjectID for obj in objects], [1, 3])
+    assert_equal(DummyClass.get_all.call_count, 1)
+    assert_equal(DummyClass.get_all.call_args[0],
+                 (['((ObjectID = 1) or (ObjectID = 2)) or (ObjectID = 3)'],))
+    assert_equal(DummyClass.create_from_ref.call_count, 0)
+
+
+@patch('pyrally.models.API_OBJECT_TYPES')
+def test_load_from_refs_falls_back_to_create_from_ref(API_OBJECT_TYPES):
+    """Test :py:func:`~pyrally.models.load_from_refs` without ObjectIDs.
+
+    Test that references which can't be batched are each fetched with
+    ``create_from_ref`` and any which are not found are left out.
+    """
+    MockClass = Mock()
+    API_OBJECT_TYPES.get.return_value = MockClass
+    found = Mock()
+
+    def create_from_ref(reference):
+        if reference == 'ref_1':
+            return found
+        raise ReferenceNotFoundException(reference)
+    MockClass.create_from_ref.side_effect = create_from_ref
+
+    objects = load_from_refs([{'_ref': 'ref_1', '_type': 'api_type'},
+                              {'_ref': 'ref_2', '_type': 'api_type'}])
+
+    assert_equal(objects, [found])
+    assert_equal(MockClass.create_from_ref.call_count, 2)
+    assert_false(MockClass.get_all.called)
@@ -0,0 +1,104 @@
+from mock import patch, Mock
+from nose.tools import assert_equal, assert_true
+
+from pyrally.models import BaseRallyModel, prefetch_related
+
+
+def get_inherited_class_object():
+    class DummyRallyModel(BaseRallyModel):
+        rally_name = 'FakeRallyName'
+        sub_objects_dynamic_loader = {'tasks': 'Tasks'}
+    return DummyRallyModel
+
+
+def get_skeleton(object_id):
+    return {'_ref': 'https://rally/slm/webservice/1.29/fake/{0}.js'.format(
+                                                                   object_id),
+            '_type': 'FakeRallyName'}
+
+
+def get_loaded(object_id):
+    return BaseRallyModel({'_ref': get_skeleton(object_id)['_ref'],
+                           'ObjectID': object_id})
+
+
+@patch('pyrally.models.load_from_refs')
+def test_prefetch_related_loads_distinct_references_once(load_from_refs):
+    """
+    Test :py:func:`~pyrally.models.prefetch_related`.
+
+    Test that:
+        * References shared between objects are only loaded once.
+        * All attributes are loaded in a single call to ``load_from_refs``.
+        * Loaded objects are returned from attribute access with no further
+          requests.
+    """
+    DummyClass = get_inherited_class_object()
+    load_from_refs.return_value = [get_loaded(1), get_loaded(2),
+                                   get_loaded(3)]
+    story_1 = DummyClass({'Owner': get_skeleton(1),
+                          'Tasks': [get_skeleton(2), get_skeleton(3)]})
+    story_2 = DummyClass({'Owner': get_skeleton(1), 'Tasks': []})
+    DummyClass.create_from_ref = Mock()
+
+    prefetch_related([story_1, story_2], 'Owner', 'tasks')
+
+    assert_equal(load_from_refs.call_count, 1)
+    assert_equal(sorted(skeleton['_ref'] for skeleton in
+                        load_from_refs.call_args[0][0]),
+                 [get_skeleton(i)['_ref'] for i in [1, 2, 3]])
+    assert_true(story_1.Owner is story_2.Owner)
+    assert_equal(story_1.Owner.ObjectID, 1)
+    assert_equal([task.ObjectID for task in story_1.tasks], [2, 3])
+    assert_equal(story_2.tasks, [])
+    assert_equal(DummyClass.create_from_ref.call_count, 0)
+
+
+@patch('pyrally.models.load_from_refs')
+def test_prefetch_related_missing_reference(load_from_refs):
+    """
+    Test :py:func:`~pyrally.models.prefetch_related` with a missing object.
+
+    A reference that could not be loaded resolves to ``None``, as it would
+    when accessed without prefetching.
+    """
+    DummyClass = get_inherited_class_object()
+    load_from_refs.return_value = []
+    story = DummyClass({'Owner': get_skeleton(1)})
+
+    prefetch_related([story], 'Owner')
+
+    assert_equal(story.Owner, None)
+
+
+@patch('pyrally.models.load_from_refs')
+def test_setting_attribute_discards_prefetched_object(load_from_refs):
+    """
+    Test that changing a prefetched attribute stops the old object from
+    being returned.
+    """
+    DummyClass = get_inherited_class_object()
+    load_from_refs.return_value = [get_loaded(1)]
+    story = DummyClass({'Owner': get_skeleton(1)})
+    prefetch_related([story], 'Owner')
+
+    story.Owner = 'new owner'
+
+    assert_equal(story.Owner, 'new owner')
+
+
+def test_get_all_prefetches_related():
+    """
+    Test :py:meth:`~.BaseRallyModel.get_all` passes ``related`` to
+    :py:func:`~pyrally.models.prefetch_related`.
+    """
+    DummyClass = get_inherited_class_object()
+    DummyClass.get_all_results_for_query = Mock()
+    DummyClass.convert_from_query_result = Mock()
+
+    with patch('pyrally.models.prefetch_related') as mock_prefetch:
+        response = DummyClass.get_all(related=['Owner', 'tasks'])
+
+    assert_equal(response, DummyClass.convert_from_query_result.return_value)
+    assert_equal(mock_prefetch.call_args[0],
+                 (response, 'Owner', 'tasks'))
@@ -0,0 +1,46 @@
+from nose.tools import assert_equal
+
+from pyrally.paging import AdaptivePageSizer, clamp_page_size
+
+
+def test_clamp_page_size():
+    """Test :py:func:`~.clamp_page_size` keeps sizes the API accepts."""
+    assert_equal([clamp_page_size(size) for size in [0, 1, 150, 201]],
+                 [1, 1, 150, 200])
+
+
+def test_small_fast_pages_grow_to_the_maximum():
+    """Test :py:meth:`~.AdaptivePageSizer.observe` grows narrow pages."""
+    sizer = AdaptivePageSizer(initial=100)
+
+    for _ in range(10):
+        sizer.observe(sizer.page_size, sizer.page_size * 50, 0.2)
+
+    assert_equal(sizer.page_size, 200)
+
+
+def test_large_pages_shrink_to_the_byte_target():
+    """Test :py:meth:`~.AdaptivePageSizer.observe` shrinks large pages."""
+    sizer = AdaptivePageSizer(initial=100, target_bytes=200000, smoothing=1)
+
+    sizer.observe(100, 1000000, 0.5)
+
+    assert_equal(sizer.page_size, 20)
+
+
+def test_slow_pages_shrink_to_the_latency_target():
+    """Test :py:meth:`~.AdaptivePageSizer.observe` shrinks slow pages."""
+    sizer = AdaptivePageSizer(initial=100, target_latency=2, smoothing=0.5)
+
+    sizer.observe(100, 1000, 8.0)
+
+    assert_equal(sizer.page_size, 63)
+
+
+def test_empty_pages_are_ignored():
+    """Test :py:meth:`~.AdaptivePageSizer.observe` ignores empty pages."""
+    sizer = AdaptivePageSizer(initial=100)
+
+    sizer.observe(0, 100, 1.0)
+
+    assert_equal(sizer.page_size, 100)
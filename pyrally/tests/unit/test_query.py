@@ -0,0 +1,91 @@
+from nose.tools import assert_equal, assert_raises, assert_true
+
+from pyrally.query import Q, negate_clause, url_safe_length
+
+
+def test_queries_combine_into_balanced_trees():
+    """Test :py:meth:`~pyrally.query.Q.to_query` for combined queries.
+
+    Test that:
+        * A single clause has no brackets.
+        * Chains of the same operator are balanced.
+        * Queries combined with another operator are nested.
+    """
+    a, b, c, d = [Q('{0} = 1'.format(name)) for name in 'ABCD']
+
+    assert_equal(a.to_query(), 'A = 1')
+    assert_equal((a | b | c | d).to_query(),
+                 '((A = 1) or (B = 1)) or ((C = 1) or (D = 1))')
+    assert_equal(((a | b) & c).to_query(),
+                 '((A = 1) or (B = 1)) and (C = 1)')
+    assert_equal(str(Q.all_of(['A = 1', b | c])),
+                 '(A = 1) and ((B = 1) or (C = 1))')
+
+
+def test_negation_is_pushed_down_to_clauses():
+    """Test ``~`` on :py:class:`~pyrally.query.Q` objects.
+
+    Test that:
+        * The operator of a single clause is reversed.
+        * ``and`` and ``or`` are swapped under a negation.
+        * A double negation has no effect.
+    """
+    query = ~(Q('A = 1') | ~Q('B < 2')) & Q('Name contains "x"')
+
+    assert_equal(query.to_query(),
+                 '((A != 1) and (B < 2)) and (Name contains "x")')
+    assert_equal((~~Q('A = 1')).to_query(), 'A = 1')
+
+
+def test_negate_clause():
+    """Test :py:func:`~pyrally.query.negate_clause`.
+
+    Test that comparisons are reversed and anything else raises a
+    ``ValueError``.
+    """
+    assert_equal(negate_clause('Name !contains "a = b"'),
+                 'Name contains "a = b"')
+    assert_equal(negate_clause('PlanEstimate >= 3'), 'PlanEstimate < 3')
+    assert_raises(ValueError, negate_clause, '(A = 1) or (B = 2)')
+    assert_raises(ValueError, negate_clause, 'A')
+
+
+def test_split_or_query():
+    """Test :py:meth:`~pyrally.query.Q.split` on a long ``or`` query.
+
+    Test that:
+        * A short query isn't split.
+        * Each query is within the maximum length.
+        * Every clause is in exactly one query, in order.
+    """
+    clauses = ['ObjectID = {0}'.format(i) for i in range(100)]
+    query = Q.any_of(clauses)
+    short_query = Q.any_of(clauses[:10])
+
+    assert_equal(short_query.split(), [short_query])
+
+    queries = query.split(max_length=300)
+    assert_true(len(queries) > 1)
+    for part in queries:
+        assert_true(url_safe_length(part.to_query()) <= 300)
+    assert_equal(sum([[child.clause for child in part.children]
+                      for part in queries], []), clauses)
+
+
+def test_split_and_query_keeps_other_clauses():
+    """Test :py:meth:`~pyrally.query.Q.split` on an ``and`` query.
+
+    Test that the longest ``or`` is split, and every query keeps the other
+    clauses.
+    """
+    owners = Q.any_of(['Owner.Name = "{0}"'.format(i) for i in range(50)])
+    query = Q('State = "Open"') & owners & Q.any_of(['A = 1', 'A = 2'])
+
+    queries = query.split(max_length=600)
+
+    assert_true(len(queries) > 1)
+    for part in queries:
+        query_string = part.to_query()
+        assert_true(url_safe_length(query_string) <= 600)
+        assert_true(query_string.startswith('((State = "Open") and ('))
+        assert_true(query_string.endswith(' and ((A = 1) or (A = 2))'))
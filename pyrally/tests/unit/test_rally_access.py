@@ -1,9 +1,16 @@
-import time
+import socket
+import threading
+import urllib2
+import zlib
 
 from mock import patch, Mock
-from nose.tools import assert_equal, assert_raises, assert_false
+from nose.tools import assert_equal, assert_raises, assert_false, assert_true
 
-from pyrally.rally_access import RallyAccessor, get_accessor, MEM_CACHE
+from pyrally.cache import MemoryCache
+from pyrally.retry import RetryPolicy
+from pyrally.models import BaseRallyModel
+from pyrally.rally_access import (RallyAccessor, get_accessor, MEM_CACHE,
+                                  InFlightRequest, AsyncRallyAccessor)
 
 
 @patch('pyrally.rally_access.ACCESSOR')
@@ -123,6 +130,69 @@ def test_make_api_call_partial_url_not_cached(urllib2):
                                                          'python_dict'))
 
 
+def test_make_api_call_coalesces_concurrent_requests():
+    """
+    Test ``make_api_call`` with the same uncached url from several threads.
+
+    Tests that :py:meth:`~.RallyAccessor.make_api_call`:
+        * sends only one request while it is in flight.
+        * returns its response to every caller.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/')
+    my_accessor.get_from_cache = Mock(return_value=False)
+    my_accessor.set_to_cache = Mock()
+    request_sent = threading.Event()
+    release_response = threading.Event()
+
+    def get_json_response(request, **kwargs):
+        request_sent.set()
+        release_response.wait()
+        return {'Obj': {}}
+    my_accessor._get_json_response = Mock(side_effect=get_json_response)
+
+    responses = []
+
+    def make_call():
+        responses.append(my_accessor.make_api_call('obj/1234.js'))
+
+    leader = threading.Thread(target=make_call)
+    leader.start()
+    request_sent.wait()
+    in_flight = my_accessor._in_flight.values()[0]
+    waiting = []
+    wait = in_flight.wait
+
+    def count_waiting():
+        waiting.append(True)
+        return wait()
+    in_flight.wait = count_waiting
+
+    followers = [threading.Thread(target=make_call) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while len(waiting) < 3 and leader.is_alive():
+        release_response.wait(0.01)
+    release_response.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert_equal(my_accessor._get_json_response.call_count, 1)
+    assert_equal(responses, [{'Obj': {}}] * 4)
+    assert_equal(my_accessor._in_flight, {})
+
+
+def test_make_api_call_coalesced_requests_share_errors():
+    """Test callers waiting on a failed request see the same error."""
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/')
+    my_accessor.get_from_cache = Mock(return_value=False)
+    in_flight = InFlightRequest()
+    my_accessor._in_flight[my_accessor.api_url + 'obj/1234.js'] = in_flight
+    in_flight.error = ValueError('boom')
+    in_flight.done.set()
+
+    assert_raises(ValueError, my_accessor.make_api_call, 'obj/1234.js')
+
+
 def test_set_cache_timeout():
     """Test ``set_cache_timeout`` adds the timeout given correctly.
 
@@ -141,11 +211,14 @@ def test_delete_from_cache_removes_correctly():
     """
     MEM_CACHE.clear()
     my_accessor = RallyAccessor('uname', 'pword', 'base_url')
-    MEM_CACHE['cache_key']['cache_lookup'] = 'some_test_data'
+    MEM_CACHE.set('cache_key', 'cache_lookup', 'some_test_data')
+    MEM_CACHE.set('cache_key', 'other_lookup', 'some_test_data')
 
     my_accessor.delete_from_cache('cache_key', 'cache_lookup')
 
-    assert_equal(MEM_CACHE, {'cache_key': {}})
+    assert_equal(MEM_CACHE.get('cache_key', 'cache_lookup', 10), None)
+    assert_equal(MEM_CACHE.get('cache_key', 'other_lookup', 10),
+                 'some_test_data')
 
 
 def test_delete_from_cache_handles_missing_key():
@@ -159,7 +232,7 @@ def test_delete_from_cache_handles_missing_key():
 
     my_accessor.delete_from_cache('story', 'key')
 
-    assert_equal(MEM_CACHE, {'story': {}})
+    assert_equal(len(MEM_CACHE), 0)
 
 
 def test_get_cacheable_info():
@@ -189,7 +262,7 @@ def test_get_from_cache_retrieves_correctly():
         * returns False if not present
     """
     MEM_CACHE.clear()
-    MEM_CACHE['cache_key']['cache_lookup'] = ('data', time.time())
+    MEM_CACHE.set('cache_key', 'cache_lookup', 'data')
 
     my_accessor = RallyAccessor('uname', 'pword', 'base_url')
     my_accessor.get_cacheable_info = Mock()
@@ -218,7 +291,7 @@ def test_get_from_cache_returns_false_if_out_of_date():
         * returns False if data is out of date
     """
     MEM_CACHE.clear()
-    MEM_CACHE['cache_key']['cache_lookup'] = ('data', 0)
+    MEM_CACHE.set('cache_key', 'cache_lookup', 'data')
 
     my_accessor = RallyAccessor('uname', 'pword', 'base_url')
     my_accessor.get_cacheable_info = Mock()
@@ -230,26 +303,419 @@ def test_get_from_cache_returns_false_if_out_of_date():
     assert_equal(my_accessor.get_from_cache('url'), False)
 
 
-@patch('pyrally.rally_access.time')
-def test_set_to_cache_adds_correctly(time_import):
+def test_set_to_cache_adds_correctly():
     """
     Test ``set_to_cache``.
 
     Tests that :py:meth:`~.RallyAccessor.set_to_cache`:
         * adds the given data to the cache.
+        * stores it with the timeout for its cache key.
     """
     MEM_CACHE.clear()
 
     my_accessor = RallyAccessor('uname', 'pword', 'base_url')
     my_accessor.get_cacheable_info = Mock()
     my_accessor.get_cacheable_info.return_value = ('cache_key', 'cache_lookup')
+    my_accessor.set_cache_timeout('cache_key', 10)
+    my_accessor.cache = Mock()
 
     my_accessor.set_to_cache('url', 'set_to_cache_test')
 
     assert_equal(my_accessor.get_cacheable_info.call_args[0], ('url',))
-    assert_equal(MEM_CACHE,
-                 {'cache_key':
-                    {'cache_lookup':
-                        ('set_to_cache_test',
-                         time_import.time.return_value)}})
+    assert_equal(my_accessor.cache.set.call_args[0],
+                 ('cache_key', 'cache_lookup', 'set_to_cache_test', 10))
+
+
+def test_accessor_uses_cache_given():
+    """Test :py:class:`.RallyAccessor` stores data in the cache given.
+
+    Tests that the module level ``MEM_CACHE`` is used by default, and that
+    another cache can be given instead.
+    """
+    other_cache = Mock()
+
+    assert_true(RallyAccessor('uname', 'pword', 'base_url').cache is
+                MEM_CACHE)
+    assert_true(RallyAccessor('uname', 'pword', 'base_url',
+                              cache=other_cache).cache is other_cache)
+
+
+
+def get_mock_response(code, body='', headers=None):
+    response = Mock()
+    response.code = code
+    response.read.return_value = body
+    response.info.return_value = headers or {}
+    response.retries = 0
+    return response
+
+
+@patch('pyrally.cache.time')
+def test_make_api_call_revalidates_expired_entries(time_import):
+    """
+    Test ``make_api_call`` with ``revalidate`` set.
+
+    Tests that :py:meth:`~.RallyAccessor.make_api_call`:
+        * stores the ``ETag`` sent with a response.
+        * sends it as ``If-None-Match`` once the cached copy has expired.
+        * keeps using the cached copy when the server answers ``304``.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                cache=MemoryCache(), revalidate=True)
+    my_accessor.set_cache_timeout('obj', 10)
+    my_accessor.pool = Mock()
+    my_accessor.pool.urlopen.return_value = get_mock_response(
+                                        200, '{"Obj": {"Name": "Fred"}}',
+                                        {'etag': '"v1"'})
+    url = '{0}obj/1234.js'.format(my_accessor.api_url)
+
+    time_import.time.return_value = 100
+    assert_equal(my_accessor.make_api_call(url, full_url=True),
+                 {'Obj': {'Name': 'Fred'}})
+    assert_false(my_accessor.pool.urlopen.call_args[0][0].has_header(
+                                                            'If-none-match'))
+
+    my_accessor.pool.urlopen.return_value = get_mock_response(
+                                        304, headers={'etag': '"v1"'})
+    time_import.time.return_value = 120
+    assert_equal(my_accessor.make_api_call(url, full_url=True),
+                 {'Obj': {'Name': 'Fred'}})
+    request = my_accessor.pool.urlopen.call_args[0][0]
+    assert_equal(request.get_header('If-none-match'), '"v1"')
+
+    # The 304 marks the cached copy as fresh again.
+    time_import.time.return_value = 125
+    my_accessor.make_api_call(url, full_url=True)
+    assert_equal(my_accessor.pool.urlopen.call_count, 2)
+
+
+def test_async_accessor_make_api_call():
+    """
+    Test :py:meth:`~.AsyncRallyAccessor.make_api_call`.
+
+    Test that:
+        * The call is passed to the wrapped accessor.
+        * Results and exceptions are returned through ``get``.
+    """
+    accessor = Mock()
+    accessor.make_api_call.return_value = {'Obj': {}}
+    async_accessor = AsyncRallyAccessor(accessor, max_workers=2)
+    try:
+        result = async_accessor.make_api_call('obj/1234.js')
+        assert_equal(result.get(1), {'Obj': {}})
+        assert_equal(accessor.make_api_call.call_args[0],
+                     ('obj/1234.js', False, 'GET', None, True))
+
+        accessor.make_api_call.side_effect = ValueError('boom')
+        result = async_accessor.make_api_call('obj/1234.js')
+        assert_raises(ValueError, result.get, 1)
+    finally:
+        async_accessor.close()
+
+
+@patch('pyrally.cache.time')
+def test_request_hooks_receive_events(time_import):
+    """
+    Test :py:meth:`~.RallyAccessor.add_request_hook`.
+
+    Test that hooks are called with:
+        * the status, size and retries of requests sent to the server.
+        * ``cache_hit`` set for calls answered from the cache.
+        * the status and error of failed requests.
+    """
+    time_import.time.return_value = 100
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                cache=MemoryCache(),
+                                retry_policy=RetryPolicy(max_retries=0))
+    my_accessor.pool = Mock()
+    response = get_mock_response(200, '{"Obj": {}}')
+    response.retries = 1
+    my_accessor.pool.urlopen.return_value = response
+    events = []
+    my_accessor.add_request_hook(events.append)
+    url = '{0}obj/1234.js'.format(my_accessor.api_url)
+
+    my_accessor.make_api_call(url, full_url=True)
+    my_accessor.make_api_call(url, full_url=True)
+    my_accessor.pool.urlopen.side_effect = urllib2.HTTPError(
+                                        url, 503, 'Unavailable', {}, None)
+    assert_raises(urllib2.HTTPError, my_accessor.make_api_call,
+                  url.replace('1234', '5678'), full_url=True)
+
+    assert_equal([(e['method'], e['cache_hit'], e['status'], e['bytes'],
+                   e['retries']) for e in events],
+                 [('GET', False, 200, 11, 1),
+                  ('GET', True, None, 0, 0),
+                  ('GET', False, 503, 0, 0)])
+    assert_equal(events[0]['url'], url)
+    assert_true(isinstance(events[2]['error'], urllib2.HTTPError))
+
+    my_accessor.remove_request_hook(events.append)
+    my_accessor.make_api_call(url, full_url=True)
+    assert_equal(len(events), 3)
+
+
+def test_failing_request_hooks_are_ignored():
+    """Test an exception in a request hook does not fail the call."""
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/')
+    my_accessor.pool = Mock()
+    my_accessor.pool.urlopen.return_value = get_mock_response(200, '{}')
+    my_accessor.add_request_hook(Mock(side_effect=ValueError('boom')))
+
+    assert_equal(my_accessor._get_json_response(
+                        urllib2.Request('http://dummy_url/obj/1234.js')), {})
+
+
+def test_stats_records_calls_by_type():
+    """
+    Test :py:meth:`~.RallyAccessor.stats`.
+
+    Test that calls are recorded against the type of their url.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                cache=MemoryCache())
+    my_accessor.pool = Mock()
+    my_accessor.pool.urlopen.return_value = get_mock_response(200, '{}')
+    my_accessor.pool.urlopen.return_value.retries = 0
+
+    my_accessor.make_api_call('defect/1234.js')
+    my_accessor.make_api_call('defect.js?query=&start=1')
+
+    stats = my_accessor.stats()
+    assert_equal(stats['defect']['requests'], 1)
+    assert_equal(stats['defect_query']['requests'], 1)
+    assert_equal(RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                               metrics=False).stats(), {})
+
+
+def test_accessor_uses_json_codec_given():
+    """Test responses are decoded with the ``json_codec`` given."""
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                json_codec='json')
+    my_accessor.pool = Mock()
+    my_accessor.pool.urlopen.return_value = get_mock_response(200, '{}')
+
+    assert_equal(my_accessor.json_codec.name, 'json')
+    assert_equal(my_accessor._get_json_response(
+                        urllib2.Request('http://dummy_url/obj/1234.js')), {})
+
+
+def test_get_json_response_accepts_compressed_responses():
+    """Test :py:meth:`~.RallyAccessor._get_json_response` asks for gzip."""
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/')
+    my_accessor.pool = Mock()
+    my_accessor.pool.urlopen.return_value = get_mock_response(200, '{}')
+
+    my_accessor._get_json_response(
+                        urllib2.Request('http://dummy_url/obj/1234.js'))
+
+    request = my_accessor.pool.urlopen.call_args[0][0]
+    assert_equal(request.get_header('Accept-encoding'), 'gzip, deflate')
+
+
+def test_make_api_call_compresses_large_posts():
+    """
+    Test ``make_api_call`` with ``compress_requests`` set.
+
+    Tests that :py:meth:`~.RallyAccessor.make_api_call`:
+        * sends small bodies as they are.
+        * gzips bodies over ``compress_threshold``.
+        * resends uncompressed, and stops compressing, if the server
+          answers ``415``.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                compress_requests=True, compress_threshold=100)
+    my_accessor._get_json_response = Mock(return_value={})
+    large_data = {'Story': {'Description': 'x' * 200}}
+
+    my_accessor.make_api_call('obj/1234.js', method='POST', data={'a': 1})
+    request = my_accessor._get_json_response.call_args[0][0]
+    assert_false(request.has_header('Content-encoding'))
+
+    my_accessor.make_api_call('obj/1234.js', method='POST', data=large_data)
+    request = my_accessor._get_json_response.call_args[0][0]
+    assert_equal(request.get_header('Content-encoding'), 'gzip')
+    assert_equal(my_accessor.json_codec.loads(
+                    zlib.decompress(request.get_data(), 16 + zlib.MAX_WBITS)),
+                 large_data)
+
+    my_accessor._get_json_response.side_effect = [
+                    urllib2.HTTPError('url', 415, 'Unsupported', {}, None), {}]
+    my_accessor.make_api_call('obj/1234.js', method='POST', data=large_data)
+    request = my_accessor._get_json_response.call_args[0][0]
+    assert_false(request.has_header('Content-encoding'))
+    assert_false(my_accessor.compress_requests)
+
+
+@patch('pyrally.retry.time')
+def test_get_json_response_retries_failed_requests(time_import):
+    """
+    Test :py:meth:`~.RallyAccessor._get_json_response` retries.
+
+    Test that:
+        * A ``503`` is retried after the backoff and the response returned.
+        * ``POST`` requests aren't retried.
+        * Each request waits for the rate limiter.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                retry_policy=RetryPolicy(jitter=False),
+                                rate_limit=10)
+    my_accessor.rate_limiter = Mock()
+    my_accessor.pool = Mock()
+    error = urllib2.HTTPError('url', 503, 'Unavailable', {}, None)
+    my_accessor.pool.urlopen.side_effect = [error, error,
+                                            get_mock_response(200, '{}')]
+    events = []
+    my_accessor.add_request_hook(events.append)
+
+    assert_equal(my_accessor._get_json_response(
+                        urllib2.Request('http://dummy_url/obj/1234.js')), {})
+    assert_equal([call[0] for call in time_import.sleep.call_args_list],
+                 [(0.5,), (1.0,)])
+    assert_equal([event['retries'] for event in events], [0, 1, 2])
+    assert_equal(my_accessor.rate_limiter.acquire.call_count, 3)
+
+    my_accessor.pool.urlopen.side_effect = [error]
+    assert_raises(urllib2.HTTPError, my_accessor._get_json_response,
+                  urllib2.Request('http://dummy_url/obj/1234.js', '{}'))
+
+
+@patch('pyrally.retry.time')
+def test_get_json_response_retries_lost_connections(time_import):
+    """
+    Test :py:meth:`~.RallyAccessor._get_json_response` with a reset body.
+
+    Test that a connection lost while reading the body raises ``URLError``,
+    so the request is retried.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                retry_policy=RetryPolicy(jitter=False))
+    my_accessor.pool = Mock()
+    reset_response = get_mock_response(200)
+    reset_response.read.side_effect = socket.error('Connection reset')
+    my_accessor.pool.urlopen.side_effect = [reset_response,
+                                            get_mock_response(200, '{}')]
+    events = []
+    my_accessor.add_request_hook(events.append)
+
+    assert_equal(my_accessor._get_json_response(
+                        urllib2.Request('http://dummy_url/obj/1234.js')), {})
+    assert_true(isinstance(events[0]['error'], urllib2.URLError))
+    assert_equal(my_accessor.pool.urlopen.call_count, 2)
+
+
+def test_live_objects_are_held_weakly():
+    """
+    Test the identity map of :py:class:`~.RallyAccessor`.
+
+    Test that:
+        * An object added is returned while still in use.
+        * It is dropped once nothing else refers to it, or when forgotten.
+        * Nothing is held if the identity map is turned off.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/')
+    live_object = BaseRallyModel({})
+    my_accessor.add_live_object(('Task', '1234'), live_object)
+
+    assert_equal(my_accessor.get_live_object(('Task', '1234')), live_object)
+    assert_equal(my_accessor.get_live_object(('Task', '5678')), None)
+
+    del live_object
+    assert_equal(my_accessor.get_live_object(('Task', '1234')), None)
+
+    live_object = BaseRallyModel({})
+    my_accessor.add_live_object(('Task', '1234'), live_object)
+    my_accessor.forget_live_object(('Task', '1234'))
+    assert_equal(my_accessor.get_live_object(('Task', '1234')), None)
+
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                identity_map=False)
+    my_accessor.add_live_object(('Task', '1234'), live_object)
+    assert_equal(my_accessor.get_live_object(('Task', '1234')), None)
+
+
+def test_writes_keep_the_cache_up_to_date():
+    """
+    Test :py:meth:`~.RallyAccessor.make_api_call` writes through the cache.
+
+    Test that:
+        * An update replaces the cached object with the one sent back.
+        * Every cached query for the type is removed, and other types kept.
+        * The live object for the url is forgotten.
+        * A delete removes the cached object.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                cache=MemoryCache())
+    story_url = '{0}story/1234.js'.format(my_accessor.api_url)
+    my_accessor.set_to_cache(story_url, {'Story': {'Name': 'Old'}})
+    my_accessor.set_to_cache(
+        '{0}story.js?query=(Name = "Old")'.format(my_accessor.api_url), {})
+    my_accessor.set_to_cache(
+        '{0}task.js?query=(Name = "Old")'.format(my_accessor.api_url), {})
+    live_object = BaseRallyModel({})
+    my_accessor.add_live_object(('story', '1234'), live_object)
+    my_accessor._get_json_response = Mock()
+    my_accessor._get_json_response.return_value = {'OperationResult': {
+                        'Errors': [],
+                        'Object': {'_type': 'Story', 'Name': 'New'}}}
+
+    my_accessor.make_api_call(story_url, True, method='POST',
+                              data={'Story': {'Name': 'New'}})
+
+    assert_equal(my_accessor.get_from_cache(story_url),
+                 {'Story': {'_type': 'Story', 'Name': 'New'}})
+    assert_equal([entry_key[0] for entry_key in my_accessor.cache._entries],
+                 ['task_query', 'story'])
+    assert_equal(my_accessor.get_live_object(('story', '1234')), None)
+
+    my_accessor._get_json_response.return_value = {'OperationResult': {
+                                                                'Errors': []}}
+    my_accessor.make_api_call(story_url, True, method='DELETE')
+
+    assert_equal(my_accessor.get_from_cache(story_url), False)
+
+
+def test_invalidate_queries():
+    """
+    Test :py:meth:`~.RallyAccessor.invalidate_queries`.
+
+    Test that:
+        * Query pages and incremental result sets for the type are removed.
+        * Artifact queries are removed for artifact types only.
+        * Other entries are kept.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                cache=MemoryCache())
+    for cache_key in ['defect_query', 'defect_incremental', 'artifact_query',
+                      'artifact_incremental', 'user_query', 'defect']:
+        my_accessor.cache.set(cache_key, 'lookup', {})
+
+    my_accessor.invalidate_queries('User')
+    assert_equal(sorted(entry_key[0]
+                        for entry_key in my_accessor.cache._entries),
+                 ['artifact_incremental', 'artifact_query', 'defect',
+                  'defect_incremental', 'defect_query'])
+
+    my_accessor.invalidate_queries('Defect')
+    assert_equal([entry_key[0] for entry_key in my_accessor.cache._entries],
+                 ['defect'])
+
+
+def test_delete_url_from_cache():
+    """
+    Test :py:meth:`~.RallyAccessor.delete_url_from_cache`.
+
+    Test that the entry for an object's ``_ref`` is removed, and urls outside
+    the API are ignored.
+    """
+    my_accessor = RallyAccessor('uname', 'pword', 'http://dummy_url/',
+                                cache=MemoryCache())
+    story_url = '{0}story/1234.js'.format(my_accessor.api_url)
+    my_accessor.set_to_cache(story_url, {'Story': {}})
+
+    my_accessor.delete_url_from_cache('http://elsewhere/story/1234.js')
+    my_accessor.delete_url_from_cache(None)
+    assert_equal(len(my_accessor.cache), 1)
 
+    my_accessor.delete_url_from_cache(story_url)
+    assert_equal(len(my_accessor.cache), 0)
@@ -0,0 +1,93 @@
+import urllib2
+
+from mock import patch
+from nose.tools import assert_equal, assert_true, assert_false
+
+from pyrally.retry import RetryPolicy, TokenBucket, get_retry_after
+
+
+def get_http_error(code, headers=None):
+    return urllib2.HTTPError('url', code, 'msg', headers or {}, None)
+
+
+def test_should_retry():
+    """
+    Test :py:meth:`~.RetryPolicy.should_retry`.
+
+    Test that:
+        * Retryable statuses and connection errors are retried.
+        * Other statuses aren't.
+        * Non-idempotent methods aren't.
+        * Nothing is retried once ``max_retries`` is reached.
+    """
+    policy = RetryPolicy(max_retries=2)
+
+    assert_true(policy.should_retry('GET', get_http_error(429), 0))
+    assert_true(policy.should_retry('GET', urllib2.URLError('reset'), 1))
+    assert_false(policy.should_retry('GET', get_http_error(404), 0))
+    assert_false(policy.should_retry('POST', get_http_error(503), 0))
+    assert_false(policy.should_retry('GET', get_http_error(503), 2))
+
+
+def test_get_backoff_grows_exponentially():
+    """Test :py:meth:`~.RetryPolicy.get_backoff` without jitter."""
+    policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+
+    assert_equal([policy.get_backoff(attempt) for attempt in range(4)],
+                 [1, 2, 4, 5])
+
+
+@patch('pyrally.retry.random')
+def test_get_backoff_jitters(random_import):
+    """Test :py:meth:`~.RetryPolicy.get_backoff` picks a random wait."""
+    random_import.uniform.return_value = 0.3
+    policy = RetryPolicy(backoff_factor=1)
+
+    assert_equal(policy.get_backoff(2), 0.3)
+    assert_equal(random_import.uniform.call_args[0], (0, 4))
+
+
+def test_get_backoff_honours_retry_after():
+    """Test :py:meth:`~.RetryPolicy.get_backoff` uses ``Retry-After``."""
+    policy = RetryPolicy(max_backoff=10)
+
+    assert_equal(policy.get_backoff(
+                    0, get_http_error(429, {'retry-after': '7'})), 7)
+    assert_equal(policy.get_backoff(
+                    0, get_http_error(429, {'retry-after': '70'})), 10)
+
+
+@patch('pyrally.retry.time')
+def test_get_retry_after_parses_dates(time_import):
+    """Test :py:func:`~.get_retry_after` with an HTTP date."""
+    time_import.gmtime.return_value = (2012, 5, 1, 12, 0, 0, 1, 122, 0)
+    error = get_http_error(503,
+                           {'retry-after': 'Tue, 01 May 2012 12:00:30 GMT'})
+
+    assert_equal(get_retry_after(error), 30)
+    assert_equal(get_retry_after(get_http_error(503)), None)
+
+
+@patch('pyrally.retry.time')
+def test_token_bucket_limits_rate(time_import):
+    """
+    Test :py:meth:`~.TokenBucket.acquire`.
+
+    Test that:
+        * Up to ``capacity`` calls are let through straight away.
+        * Further calls sleep until a token would be available.
+        * Tokens refill over time.
+    """
+    time_import.time.return_value = 100
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    bucket.acquire()
+    bucket.acquire()
+    assert_false(time_import.sleep.called)
+    bucket.acquire()
+    assert_equal(time_import.sleep.call_args[0], (0.5,))
+
+    time_import.sleep.reset_mock()
+    time_import.time.return_value = 102
+    bucket.acquire()
+    assert_false(time_import.sleep.called)